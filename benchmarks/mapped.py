@@ -0,0 +1,60 @@
+"""
+Compare peak memory use of tagging a large file read into memory, and memory-mapped
+
+Usage: python3 benchmarks/mapped.py [copies of alice.txt, default 50]
+
+Each mode is run in a separate process, peak RSS is from getrusage().
+"""
+import os.path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tag_file(path, use_mmap):
+    """Tag (path), return (seconds, peak RSS in MiB)"""
+    from clictagger.region.tag import ALL_RCLASSES
+    from clictagger.taggedtext import TaggedText
+
+    start = time.perf_counter()
+    if use_mmap is None:
+        pass  # Just measure imports
+    else:
+        TaggedText.from_file(path, use_mmap=use_mmap, regions=ALL_RCLASSES, cache=False)
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(copies):
+    with open(os.path.join(ROOT, "alice.txt"), "r", encoding="utf8") as f:
+        alice = f.read()
+    with tempfile.NamedTemporaryFile("w", encoding="utf8", suffix=".txt") as f:
+        for i in range(copies):
+            f.write(alice)
+            f.write("\n\n")
+        f.flush()
+        print(
+            "%d copies of alice.txt, %.1f MiB"
+            % (copies, os.path.getsize(f.name) / 1024**2)
+        )
+
+        for label, mode in (("(imports)", None), ("read", False), ("use_mmap", True)):
+            out = subprocess.check_output(
+                [
+                    sys.executable,
+                    "-c",
+                    "import sys; sys.path.insert(0, %r); sys.path.insert(0, %r); "
+                    "import mapped; print('%%f %%f' %% mapped.tag_file(%r, %s))"
+                    % (ROOT, os.path.dirname(__file__), f.name, mode),
+                ]
+            )
+            elapsed, rss = (float(x) for x in out.split())
+            print("%-12s %8.2fs %8.1f MiB peak RSS" % (label, elapsed, rss))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
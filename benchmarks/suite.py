@@ -0,0 +1,445 @@
+"""
+Time taggers, renderers & the command line on generated texts
+
+Usage: python3 benchmarks/suite.py [--scale 1,10] [--repeat 3] [-k FILTER]
+                                   [--save results.json]
+                                   [--baseline results.json] [--threshold 0.25]
+
+Inputs are built from alice.txt, at each scale (copies of alice.txt' worth of
+characters):
+
+- alice: alice.txt repeated
+- quotes: short paragraphs of dialogue, nearly all quotes & suspensions
+- chapters: a chapter heading every few paragraphs
+- long-paragraphs: alice.txt with 100 paragraphs joined into each
+
+For each input, every tagger is timed in turn (along with the word index they
+share), then the HTML, ANSI and CSV renderers, then the command line end to end.
+Command line startup is also timed, with --help and a one-line input, and has to
+be within STARTUP_BUDGET seconds of starting python on every run.
+Each benchmark is run (repeat) times, keeping the fastest. Peak memory is
+measured in a separate run, with tracemalloc for Python code, or the peak RSS of
+the process for the command line.
+
+Results are printed as a table, and written as JSON with --save. Give a
+previous run's JSON with --baseline to compare against it. Anything slower or
+bigger than the baseline by more than (threshold) is flagged, and the exit
+status will be 1, as it will be if startup is over budget.
+"""
+
+import argparse
+import functools
+import io
+import json
+import os
+import os.path
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import icu  # noqa: E402
+
+from clictagger.region.tag import TAGGERS, ALL_RCLASSES  # noqa: E402
+from clictagger.taggedtext import TaggedText  # noqa: E402
+from clictagger.tokenizer import WordIndex  # noqa: E402
+
+#: Differences smaller than these are noise, never flag them
+MIN_SECONDS_DIFF = 0.01
+MIN_MIB_DIFF = 1.0
+
+
+def read_alice():
+    with open(os.path.join(ROOT, "alice.txt"), "r", encoding="utf8") as f:
+        return f.read()
+
+
+def gen_alice(alice, size):
+    """alice.txt, repeated until at least (size) characters"""
+    return "\n\n".join([alice] * max(1, -(-size // len(alice))))
+
+
+def gen_quotes(alice, size):
+    """Paragraphs of dialogue, with suspensions and the odd embedded quote"""
+    rnd = random.Random(size)
+    words = alice.split()
+    names = ("Alice", "the Hatter", "the Queen", "the Mock Turtle", "the Duchess")
+    out = ["Quotes\nA. N. Other\n\n"]
+    total = 0
+    while total < size:
+        para = "‘%s,’ said %s, ‘%s%s.’\n\n" % (
+            " ".join(rnd.choice(words) for _ in range(rnd.randrange(1, 8))),
+            rnd.choice(names),
+            " ".join(rnd.choice(words) for _ in range(rnd.randrange(1, 12))),
+            " “%s”" % rnd.choice(words) if rnd.random() < 0.2 else "",
+        )
+        out.append(para)
+        total += len(para)
+    return "".join(out)
+
+
+def gen_chapters(alice, size):
+    """alice.txt's paragraphs, with a chapter heading every 3"""
+    paras = gen_alice(alice, size).split("\n\n")
+    out = []
+    for i in range(0, len(paras), 3):
+        out.append("CHAPTER %d." % (i // 3 + 1))
+        out.extend(paras[i : i + 3])
+    return "\n\n".join(out)
+
+
+def gen_long_paragraphs(alice, size):
+    """alice.txt, with every 100 paragraphs joined into one"""
+    paras = [p.replace("\n", " ") for p in gen_alice(alice, size).split("\n\n")]
+    return "\n\n".join(" ".join(paras[i : i + 100]) for i in range(0, len(paras), 100))
+
+
+INPUTS = [
+    ("alice", gen_alice),
+    ("quotes", gen_quotes),
+    ("chapters", gen_chapters),
+    ("long-paragraphs", gen_long_paragraphs),
+]
+
+
+def measure(fn, repeat):
+    """Return (fastest seconds, peak MiB allocated) of calling fn()"""
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak / 1024**2
+
+
+#: Names of the benchmarks yielded by iter_tagger_benchmarks()
+TAGGER_NAMES = ["tag:word_index"] + ["tag:%s" % fn.__name__ for fn in TAGGERS]
+
+
+def iter_tagger_benchmarks(content):
+    """
+    Yield (name, fn) for the word index, then each tagger in the order they run.
+    Each fn tags a copy of the book so far, so starts with the regions it would
+    normally have
+    """
+    book = dict(content=content, word_index=WordIndex(content))
+    yield "tag:word_index", lambda: WordIndex(content)
+    for tagger in TAGGERS:
+        before = dict(book)
+        yield "tag:%s" % tagger.__name__, lambda: tagger(dict(before))
+        tagger(book)
+
+
+class NullWriter(io.TextIOBase):
+    """A text file that throws away anything written to it"""
+
+    def write(self, s):
+        return len(s)
+
+
+#: (name, fn(tt)) for each renderer
+RENDERERS = [
+    ("render:html", lambda tt: tt.markup().write_html(NullWriter())),
+    ("render:ansi", lambda tt: tt.markup().write_ansi(NullWriter())),
+    ("render:csv", lambda tt: tt.table().write_csv(NullWriter())),
+    ("render:csv-tokens", lambda tt: tt.table(["tokens"]).write_csv(NullWriter())),
+]
+
+
+#: Run the command line, then write the peak RSS in KiB to the path given as the first argument.
+#: NB: ru_maxrss of a child can be that of the (big) parent it was forked from,
+#: VmHWM is only this process after exec()
+CLI_CODE = """
+import atexit, resource, sys
+peak_path = sys.argv.pop(1)
+
+def write_peak():
+    try:
+        with open("/proc/self/status") as f:
+            peak = [int(l.split()[1]) for l in f if l.startswith("VmHWM:")][0]
+    except OSError:  # i.e. not Linux, ru_maxrss is in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak /= 1024 if sys.platform == "darwin" else 1
+    with open(peak_path, "w") as f:
+        f.write(str(peak))
+
+atexit.register(write_peak)
+from clictagger.script import clictagger
+clictagger()
+"""
+
+
+def run_cli(args, repeat, tempdir):
+    """Run the command line with (args), return (fastest seconds, peak RSS MiB)"""
+    env = dict(os.environ)
+    env.pop("CLICTAGGER_CACHE_DIR", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (ROOT, env.get("PYTHONPATH"))))
+    peak_path = os.path.join(tempdir, "peak")
+    seconds = []
+    rss = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", CLI_CODE, peak_path] + args,
+            stdout=subprocess.DEVNULL,
+            env=env,
+            check=True,
+        )
+        seconds.append(time.perf_counter() - start)
+        with open(peak_path, "r") as f:
+            rss.append(float(f.read()) / 1024)
+    return min(seconds), max(rss)
+
+
+def iter_cli_benchmarks(path, tempdir):
+    """Yield (name, args) for each command line mode"""
+    yield "cli:csv", ["--csv", os.path.join(tempdir, "out.csv"), path]
+    yield "cli:csv-tokens", ["--csv", os.path.join(tempdir, "out.csv"), path, "tokens"]
+    yield "cli:html", ["--html", "-", path]
+    yield "cli:ansi", ["--ansi", path]
+
+
+#: One-line input for startup benchmarks
+STARTUP_CONTENT = "‘Hello there,’ I said.\n"
+
+
+def iter_startup_benchmarks(path):
+    """Yield (name, args) for each quick command line, reading a one-line (path)"""
+    yield "cli:help", ["--help"]
+    yield "cli:startup-csv", ["--csv", "-", path]
+
+
+#: Seconds each startup benchmark may take on top of starting python
+STARTUP_BUDGET = {"cli:help": 0.1, "cli:startup-csv": 0.25}
+
+
+def check_startup(results, repeat):
+    """
+    Return a list of (result, reason) for each startup benchmark in (results)
+    over its STARTUP_BUDGET
+    """
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        seconds.append(time.perf_counter() - start)
+    python_seconds = min(seconds)
+
+    over = []
+    for r in results:
+        budget = STARTUP_BUDGET.get(r["name"])
+        if budget is not None and r["seconds"] - python_seconds > budget:
+            over.append(
+                (
+                    r,
+                    "%.3fs more than python's %.3fs startup, budget is %.3fs"
+                    % (r["seconds"] - python_seconds, python_seconds, budget),
+                )
+            )
+    return over
+
+
+def render(fn, tt):
+    """
+    Call fn(tt) on a copy of (tt) sharing its regions, so anything cached by
+    a previous run (e.g. the word index for CSV word counts) is made again
+    """
+    tt_copy = TaggedText(tt.content, name=tt.name, regions=[], cache=False)
+    tt_copy.regions.set_regions(tt.regions)
+    fn(tt_copy)
+
+
+def run_suite(scales, repeat, name_filter=None, log=sys.stderr):
+    """Run all benchmarks, return a list of result dicts"""
+    alice = read_alice()
+    results = []
+
+    def record(input_name, name, content, seconds, peak_mib):
+        results.append(
+            dict(
+                input=input_name,
+                name=name,
+                chars=len(content),
+                seconds=round(seconds, 6),
+                chars_per_s=round(len(content) / seconds) if seconds > 0 else None,
+                peak_mib=round(peak_mib, 2),
+            )
+        )
+        print(format_result(results[-1]), file=log, flush=True)
+
+    def wanted(input_name, name):
+        return name_filter is None or name_filter in "%s %s" % (input_name, name)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "startup.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(STARTUP_CONTENT)
+        for name, args in iter_startup_benchmarks(path):
+            if wanted("startup", name):
+                record(
+                    "startup", name, STARTUP_CONTENT, *run_cli(args, repeat, tempdir)
+                )
+        os.unlink(path)
+
+        for scale in scales:
+            for gen_name, gen in INPUTS:
+                input_name = "%s-%dx" % (gen_name, scale)
+                content = gen(alice, len(alice) * scale)
+
+                if any(wanted(input_name, n) for n in TAGGER_NAMES):
+                    for name, fn in iter_tagger_benchmarks(content):
+                        if wanted(input_name, name):
+                            record(input_name, name, content, *measure(fn, repeat))
+
+                renderers = [(n, fn) for n, fn in RENDERERS if wanted(input_name, n)]
+                if renderers:
+                    tt = TaggedText(content, regions=ALL_RCLASSES, cache=False)
+                    for name, fn in renderers:
+                        record(
+                            input_name,
+                            name,
+                            content,
+                            *measure(functools.partial(render, fn, tt), repeat)
+                        )
+
+                path = os.path.join(tempdir, "%s.txt" % input_name)
+                with open(path, "w", encoding="utf8") as f:
+                    f.write(content)
+                for name, args in iter_cli_benchmarks(path, tempdir):
+                    if wanted(input_name, name):
+                        record(
+                            input_name, name, content, *run_cli(args, repeat, tempdir)
+                        )
+                os.unlink(path)
+    return results
+
+
+def format_result(r):
+    return "%-22s %-28s %8.3fs %12s chars/s %8.1f MiB" % (
+        r["input"],
+        r["name"],
+        r["seconds"],
+        "{:,}".format(r["chars_per_s"] or 0),
+        r["peak_mib"],
+    )
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare (results) to (baseline) results, return a list of
+    (result, baseline result, reason) for each regression
+    """
+    old_results = {(r["input"], r["name"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = old_results.get((r["input"], r["name"]))
+        if old is None:
+            continue
+        if (
+            r["seconds"] > old["seconds"] * (1 + threshold)
+            and r["seconds"] - old["seconds"] > MIN_SECONDS_DIFF
+        ):
+            regressions.append(
+                (r, old, "%.0f%% slower" % ((r["seconds"] / old["seconds"] - 1) * 100))
+            )
+        if (
+            r["peak_mib"] > old["peak_mib"] * (1 + threshold)
+            and r["peak_mib"] - old["peak_mib"] > MIN_MIB_DIFF
+        ):
+            regressions.append(
+                (
+                    r,
+                    old,
+                    "%.0f%% more memory"
+                    % ((r["peak_mib"] / old["peak_mib"] - 1) * 100),
+                )
+            )
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    ap.add_argument(
+        "--scale",
+        type=str,
+        default="1,10",
+        help="Comma-separated sizes of input, in copies of alice.txt. Defaults to 1,10",
+    )
+    ap.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark")
+    ap.add_argument(
+        "-k", type=str, help="Only run benchmarks with this in the input or name"
+    )
+    ap.add_argument("--save", type=str, help="Write results as JSON to this file")
+    ap.add_argument(
+        "--baseline", type=str, help="Compare to results from this JSON file"
+    )
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Flag anything this much slower/bigger than the baseline. Defaults to 0.25",
+    )
+    args = ap.parse_args()
+
+    out = dict(
+        meta=dict(
+            date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            python=platform.python_version(),
+            icu=icu.ICU_VERSION,
+            platform=platform.platform(),
+            cpus=os.cpu_count(),
+            repeat=args.repeat,
+        ),
+        results=run_suite(
+            [int(x) for x in args.scale.split(",")], args.repeat, name_filter=args.k
+        ),
+    )
+    if args.save:
+        with open(args.save, "w", encoding="utf8") as f:
+            json.dump(out, f, indent=2)
+            f.write("\n")
+
+    failed = False
+    over_budget = check_startup(out["results"], args.repeat)
+    for r, reason in over_budget:
+        print(
+            "Startup over budget: %s\n    %s" % (format_result(r), reason),
+            file=sys.stderr,
+        )
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+        regressions = compare(out["results"], baseline, args.threshold)
+        print(
+            "\n%d regressions compared to %s" % (len(regressions), args.baseline),
+            file=sys.stderr,
+        )
+        for r, old, reason in regressions:
+            print(
+                "%s: %s\n    was: %s" % (reason, format_result(r), format_result(old)),
+                file=sys.stderr,
+            )
+        if regressions:
+            failed = True
+
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
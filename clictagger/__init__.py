@@ -1,3 +1,11 @@
-import pkg_resources
+def __getattr__(name):
+    # NB: Looking up the version is slow, only do it when asked for
+    if name == "__version__":
+        try:
+            from importlib.metadata import version
+        except ImportError:  # i.e. Python < 3.8
+            import pkg_resources
 
-__version__ = pkg_resources.get_distribution("clictagger").version
+            return pkg_resources.get_distribution("clictagger").version
+        return version("clictagger")
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,193 @@
+"""
+clictagger.cache: Keep tagged regions on disk
+*********************************************
+
+Tagging a large text takes a while, and tagging the same text again will give
+the same result. A :py:class:`TagCache` stores the regions for a text in a
+directory, so next time they can be loaded instead::
+
+    >>> import tempfile
+    >>> from clictagger.taggedtext import TaggedText
+    >>> cache = TagCache(tempfile.mkdtemp())
+    >>> tt = TaggedText.from_file('alice.txt', cache=cache)  # Tagged, then stored in cache
+    >>> tt = TaggedText.from_file('alice.txt', cache=cache)  # Loaded from cache
+    >>> len(tt.regions['quote.quote'])
+    1098
+
+Entries are found using a hash of the content, the source of the taggers and
+the version of ICU in use, so upgrading clictagger or ICU won't use out of date
+regions. Only the region classes that have been tagged are stored, so asking
+for chapter titles doesn't tokenize the text. If more region classes are tagged
+later, they are added to the entry.
+
+The cache is opt-in. Either give ``cache`` to :py:class:`~clictagger.taggedtext.TaggedText`
+(or ``from_file``, ``from_url``, etc.) as a :py:class:`TagCache` or a directory
+path, or set the ``CLICTAGGER_CACHE_DIR`` environment variable to use a cache
+everywhere, including the command line::
+
+    export CLICTAGGER_CACHE_DIR=~/.cache/clictagger
+    clictagger --csv alice.csv alice.txt
+
+Several processes can use the same cache directory at once. Entries are
+written to a temporary file first, then moved into place, so a partly-written
+entry is never read. When the cache is bigger than ``max_size`` bytes, the
+least-recently used entries are removed.
+
+Entries are stored in the format described in :mod:`clictagger.store`, without
+the content, and are memory-mapped when loaded.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from . import icuconfig, tokenizer
+from .region import chapter, chapterwise, metadata, quote, suspension, tag, utils
+from .store import read_regions, write_regions
+
+#: Modules whose source affects the regions tagged
+TAGGER_MODULES = [
+    icuconfig,
+    tokenizer,
+    chapter,
+    chapterwise,
+    metadata,
+    quote,
+    suspension,
+    tag,
+    utils,
+]
+
+#: Environment variable that turns on caching by default
+CACHE_DIR_ENV = "CLICTAGGER_CACHE_DIR"
+
+_tagger_version = None
+
+
+def tagger_version():
+    """
+    Return a string that changes whenever the output of the taggers could, i.e.
+    a hash of the tagger source, and ICU/PyICU versions
+    """
+    global _tagger_version
+
+    if _tagger_version is None:
+        import icu
+
+        h = hashlib.sha256()
+        for mod in TAGGER_MODULES:
+            with open(mod.__file__, "rb") as f:
+                h.update(f.read())
+        _tagger_version = "%s-icu%s-pyicu%s" % (
+            h.hexdigest()[:16],
+            icu.ICU_VERSION,
+            icu.VERSION,
+        )
+    return _tagger_version
+
+
+def get_cache(cache=None):
+    """
+    Turn the (cache) argument given to TaggedText into a :py:class:`TagCache`, or None
+
+    - cache: A :py:class:`TagCache`, a directory path, False for no cache, or None
+      to use ``CLICTAGGER_CACHE_DIR`` if set
+    """
+    if cache is None:
+        cache = os.environ.get(CACHE_DIR_ENV, "") or False
+    if cache is False:
+        return None
+    if isinstance(cache, TagCache):
+        return cache
+    return TagCache(cache)
+
+
+class TagCache:
+    """
+    A directory of tagged regions, keyed by content
+
+    - path: Directory to store entries in, created if it doesn't exist
+    - max_size: Maximum total size of entries in bytes, defaults to 1GiB
+    """
+
+    def __init__(self, path, max_size=1024**3):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+
+    def key(self, content):
+        """Return the key for (content)"""
+        h = hashlib.sha256()
+        h.update(tagger_version().encode("utf8"))
+        h.update(b"\0")
+        h.update(content.encode("utf8"))
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        """Path to the entry for (key)"""
+        return os.path.join(self.path, key[:2], key + ".clictt")
+
+    def get(self, content):
+        """Return a dict of region class to regions for (content), or None if not cached"""
+        entry_path = self.entry_path(self.key(content))
+        try:
+            header, content, regions = read_regions(entry_path)
+        except Exception:
+            # Missing or unreadable entry, e.g. from an incompatible version
+            return None
+
+        try:
+            # Mark entry as recently used
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return regions
+
+    def put(self, content, regions):
+        """Store (regions), a dict of region class to regions, for (content)"""
+        entry_path = self.entry_path(self.key(content))
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_regions(f, regions)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """Return a list of (mtime, size, path) for all entries in the cache"""
+        out = []
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if not filename.endswith(".clictt"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Removed by another process
+                out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def evict(self):
+        """Remove least-recently used entries until the cache is within max_size"""
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # Removed by another process, or in use (on Windows)
+            total -= size
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        for mtime, size, path in self.entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,295 @@
+"""
+clictagger.concordance: Search a corpus for phrases
+***************************************************
+
+A :py:class:`ConcordanceIndex` is an inverted index of the tokens in a corpus of
+:py:class:`~clictagger.taggedtext.TaggedText` objects. For each type, it keeps
+a sorted posting list of every book & token number it occurs at, so a phrase
+can be found without looking at the text again::
+
+    >>> from clictagger.taggedtext import TaggedText
+    >>> index = ConcordanceIndex(within=["quote.quote"])
+    >>> index.add(TaggedText.from_file('alice.txt'))
+    0
+    >>> for line in itertools.islice(index.kwic("off with her head", context=4), 4):
+    ...     print("%30s[%s]%s" % (line.left, line.node, line.right))
+          a wild beast, screamed ‘[Off with her head]! Off--’ ‘Nonsense!’ said Alice
+              with his head!’ or ‘[Off with her head]!’ about once in a
+              with his head!’ or ‘[Off with her head]!’ Those whom she sentenced
+           I won’t!’ said Alice. ‘[Off with her head]!’ the Queen shouted at
+
+Queries are turned into types the same way as the text, see
+:mod:`clictagger.tokenizer`, so case and punctuation don't matter. A ``*``
+in a query matches any characters within a type, and ``*`` on its own matches
+any one token::
+
+    >>> collections.Counter(index.books[0].content[m.start:m.end] for m in index.search("off with * head"))
+    Counter({'Off with her head': 3, 'Off with his head': 3, 'Off with his\\nhead': 1, 'Off with her\\nhead': 1})
+    >>> collections.Counter(index.books[0].content[m.start:m.end] for m in index.search("mock tur*"))
+    Counter({'Mock Turtle': 51, 'Mock\\nTurtle': 3, 'Mock Turtle’s': 2})
+
+Phrases can match across sentences, quotes and paragraphs. To only find
+matches within a region of a given class, use ``within``. The class has to be
+one of the ``within`` classes the index was made with::
+
+    >>> len(list(index.search("the hatter"))), len(list(index.search("the hatter", within="quote.quote")))
+    (51, 1)
+
+Index layout
+------------
+
+Each posting is one integer, ``(book << 32) | token``, so a posting list is a
+single ``array('q')`` in book, then token order. Matching a phrase starts with
+the rarest term, and for each of its postings checks the others contain the
+neighbouring token by bisecting them, so the work depends on how rare the
+phrase is, not how big the corpus is. Character offsets aren't stored in the
+index, they are looked up in each book's token starts & ends.
+
+The index doesn't keep each TaggedText, only a :py:class:`Book` of what it
+needs: the token starts & ends, the regions of any ``within`` classes, and the
+content for context. So as well as the content, each book takes up about 24
+bytes per token, 16 for the starts & ends and 8 for the postings.
+
+All books share the index's :py:class:`~clictagger.tokenizer.Vocabulary`, so a
+type has the same ID everywhere. Their token regions are moved to it when added.
+"""
+import array
+import bisect
+import collections
+import itertools
+import re
+
+from .tokenizer import Vocabulary, types_from_string
+
+#: Extra characters considered part of a type in queries, i.e. wildcards
+QUERY_WORD_PARTS = set(("*",))
+
+#: Postings store the book number above this many bits, the token number below
+BOOK_SHIFT = 32
+TOKEN_MASK = (1 << BOOK_SHIFT) - 1
+
+Match = collections.namedtuple("Match", "book token length start end")
+Match.__doc__ = """
+A phrase found by :py:meth:`ConcordanceIndex.search`
+
+- book: The number of the book, i.e. the index of it in :py:attr:`ConcordanceIndex.books`
+- token: The number of the first token matched in the book's ``tokens`` regions
+- length: The number of tokens matched
+- start: Character position of the start of the first token
+- end: Character position of the end of the last token
+"""
+
+Book = collections.namedtuple("Book", "name content start end within")
+Book.__doc__ = """
+What a :py:class:`ConcordanceIndex` keeps of each book added to it
+
+- name: The name of the :py:class:`~clictagger.taggedtext.TaggedText`
+- content: The text of the book, for context
+- start: Array of the start of each token
+- end: Array of the end of each token
+- within: Dict of region class to :py:class:`~clictagger.region.column.RegionIndex`,
+  for each of the index's ``within`` classes
+"""
+
+ConcordanceLine = collections.namedtuple(
+    "ConcordanceLine", "book start end left node right"
+)
+ConcordanceLine.__doc__ = """
+A line of a keyword-in-context concordance, yielded by :py:meth:`ConcordanceIndex.kwic`.
+Whitespace in left, node & right is collapsed to single spaces
+
+- book: The number of the book, i.e. the index of it in :py:attr:`ConcordanceIndex.books`
+- start: Character position of the start of the match
+- end: Character position of the end of the match
+- left: Text before the match
+- node: The text matched
+- right: Text after the match
+"""
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+
+def parse_query(query):
+    """
+    Turn (query) into a list of types to search for, keeping ``*`` wildcards::
+
+        >>> parse_query("‘Mock Tur*,’ said *")
+        ['mock', 'tur*', 'said', '*']
+    """
+    return [
+        t[0] for t in types_from_string(query, additional_word_parts=QUERY_WORD_PARTS)
+    ]
+
+
+def _contains(postings, key):
+    """Is (key) in the sorted array (postings)?"""
+    i = bisect.bisect_left(postings, key)
+    return i < len(postings) and postings[i] == key
+
+
+class ConcordanceIndex:
+    """
+    An inverted index of the tokens in many :py:class:`~clictagger.taggedtext.TaggedText` objects
+
+    - books: Iterable of TaggedText objects to add to the index
+    - vocabulary: :py:class:`~clictagger.tokenizer.Vocabulary` to store types in,
+      e.g. one passed to :py:meth:`~clictagger.taggedtext.TaggedText.tag_corpus`
+    - within: Region classes that searches can be limited to, see :py:meth:`search`
+
+    For example, to index a corpus, tokenizing it in parallel::
+
+        vocab = Vocabulary()
+        index = ConcordanceIndex(
+            TaggedText.tag_corpus(
+                glob.glob("corpus/*.txt"),
+                regions=["tokens", "quote.quote"],
+                vocabulary=vocab,
+            ),
+            vocabulary=vocab,
+            within=["quote.quote"],
+        )
+
+    With the same vocabulary, tokens don't need moving to the index's.
+    """
+
+    def __init__(self, books=(), vocabulary=None, within=()):
+        self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+        self.within = list(within)
+        self.books = []
+        self.postings = {}
+        for tt in books:
+            self.add(tt)
+
+    def add(self, tt):
+        """
+        Add the tokens in (tt) to the index, return its book number.
+        Only a :py:class:`Book` of (tt) is kept, (tt) itself can be thrown away
+        """
+        book = len(self.books)
+        tokens = tt.regions["tokens"]
+        if len(tokens) > TOKEN_MASK:
+            raise ValueError("%s has too many tokens to index" % tt.name)
+        tokens.set_vocabulary(self.vocabulary)
+        tt.regions.vocabulary = self.vocabulary
+        self.books.append(
+            Book(
+                tt.name,
+                tt.content,
+                tokens.start,
+                tokens.end,
+                {rclass: tt.region_index(rclass) for rclass in self.within},
+            )
+        )
+
+        # Sort token numbers by type, then add each type's run to its postings
+        ids = tokens.rvalue
+        offset = book << BOOK_SHIFT
+        for tid, token_nums in itertools.groupby(
+            sorted(range(len(ids)), key=ids.__getitem__), key=ids.__getitem__
+        ):
+            if tid not in self.postings:
+                self.postings[tid] = array.array("q")
+            self.postings[tid].extend(map(offset.__add__, token_nums))
+        return book
+
+    def term_postings(self, term):
+        """
+        Return sorted postings for (term), a type that may contain ``*`` wildcards.
+        A term that is only ``*`` matches anything, and returns None
+        """
+        if term == "*":
+            return None
+        if "*" not in term:
+            tid = self.vocabulary.ids.get(term)
+            return self.postings.get(tid, array.array("q"))
+
+        term_regex = re.compile(re.escape(term).replace(r"\*", ".*"))
+        matching = [
+            self.postings[tid]
+            for tid, ttype in enumerate(self.vocabulary.types)
+            if tid in self.postings and term_regex.fullmatch(ttype)
+        ]
+        if len(matching) == 1:
+            return matching[0]
+        return array.array("q", sorted(itertools.chain.from_iterable(matching)))
+
+    def iter_postings(self, query):
+        """
+        Yield the posting of the first token of each match for (query), in order,
+        and the number of tokens each match is
+        """
+        terms = parse_query(query)
+        if len(terms) == 0:
+            return
+        postings = [self.term_postings(t) for t in terms]
+        if all(p is None for p in postings):
+            raise ValueError("Query %s would match everything" % query)
+
+        # Go through the rarest term, check the others are either side of it
+        rarest = min(
+            (i for i, p in enumerate(postings) if p is not None),
+            key=lambda i: len(postings[i]),
+        )
+        checks = [
+            (i - rarest, p)
+            for i, p in enumerate(postings)
+            if p is not None and i != rarest
+        ]
+        for key in postings[rarest]:
+            if key & TOKEN_MASK < rarest:
+                continue  # Phrase would start before the start of the book
+            if all(_contains(p, key + delta) for delta, p in checks):
+                yield key - rarest, len(terms)
+
+    def search(self, query, within=None):
+        """
+        Yield a :py:class:`Match` for every occurrence of (query), in book order
+
+        - query: A phrase to search for, see :py:func:`parse_query`
+        - within: Only yield matches that are entirely within a region of this class,
+          e.g. "quote.quote". It has to be one of the index's ``within`` classes
+        """
+        if within is not None and within not in self.within:
+            raise ValueError(
+                "Can't search within %s, index wasn't made with it in within" % within
+            )
+        for key, length in self.iter_postings(query):
+            book = key >> BOOK_SHIFT
+            token = key & TOKEN_MASK
+            b = self.books[book]
+            if token + length > len(b.start):
+                continue  # A wildcard at the end, with nothing to match
+            start = b.start[token]
+            end = b.end[token + length - 1]
+            if within is not None and not any(
+                r[0] <= start and r[1] >= end
+                for r in b.within[within].overlapping(start, end)
+            ):
+                continue
+            yield Match(book, token, length, start, end)
+
+    def kwic(self, query, context=5, within=None):
+        """
+        Yield a :py:class:`ConcordanceLine` for every occurrence of (query)
+
+        - query: A phrase to search for, see :py:func:`parse_query`
+        - context: Number of tokens to include either side of the match
+        - within: Only include matches within a region of this class, see :py:meth:`search`
+        """
+        for m in self.search(query, within=within):
+            b = self.books[m.book]
+            left_start = b.start[max(m.token - context, 0)]
+            right_end = b.end[min(m.token + m.length + context, len(b.end)) - 1]
+            yield ConcordanceLine(
+                m.book,
+                m.start,
+                m.end,
+                *(
+                    WHITESPACE_REGEX.sub(" ", b.content[s:e])
+                    for s, e in (
+                        (left_start, m.start),
+                        (m.start, m.end),
+                        (m.end, right_end),
+                    )
+                )
+            )
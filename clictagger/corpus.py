@@ -0,0 +1,128 @@
+"""
+clictagger.corpus: Tag many texts at once
+*****************************************
+
+Tagging a corpus of texts one after another only uses a single CPU. The
+functions here spread the work over a pool of worker processes instead.
+
+Normally you would use this via :py:meth:`clictagger.taggedtext.TaggedText.tag_corpus`,
+which returns a :py:class:`~clictagger.taggedtext.TaggedText` object for each path
+given, in the order given::
+
+    >>> from clictagger.taggedtext import TaggedText
+    >>> for tt in TaggedText.tag_corpus(['alice.txt', 'alice.txt'], workers=2):
+    ...     print("%s: %d chapters, %d tokens" % (
+    ...         tt.name,
+    ...         len(tt.regions['chapter.title']),
+    ...         len(tt.regions['tokens']),
+    ...     ))
+    alice.txt: 12 chapters, 26548 tokens
+    alice.txt: 12 chapters, 26548 tokens
+
+Scheduling
+----------
+
+Files are handed to workers largest-first, so that one huge novel doesn't get
+started last and hold up the end of the run. Results are still returned in
+the order of the paths given, unless ``ordered=False``, in which case they are
+returned as soon as they are finished.
+
+Each worker process is long-lived, and loads ICU's break iterator rules when
+it starts, so the cost of setting up ICU is paid once per worker rather than
+once per file.
+"""
+import multiprocessing
+import os
+
+from .icuconfig import default_locale
+
+
+def _worker_init(max_memory):
+    """Set up a worker process: limit memory, then warm up ICU"""
+    if max_memory is not None:
+        try:
+            import resource
+        except ImportError:  # i.e. Windows, can't limit memory
+            pass
+        else:
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+    import icu
+
+    # Creating an iterator loads (and caches) the rules for this locale
+    icu.BreakIterator.createWordInstance(default_locale())
+    icu.BreakIterator.createSentenceInstance(default_locale())
+
+
+def _worker_call(task):
+    """Call fn(path), return result along with the path's index"""
+    fn, i, path = task
+    return i, fn(path)
+
+
+def largest_first(paths):
+    """
+    Return list of (index, path) for all (paths), biggest file first. Anything
+    that isn't a file (e.g. '-' for STDIN) is considered to be empty
+
+        >>> largest_first(['-', 'alice.txt', 'setup.py'])
+        [(1, 'alice.txt'), (2, 'setup.py'), (0, '-')]
+    """
+
+    def file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    return sorted(enumerate(paths), key=lambda x: (-file_size(x[1]), x[0]))
+
+
+def imap_files(
+    fn, paths, workers=None, ordered=True, max_memory=None, max_tasks_per_worker=None
+):
+    """
+    Call fn(path) for each of (paths) using a pool of worker processes, yielding
+    (path, result) tuples.
+
+    - fn: Function to call, has to be a module-level function (or classmethod) so it can be pickled
+    - paths: List of file paths to process
+    - workers: Number of worker processes to use, defaults to the number of CPUs.
+      If 1, then (fn) is called in the current process without a pool
+    - ordered: If True, return results in the same order as (paths), otherwise return
+      them as soon as they're ready
+    - max_memory: Limit the address space of each worker to this many bytes. Workers that
+      go over this will raise MemoryError. Not available on Windows
+    - max_tasks_per_worker: Replace each worker process after this many files, to
+      return any memory it is holding on to
+    """
+    paths = list(paths)
+    tasks = [(fn, i, path) for i, path in largest_first(paths)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    if workers <= 1:
+        # Nothing to parallelise, do everything here in order
+        for path in paths:
+            yield path, fn(path)
+        return
+
+    with multiprocessing.Pool(
+        workers,
+        initializer=_worker_init,
+        initargs=(max_memory,),
+        maxtasksperchild=max_tasks_per_worker,
+    ) as pool:
+        pending = {}
+        next_i = 0
+        for i, result in pool.imap_unordered(_worker_call, tasks, chunksize=1):
+            if not ordered:
+                yield paths[i], result
+                continue
+
+            # Hold on to result until everything before it is done
+            pending[i] = result
+            while next_i in pending:
+                yield paths[next_i], pending.pop(next_i)
+                next_i += 1
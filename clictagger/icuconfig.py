@@ -1,8 +1,24 @@
 """
 clic.icuconfig: Global locale used for ICU
 ******************************************
+
+ICU is only imported, and the locale created, once something needs it, so
+e.g. ``clictagger --help`` doesn't pay for either.
 """
-import icu
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def default_locale():
+    """Return the ICU Locale to use for all break iterators"""
+    import icu
+
+    # NB: ss=standard adds sentence break rules for ignoring "Mr. Jones".
+    return icu.Locale("en_GB@ss=standard")
+
 
-# NB: ss=standard adds sentence break rules for ignoring "Mr. Jones".
-DEFAULT_LOCALE = icu.Locale("en_GB@ss=standard")
+def __getattr__(name):
+    # NB: DEFAULT_LOCALE used to be created on import, keep it available
+    if name == "DEFAULT_LOCALE":
+        return default_locale()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,195 @@
+"""
+clictagger.mapped: Memory-mapped text files
+*******************************************
+
+Reading a large text file into a string, then tagging it, needs several copies
+of the text in memory at once. A :py:class:`MappedText` memory-maps the file
+instead, and only decodes the parts of it that are asked for::
+
+    >>> text = MappedText('alice.txt')
+    >>> len(text)
+    144396
+    >>> text[0:25]
+    'Alice’s Adventures in Won'
+    >>> text.find("CHAPTER II.")
+    11508
+
+It can be used as the content of a :py:class:`~clictagger.taggedtext.TaggedText`,
+which will then tag one chapter at a time, see :mod:`clictagger.region.chapterwise`.
+:py:meth:`TaggedText.from_file(path, use_mmap=True) <clictagger.taggedtext.TaggedText.from_file>`
+does this for you::
+
+    >>> from clictagger.taggedtext import TaggedText
+    >>> tt = TaggedText.from_file('alice.txt', use_mmap=True)
+    >>> tt.content
+    <MappedText alice.txt>
+    >>> len(tt.regions['quote.quote'])
+    1098
+
+Only UTF-8 files with ``\\n`` line endings can be mapped, since Python would
+otherwise convert line endings when reading the file. :py:func:`map_text` will
+read any other file into a string as normal.
+"""
+import array
+import bisect
+import codecs
+import mmap
+
+#: Size of the blocks (in bytes) that files are decoded in
+BLOCK_SIZE = 64 * 1024
+
+
+def map_text(path):
+    """
+    Return a :py:class:`MappedText` for (path), or a string if the file can't
+    be mapped, e.g. as it has ``\\r\\n`` line endings
+    """
+    text = MappedText(path)
+    if text.buffer.find(b"\r") > -1:
+        # Line endings need translating, can't use the file as-is
+        with open(path, "r", encoding="utf8") as f:
+            return f.read()
+    return text
+
+
+class MappedText:
+    """
+    A read-only string-like view of a memory-mapped UTF-8 text file. Supports
+    ``len()``, indexing & slicing, ``find()`` and ``rfind()``. Use ``str()`` to
+    get the whole text as a string.
+
+    - path: The path of the file to map
+    - block_size: The size of the blocks (in bytes) that the file is decoded in
+    """
+
+    def __init__(self, path, block_size=BLOCK_SIZE):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # i.e. empty file
+                self.buffer = b""
+        self._blocks = {}
+
+        # Index the byte & character offsets of each block
+        # NB: Decoding each block also checks the file is valid UTF-8
+        self._byte_starts = array.array("q")
+        self._char_starts = array.array("q")
+        byte_pos = char_pos = 0
+        while byte_pos < len(self.buffer):
+            byte_end = min(byte_pos + block_size, len(self.buffer))
+            while byte_end < len(self.buffer) and self.buffer[byte_end] & 0xC0 == 0x80:
+                # Don't split a multi-byte character
+                byte_end += 1
+            self._byte_starts.append(byte_pos)
+            self._char_starts.append(char_pos)
+            char_pos += len(str(self.buffer[byte_pos:byte_end], "utf8"))
+            byte_pos = byte_end
+        self._byte_starts.append(len(self.buffer))
+        self._char_starts.append(char_pos)
+
+    def _block(self, i):
+        """Return decoded block (i), keeping the last few used"""
+        if i not in self._blocks:
+            if len(self._blocks) > 4:
+                self._blocks.clear()
+            self._blocks[i] = str(
+                self.buffer[self._byte_starts[i] : self._byte_starts[i + 1]], "utf8"
+            )
+        return self._blocks[i]
+
+    def _block_for_char(self, pos):
+        return (
+            bisect.bisect_right(self._char_starts, pos, hi=len(self._char_starts) - 1)
+            - 1
+        )
+
+    def _byte_offset(self, pos):
+        """Convert character offset (pos) into a byte offset"""
+        i = self._block_for_char(pos)
+        if i < 0:
+            return 0
+        return self._byte_starts[i] + len(
+            self._block(i)[: pos - self._char_starts[i]].encode("utf8")
+        )
+
+    def _char_offset(self, pos):
+        """Convert byte offset (pos) into a character offset"""
+        i = (
+            bisect.bisect_right(self._byte_starts, pos, hi=len(self._byte_starts) - 1)
+            - 1
+        )
+        if i < 0:
+            return 0
+        return self._char_starts[i] + len(
+            str(self.buffer[self._byte_starts[i] : pos], "utf8")
+        )
+
+    def __len__(self):
+        return self._char_starts[-1]
+
+    def __getitem__(self, i):
+        if not isinstance(i, slice):
+            if i < 0:
+                i += len(self)
+            if i < 0 or i >= len(self):
+                raise IndexError("MappedText index out of range")
+            i_block = self._block_for_char(i)
+            return self._block(i_block)[i - self._char_starts[i_block]]
+
+        start, stop, step = i.indices(len(self))
+        if step != 1:
+            return self[start:stop][::step] if step > 0 else str(self)[i]
+        if start >= stop:
+            return ""
+        first = self._block_for_char(start)
+        last = self._block_for_char(stop - 1)
+        if first == last:
+            offset = self._char_starts[first]
+            return self._block(first)[start - offset : stop - offset]
+        return "".join(
+            (
+                self._block(first)[start - self._char_starts[first] :],
+                str(
+                    self.buffer[self._byte_starts[first + 1] : self._byte_starts[last]],
+                    "utf8",
+                ),
+                self._block(last)[: stop - self._char_starts[last]],
+            )
+        )
+
+    def _find(self, find_fn, sub, start, end):
+        start, end, _ = slice(start, end).indices(len(self))
+        out = find_fn(
+            sub.encode("utf8"), self._byte_offset(start), self._byte_offset(end)
+        )
+        return out if out < 0 else self._char_offset(out)
+
+    def find(self, sub, start=None, end=None):
+        """Return the lowest index of (sub) within start..end, or -1, as ``str.find``"""
+        return self._find(self.buffer.find, sub, start, end)
+
+    def rfind(self, sub, start=None, end=None):
+        """Return the highest index of (sub) within start..end, or -1, as ``str.rfind``"""
+        return self._find(self.buffer.rfind, sub, start, end)
+
+    def encode(self, encoding="utf8"):
+        """Return the text encoded as (encoding), without copying it if UTF-8"""
+        if codecs.lookup(encoding).name == "utf-8":
+            return memoryview(self.buffer)
+        return str(self).encode(encoding)
+
+    def __str__(self):
+        return str(self.buffer[:], "utf8")
+
+    def __eq__(self, other):
+        if isinstance(other, MappedText):
+            return self.buffer[:] == other.buffer[:]
+        if isinstance(other, str):
+            return len(self) == len(other) and str(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<MappedText %s>" % self.path
@@ -1,9 +1,17 @@
 import collections
 import html
+import io
 import random
 import re
 import string
 
+#: Characters of output to gather up before each write, see :py:func:`_iter_chunks`
+WRITE_SIZE = 64 * 1024
+
+#: Number of span headers to remember in :py:func:`_gen_markup_html`
+HEADER_CACHE_SIZE = 4096
+
+INITIAL_SPACES_REGEX = re.compile(r"\n +")
 
 HTML_CSS = """
 #tt-ID {
@@ -56,25 +64,53 @@ REGION_COLOURS = [
 ]
 
 
-def _gen_markup_html(ttrm):
-    """Based on algorithm in client/lib/corpora_utils"""
-
-    def text_to_html(s):
-        """Reformat text into HTML"""
+def _iter_chunks(parts, chunk_size=WRITE_SIZE):
+    """Join (parts), an iterator of strings, into chunks of at least (chunk_size) characters"""
+    buf = []
+    buf_size = 0
+    for part in parts:
+        buf.append(part)
+        buf_size += len(part)
+        if buf_size >= chunk_size:
+            yield "".join(buf)
+            buf = []
+            buf_size = 0
+    if buf:
+        yield "".join(buf)
+
+
+def _write_chunks(fp, parts, write_size=WRITE_SIZE):
+    """
+    Write (parts), an iterator of strings, to (fp), joined into chunks of at
+    least (write_size) characters. If (fp) isn't a text file, e.g. a socket,
+    chunks are encoded as UTF-8
+    """
+    binary = not isinstance(fp, io.TextIOBase)
+    for chunk in _iter_chunks(parts, write_size):
+        fp.write(chunk.encode("utf8") if binary else chunk)
+
+
+def _text_to_html(s):
+    """Reformat text into HTML"""
+    s = html.escape(s, quote=False)
+    if "\n" in s:
         # Turn initial spaces into &nbsp;s
-        s = re.sub(
-            r"\n +",
+        s = INITIAL_SPACES_REGEX.sub(
             lambda m: "&nbsp;" * (m.end() - m.start() - 1),
             s,
         )
         # Make new-lines <br/>
         s = s.replace("\n", "<br/>\n")
-        return s
+    return s
+
+
+def _gen_markup_html(ttrm):
+    """Based on algorithm in client/lib/corpora_utils"""
 
     def region_title(r):
-        if r.rvalue is None:
-            return r.rclass
-        return r.rclass + ":" + str(r.rvalue)
+        if r[1] is None:
+            return r[0]
+        return r[0] + ":" + str(r[1])
 
     def rclass_css(rclass):
         return rclass.replace(".", "-")
@@ -91,8 +127,13 @@ def _gen_markup_html(ttrm):
         )
     yield css
 
-    start = 0
+    start = ttrm.start
+    # Region class -> (rclass, rvalue) of open regions
     open_regions = {}
+    # Tuple of open regions -> span header, the same regions often open again
+    # e.g. as a quote starts & ends within a sentence
+    headers = {}
+    content = ttrm.tt.content
     yield '<div class="clictagger-tt" id="%s">' % tt_id
     yield '<ul class="legend">'
     for rclass in ttrm.highlight:
@@ -103,17 +144,24 @@ def _gen_markup_html(ttrm):
         )
     yield "</ul>"
     yield "<span>"
-    for insert in ttrm.iter():
+    # Show all (non-token) regions when hovering, not just highlighted ones
+    rclasses = [x for x in ttrm.tt.regions.keys() if x != "tokens"] + ttrm.highlight
+    for insert in ttrm.iter(rclasses):
         if insert.pos > start:
             # If text is available, start a span with correct regions and insert it
-            yield '</span><span title="%s" class="%s">' % (
-                " ".join(region_title(r) for r in open_regions.values()),
-                " ".join(rclass_css(r.rclass) for r in open_regions.values()),
-            )
-            yield text_to_html(ttrm.tt.content[start : insert.pos])
+            key = tuple(open_regions.values())
+            header = headers.get(key)
+            if header is None:
+                if len(headers) >= HEADER_CACHE_SIZE:
+                    headers.clear()
+                header = headers[key] = '</span><span title="%s" class="%s">' % (
+                    " ".join(region_title(r) for r in key),
+                    " ".join(rclass_css(r[0]) for r in key),
+                )
+            yield header + _text_to_html(content[start : insert.pos])
             start = insert.pos
         if insert.opening:
-            open_regions[insert.rclass] = insert
+            open_regions[insert.rclass] = (insert.rclass, insert.rvalue)
         else:
             if insert.rclass == "chapter.sentence":
                 # NB: We need closing markers since CSS can't say "a sentence that is followed by non-sentence"
@@ -121,6 +169,10 @@ def _gen_markup_html(ttrm):
                     rclass_css(insert.rclass) + "-close",
                 )
             del open_regions[insert.rclass]
+    # Any text after the last insert isn't in a region
+    text = content[start : ttrm.end]
+    if text:
+        yield "</span><span>" + _text_to_html(text)
     yield "</span></div>"
 
 
@@ -139,26 +191,28 @@ def _gen_markup_ansi(ttrm):
         )
     yield "-----------------------------------------------------------------------\n"
 
-    start = 0
+    content = ttrm.tt.content
+    start = ttrm.start
     open_regions = {}
+    # The colour of the text since the last colour change, and the colour it should be now
+    colour = 0
+    new_colour = 0
     for insert in ttrm.iter():
-        if rclass not in ttrm.highlight:
-            continue
         if insert.pos > start:
-            for i, part in enumerate(ttrm.tt.content[start : insert.pos].split("\n")):
-                if i > 0:
-                    yield "\n"
-                # Set / reset region colours after every newline
-                yield REGION_COLOURS[
-                    max(
-                        colour_map[rclass]
-                        for rclass in open_regions.keys() or ["__reset"]
-                    )
-                ]
-                yield part
+            text = content[start : insert.pos]
+            if new_colour != colour:
+                colour = new_colour
+                text = REGION_COLOURS[colour] + text
+            if colour > 0:
+                # Set region colours after every newline
+                text = text.replace("\n", "\n" + REGION_COLOURS[colour])
+            yield text
             start = insert.pos
         if insert.opening:
-            open_regions[insert.rclass] = True
+            open_regions[insert.rclass] = colour_map[insert.rclass]
         else:
             del open_regions[insert.rclass]
-    yield REGION_COLOURS[colour_map["__reset"]]
+        new_colour = max(open_regions.values(), default=0)
+    # Any text after the last region
+    yield (REGION_COLOURS[0] if colour > 0 else "") + content[start : ttrm.end]
+    yield REGION_COLOURS[0]
@@ -211,10 +211,8 @@ break anyway. We also don't break on "Mr. Oliver"::
 """
 import re
 
-import icu
-
-from ..icuconfig import DEFAULT_LOCALE
-from .utils import region_append_without_whitespace
+from ..icuconfig import default_locale
+from .utils import region_append_without_whitespace, tagger_io
 
 
 PART_BREAK_REGEX = re.compile(
@@ -233,6 +231,7 @@ CHAPTER_BREAK_REGEX = re.compile(
 PARAGRAPH_BREAK_REGEX = re.compile(r"\n\n")
 
 
+@tagger_io(outputs=["chapter.part"])
 def tagger_chapter_part(book):
     """Add chapter.part tags to (book)"""
     if len(book.get("chapter.part", [])) > 0:
@@ -243,6 +242,7 @@ def tagger_chapter_part(book):
     ]
 
 
+@tagger_io(outputs=["chapter.title"])
 def tagger_chapter_title(book):
     """Add chapter.title tags to (book)"""
     if len(book.get("chapter.title", [])) > 0:
@@ -253,6 +253,10 @@ def tagger_chapter_title(book):
     ]
 
 
+@tagger_io(
+    inputs=["metadata.title", "metadata.author", "chapter.part", "chapter.title"],
+    outputs=["chapter.text"],
+)
 def tagger_chapter_text(book):
     """Add chapter.text tags to (book)"""
     if len(book.get("chapter.text", [])) > 0:
@@ -282,6 +286,7 @@ def tagger_chapter_text(book):
         last_b = r[1]
 
 
+@tagger_io(inputs=["chapter.text"], outputs=["chapter.paragraph"])
 def tagger_chapter_paragraph(book):
     """Add chapter.paragraph tags to (book)"""
     if len(book.get("chapter.paragraph", [])) > 0:
@@ -306,13 +311,16 @@ def tagger_chapter_paragraph(book):
         region_append_without_whitespace(book, "chapter.paragraph", last_b, b, i)
 
 
+@tagger_io(inputs=["chapter.text"], outputs=["chapter.sentence"])
 def tagger_chapter_sentence(book):
     """Add chapter.sentence tags to (book)"""
     if len(book.get("chapter.sentence", [])) > 0:
         return  # Nothing to do
 
+    import icu
+
     # Create a sentence iterator for this book
-    bi = icu.BreakIterator.createSentenceInstance(DEFAULT_LOCALE)
+    bi = icu.BreakIterator.createSentenceInstance(default_locale())
     bi.setText(
         re.sub(r"\n(?!\n)", " ", book["content"])
     )  # Turn single newlines into spaces, so ICU ignores them.
@@ -0,0 +1,524 @@
+"""
+clic.region.chapterwise: Tag a book one chapter at a time
+*********************************************************
+
+The taggers in :mod:`clic.region.tag` each work on the whole of a book at once,
+which for very large books means several copies of the content in memory.
+However, besides headings, regions only depend on the text in the chapter
+they are in (and a few characters either side). :py:func:`tag_chapterwise`
+uses this to tag a book chapter by chapter, only decoding the text around one
+chapter at a time. The result is the same as :py:func:`~clic.region.tag.tagger`::
+
+    >>> from .tag import tagger
+    >>> content = '''
+    ... Fly Fishing
+    ... J R Hartley
+    ...
+    ... CHAPTER I.
+    ...
+    ... ‘Is this the end of the line,’ he said, ‘or is there more?
+    ...
+    ... CHAPTER II.
+    ...
+    ... ‘There is more,’ said Hartley.
+    ... '''.lstrip()
+    >>> book = dict(content=content)
+    >>> tag_chapterwise(book, ["quote.suspension.short", "tokens"])
+    >>> book["quote.quote"]
+    [(37, 67), (77, 126)]
+    >>> book["quote.suspension.short"]
+    [(68, 76)]
+    >>> full_book = dict(content=content)
+    >>> tagger(full_book, ["quote.suspension.short", "tokens"])
+    >>> all(book[k] == full_book[k] for k in full_book)
+    True
+
+Each chapter is tagged on its own, with the text from the blank line at least
+:py:data:`WINDOW_MARGIN` characters before the chapter to the blank line at least
+:py:data:`WINDOW_MARGIN` characters after. Word and sentence breaks always
+happen at a blank line, so are the same as if the whole book was tagged, and
+quote tagging only looks a few characters either side of a quote mark.
+
+The only state carried between chapters is a quote left open at the end of a
+chapter, as above where the second quote is only closed in chapter II. The
+regions for that chapter are held back until we know if the quote is closed.
+
+:py:func:`iter_chapter_regions` yields the regions for each chapter as they are
+tagged, without gathering them all up. Headings are found with
+:py:func:`iter_headings`, which reads the content a chunk at a time.
+
+Tagging in parallel
+-------------------
+
+As chapters are tagged on their own, they can be tagged at the same time.
+Given ``workers=N``, :py:func:`iter_chapter_regions` hands chapters to a pool of
+N worker processes, along with the text in their window. Paragraph and sentence
+numbers restart in each chapter, and chapter numbers come from the headings,
+which are found up front, so there's no numbering to fix up afterwards.
+
+A worker doesn't know what state the chapter before it will leave behind, so it
+guesses there's no open quote, and that the chapters before had sentences. As
+results come back they are checked in order against the real state, and any
+chapter tagged with the wrong guess is tagged again in this process. This is
+rare, as most chapters don't end in the middle of a quote, and the regions are
+always the same as tagging without workers::
+
+    >>> book = dict(content=content)
+    >>> tag_chapterwise(book, ["quote.suspension.short", "tokens"], workers=2)
+    >>> all(book[k] == full_book[k] for k in full_book)
+    True
+
+The content can be a string, or anything that supports ``len()``, slicing,
+``find()`` and ``rfind()``, e.g. a :py:class:`~clictagger.mapped.MappedText`.
+"""
+import collections
+
+from ..timing import merge_recorded, stage, timed_call
+from ..tokenizer import Vocabulary, WordIndex, types_from_string
+from .column import RegionColumn
+from .chapter import (
+    CHAPTER_BREAK_REGEX,
+    PART_BREAK_REGEX,
+    tagger_chapter_paragraph,
+    tagger_chapter_sentence,
+)
+from .metadata import tagger_metadata
+from .quote import find_quotes, tagger_quote_nonquote
+from .suspension import find_suspensions
+from .tag import ALL_RCLASSES, taggers_for
+from .utils import region_append_without_whitespace
+
+#: Characters (at least) either side of a chapter that taggers may look at
+WINDOW_MARGIN = 16
+
+#: Characters (roughly) of content to read at once when looking for headings
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_headings(content, chunk_size=CHUNK_SIZE):
+    """
+    Yield (rclass, region) for each ``metadata.*``, ``chapter.part`` and
+    ``chapter.title`` region in (content), in order.
+
+    (content) is read in chunks of roughly (chunk_size) characters, split after
+    an empty line, which no heading can cross.
+
+        >>> list(iter_headings("CHAPTER I.\\n\\nOnce.\\n\\nCHAPTER II.\\n\\nTwice.", chunk_size=5))
+        [('chapter.title', (0, 10, 1)), ('chapter.title', (19, 30, 2))]
+    """
+    counts = {"chapter.part": 0, "chapter.title": 0}
+    chunk_start = 0
+    while True:
+        chunk_end = content.find("\n\n", chunk_start + chunk_size)
+        chunk_end = len(content) if chunk_end < 0 else chunk_end + 2
+        if chunk_end <= chunk_start:
+            break
+        chunk = content[chunk_start:chunk_end]
+
+        headings = []
+        if chunk_start == 0:
+            book = dict(content=chunk)
+            with stage("metadata"):
+                tagger_metadata(book)
+            for rclass in ("metadata.title", "metadata.author"):
+                headings.extend((rclass, r) for r in book.get(rclass, []))
+        for rclass, regex in (
+            ("chapter.part", PART_BREAK_REGEX),
+            ("chapter.title", CHAPTER_BREAK_REGEX),
+        ):
+            with stage(rclass):
+                for m in regex.finditer(chunk):
+                    counts[rclass] += 1
+                    headings.append(
+                        (
+                            rclass,
+                            (
+                                m.start() + chunk_start,
+                                m.end() + chunk_start,
+                                counts[rclass],
+                            ),
+                        )
+                    )
+        # NB: Same order as tagger_chapter_text would use
+        headings.sort(key=lambda h: (h[1][0], -h[1][1]))
+        yield from headings
+        chunk_start = chunk_end
+
+
+def _iter_chapters(content, chunk_size):
+    """
+    Yield (headings, chapter_r) for each chapter.text region in (content), where
+    headings is a list of (rclass, region) found before it. Any headings after
+    the last chapter are yielded with a chapter_r of None.
+    """
+    last_b = 0
+    chapter_num = 0
+    headings = []
+
+    def chapters_before(b):
+        # NB: Same as tagger_chapter_text, but only looking at text since the last heading
+        with stage("chapter.text"):
+            book = dict(content=content[last_b:b])
+            region_append_without_whitespace(
+                book, "chapter.text", 0, b - last_b, chapter_num
+            )
+            return _shift(book.get("chapter.text", []), last_b)
+
+    for rclass, r in iter_headings(content, chunk_size):
+        for chapter_r in chapters_before(r[0]):
+            yield headings, chapter_r
+            headings = []
+        headings.append((rclass, r))
+        if rclass == "chapter.title":
+            chapter_num = r[2]
+        last_b = r[1]
+
+    # NB: Only use len() once all headings are found, i.e. we've read all of content
+    for chapter_r in chapters_before(len(content)):
+        yield headings, chapter_r
+        headings = []
+    if headings:
+        yield headings, None
+
+
+def _iter_units(content, chunk_size):
+    """
+    Yield (headings, chapter_r, span) for each chapter, where span is the
+    (start, end) of the text from the first heading to the next chapter's first heading
+    """
+    unit = None
+    for headings, chapter_r in _iter_chapters(content, chunk_size):
+        if unit is None:
+            span_start = 0
+        else:
+            span_start = headings[0][1][0]
+            yield unit[0], unit[1], (unit[2], span_start)
+        unit = (headings, chapter_r, span_start)
+    if unit is not None:
+        yield unit[0], unit[1], (unit[2], len(content))
+
+
+def _shift(regions, delta):
+    return [(r[0] + delta, r[1] + delta) + tuple(r[2:]) for r in regions]
+
+
+def _shift_quote(open_quote, delta):
+    if open_quote is None:
+        return None
+    return (open_quote[0], open_quote[1] + delta) + tuple(open_quote[2:])
+
+
+def _chapter_window(content, chapter_r):
+    """
+    Return (start, end) of the text to tag chapter (chapter_r) with, see module
+    docstring for why this is enough
+    """
+    start = content.rfind("\n\n", 0, max(chapter_r[0] - WINDOW_MARGIN, 0)) + 1
+    end = content.find("\n\n", chapter_r[1] + WINDOW_MARGIN)
+    return (start, len(content) if end < 0 else end + 2)
+
+
+def _tag_chapter(window_text, w_start, chapter_r, out, open_quote, seen_sentence):
+    """
+    Tag chapter (chapter_r), using (window_text), the text of the content from
+    (w_start) onwards given by :py:func:`_chapter_window`, adding regions to (out).
+
+    - open_quote: Any quote left open at the end of the last chapter
+    - seen_sentence: Have any sentences been found in previous chapters?
+
+    Returns (open_quote, variants), where open_quote is any quote left open
+    at the end of this chapter. If that quote started in this chapter, whether
+    it turns out to be a quote changes this chapter's quote.nonquote and
+    quote.suspension.* regions. variants is then a dict of True/False
+    to the regions for either case, which the caller should add to (out).
+    """
+    book = {
+        "content": window_text,
+        "chapter.text": _shift([chapter_r], -w_start),
+    }
+    cs = chapter_r[0] - w_start
+
+    if "chapter.paragraph" in out:
+        with stage("chapter.paragraph"):
+            tagger_chapter_paragraph(book)
+    if "chapter.sentence" in out:
+        with stage("chapter.sentence"):
+            tagger_chapter_sentence(book)
+    if "quote.quote" in out:
+        with stage("word_index"):
+            words = WordIndex(book["content"])
+        with stage("quote.quote"):
+            book["quote.quote"] = []
+            book["quote.embedded"] = []
+            open_quote = find_quotes(
+                book,
+                book["chapter.paragraph"],
+                _shift_quote(open_quote, -w_start),
+                words=words,
+            )
+            open_quote = _shift_quote(open_quote, w_start)
+    for rclass in out:
+        if rclass in book and rclass != "chapter.text":
+            out[rclass].extend(_shift(book[rclass], w_start))
+
+    if "quote.nonquote" not in out:
+        return open_quote, None
+
+    # Quotes starting in this chapter, plus one that may still be open
+    quotes = [r for r in book["quote.quote"] if r[0] >= cs]
+    open_here = open_quote is not None and open_quote[1] >= chapter_r[0]
+    variants = {}
+    for is_quote in (False, True) if open_here else (False,):
+        variant = variants[is_quote] = {}
+        nonquote_book = {
+            "content": book["content"],
+            "chapter.text": book["chapter.text"],
+            "quote.quote": quotes
+            + (
+                [(open_quote[1] - w_start, len(book["content"]) + 1)]
+                if is_quote
+                else []
+            ),
+        }
+        with stage("quote.nonquote"):
+            tagger_quote_nonquote(nonquote_book)
+        variant["quote.nonquote"] = _shift(nonquote_book["quote.nonquote"], w_start)
+
+        if "quote.suspension.short" not in out:
+            continue
+        suspension_book = {
+            "content": book["content"],
+            "chapter.paragraph": book["chapter.paragraph"],
+            # NB: find_suspensions ignores the end of the first sentence in the book
+            "chapter.sentence": ([(-1, -1)] if seen_sentence else [])
+            + book["chapter.sentence"],
+            "quote.suspension.short": [],
+            "quote.suspension.long": [],
+        }
+        with stage("quote.suspension"):
+            find_suspensions(
+                suspension_book, nonquote_book["quote.nonquote"], words=words
+            )
+        for rclass in ("quote.suspension.short", "quote.suspension.long"):
+            variant[rclass] = _shift(suspension_book[rclass], w_start)
+
+    if not open_here:
+        out.update(variants[False])
+        variants = None
+    return open_quote, variants
+
+
+def _tag_unit(
+    wanted,
+    headings,
+    chapter_r,
+    span,
+    text,
+    window,
+    window_text,
+    open_quote,
+    seen_sentence,
+):
+    """
+    Tag the chapter from :py:func:`_iter_units`, returning (out, open_quote, variants)
+    as :py:func:`_tag_chapter`, where out is a dict of (wanted) region classes
+    to regions starting within (span).
+
+    - text: The text within (span)
+    - window: The (start, end) from :py:func:`_chapter_window`, or None if there's no chapter to tag
+    - window_text: The text within (window)
+    """
+    out = {rclass: [] for rclass in wanted}
+    for rclass, r in headings:
+        if rclass in out:
+            out[rclass].append(r)
+
+    variants = None
+    if window is not None:
+        out["chapter.text"].append(chapter_r)
+        open_quote, variants = _tag_chapter(
+            window_text, window[0], chapter_r, out, open_quote, seen_sentence
+        )
+
+    if "tokens" in out:
+        with stage("tokens"):
+            out["tokens"] = [
+                (t_start, t_end, ttype)
+                for ttype, t_start, t_end in types_from_string(text, offset=span[0])
+            ]
+    return out, open_quote, variants
+
+
+def _iter_guesses(units, workers):
+    """
+    Tag each of (units), arguments for :py:func:`_tag_unit`, in a pool of
+    (workers) processes, yielding (unit, guess) in order. The state from the
+    chapter before isn't known yet, so guess is (state, result), where result is
+    from tagging assuming state, (open_quote, seen_sentence), i.e. no quote left open
+    and sentences in any chapter before.
+
+    Only a few units are handed to the pool at once, so only the text of a few
+    chapters is held in memory. Stages timed in the workers are added to any
+    :py:mod:`~clictagger.timing` being recorded here.
+    """
+    import multiprocessing
+
+    from ..corpus import _worker_init
+
+    with multiprocessing.Pool(
+        workers, initializer=_worker_init, initargs=(None,)
+    ) as pool:
+        pending = collections.deque()
+        seen_chapter = False
+        for unit in units:
+            state = (None, seen_chapter)
+            pending.append(
+                (
+                    unit,
+                    state,
+                    pool.apply_async(timed_call, (_tag_unit,) + unit + state),
+                )
+            )
+            seen_chapter = seen_chapter or unit[5] is not None
+            if len(pending) >= workers * 2:
+                unit, state, result = pending.popleft()
+                yield unit, (state, merge_recorded(*result.get()))
+        while pending:
+            unit, state, result = pending.popleft()
+            yield unit, (state, merge_recorded(*result.get()))
+
+
+def iter_chapter_regions(content, rclasses=None, chunk_size=CHUNK_SIZE, workers=1):
+    """
+    Tag (content) one chapter at a time, yielding (span, text, regions) for each
+    chapter, where:
+
+    - span: (start, end) of the chapter, from the start of the headings before it
+      to the start of the headings after
+    - text: The text within span
+    - regions: A dict of region class to a list of regions that start within span
+
+    Joining the regions for all chapters together gives the same regions as
+    tagging the whole of (content) at once.
+
+    - rclasses: Region classes to tag. Like :py:func:`~clic.region.tag.tagger`,
+      any region classes needed for these are also tagged, and by default all
+      region classes other than tokens are tagged
+    - chunk_size: Characters to read at once when looking for headings
+    - workers: Number of worker processes to tag chapters with, if more than 1.
+      See "Tagging in parallel" above
+
+    If (content) has a ``release(pos)`` method, it is called once text before pos
+    won't be needed again, see :py:class:`clictagger.stream.StreamText`.
+
+        >>> for span, text, regions in iter_chapter_regions("CHAPTER I.\\n\\nOnce.\\n\\nCHAPTER II.\\n\\nTwice.", ["chapter.text"]):
+        ...     print(span, repr(text), regions["chapter.title"], regions["chapter.text"])
+        (0, 19) 'CHAPTER I.\\n\\nOnce.\\n\\n' [(0, 10, 1)] [(12, 17, 1)]
+        (19, 38) 'CHAPTER II.\\n\\nTwice.' [(19, 30, 2)] [(32, 38, 2)]
+    """
+    if rclasses is None:
+        rclasses = [x for x in ALL_RCLASSES if x != "tokens"]
+    wanted = [rclass for fn in taggers_for(rclasses) for rclass in fn.outputs]
+    release = getattr(content, "release", None)
+
+    def units():
+        for headings, chapter_r, span in _iter_units(content, chunk_size):
+            text = content[span[0] : span[1]]
+            window = window_text = None
+            if chapter_r is not None and "chapter.text" in wanted:
+                window = _chapter_window(content, chapter_r)
+                window_text = content[window[0] : window[1]]
+                if release is not None:
+                    # NB: The next chapter's window can't start before this one's
+                    release(window[0] - 1)
+            yield (wanted, headings, chapter_r, span, text, window, window_text)
+
+    if workers > 1:
+        guessed_units = _iter_guesses(units(), workers)
+    else:
+        guessed_units = ((unit, None) for unit in units())
+
+    open_quote = None
+    seen_sentence = False
+    # Chapters waiting for a quote to be closed. The first one opened the quote
+    # at waiting_quote, and has waiting_variants of its regions
+    waiting = []
+    waiting_quote = None
+    waiting_variants = None
+    for unit, guess in guessed_units:
+        chapter_r, span, text = unit[2:5]
+        if guess is not None and guess[0] == (open_quote, seen_sentence):
+            out, open_quote, variants = guess[1]
+        else:
+            # Not tagged yet, or tagged with the wrong state
+            out, open_quote, variants = _tag_unit(*unit, open_quote, seen_sentence)
+        seen_sentence = seen_sentence or len(out.get("chapter.sentence", [])) > 0
+
+        if waiting:
+            owner = waiting[0][2]
+            quotes = out.get("quote.quote", [])
+            if len(quotes) > 0 and quotes[0][0] == waiting_quote:
+                # Closed the quote from an earlier chapter, it belongs there
+                owner["quote.quote"].append(quotes.pop(0))
+                is_quote = True
+            elif open_quote is not None and open_quote[1] == waiting_quote:
+                # Still open, keep waiting
+                waiting.append((span, text, out))
+                continue
+            else:
+                is_quote = False
+            if waiting_variants is not None:
+                owner.update(waiting_variants[is_quote])
+            yield from waiting
+            waiting = []
+
+        if (
+            open_quote is not None
+            and chapter_r is not None
+            and open_quote[1] >= chapter_r[0]
+        ):
+            # Quote opened in this chapter is still open, wait to see if it's closed
+            waiting = [(span, text, out)]
+            waiting_variants = variants
+            waiting_quote = open_quote[1]
+        else:
+            yield span, text, out
+
+    # Anything still open at the end of the book isn't a quote
+    if waiting:
+        if waiting_variants is not None:
+            waiting[0][2].update(waiting_variants[False])
+        yield from waiting
+
+
+def tag_chapterwise(book, rclasses=None, chunk_size=CHUNK_SIZE, workers=1):
+    """
+    Add any missing tags to (book), tagging one chapter at a time with
+    :py:func:`iter_chapter_regions`. Otherwise the same as :py:func:`~clic.region.tag.tagger`.
+
+    - rclasses: Only add these region classes, and any they need.
+      By default, all region classes other than tokens are added.
+    - chunk_size: Characters to read at once when looking for headings
+    - workers: Number of worker processes to tag chapters with, if more than 1
+    """
+    if rclasses is None:
+        rclasses = [x for x in ALL_RCLASSES if x != "tokens"]
+    wanted = [rclass for fn in taggers_for(rclasses, book) for rclass in fn.outputs]
+    if not wanted:
+        return  # Nothing to do
+
+    out = {}
+    for rclass in wanted:
+        if rclass == "tokens":
+            out[rclass] = RegionColumn(
+                vocabulary=book.get("vocabulary", None) or Vocabulary()
+            )
+        else:
+            out[rclass] = RegionColumn()
+    for span, text, regions in iter_chapter_regions(
+        book["content"], wanted, chunk_size=chunk_size, workers=workers
+    ):
+        for rclass, col in out.items():
+            col.extend(regions[rclass])
+    for rclass, col in out.items():
+        book.setdefault(rclass, col)
@@ -0,0 +1,281 @@
+"""
+clic.region.column: Compact storage for regions
+***********************************************
+
+A book has a lot of regions, particularly tokens. Storing each as a tuple of
+python objects is expensive, so instead the regions for a region class are
+stored in a :py:class:`RegionColumn`, an array each for start, end and region
+value::
+
+    >>> col = RegionColumn([(0, 5, 1), (7, 12, 2)])
+    >>> col.start, col.end, col.rvalue
+    (array('q', [0, 7]), array('q', [5, 12]), array('q', [1, 2]))
+
+A :py:class:`RegionColumn` still behaves like a list of tuples, so it can be
+used anywhere a list of regions is expected::
+
+    >>> col
+    [(0, 5, 1), (7, 12, 2)]
+    >>> col.append((14, 20, 3))
+    >>> len(col), col[2], col[-1]
+    (3, (14, 20, 3), (14, 20, 3))
+    >>> col[1:]
+    [(7, 12, 2), (14, 20, 3)]
+    >>> col + [(30, 40, 4)]
+    [(0, 5, 1), (7, 12, 2), (14, 20, 3), (30, 40, 4)]
+    >>> col == [(0, 5, 1), (7, 12, 2), (14, 20, 3)]
+    True
+
+Regions without a value only store start & end::
+
+    >>> col = RegionColumn([(0, 5), (7, 12)])
+    >>> col, col.rvalue, col[::-1]
+    ([(0, 5), (7, 12)], None, [(7, 12), (0, 5)])
+
+Region values that aren't integers are kept in a list::
+
+    >>> col = RegionColumn([(0, 5, 'alice'), (7, 12, 'rabbit')])
+    >>> col, col.rvalue, col[1:]
+    ([(0, 5, 'alice'), (7, 12, 'rabbit')], ['alice', 'rabbit'], [(7, 12, 'rabbit')])
+
+...unless they are stored in a :py:class:`~clictagger.tokenizer.Vocabulary`,
+in which case the column stores their IDs::
+
+    >>> from clictagger.tokenizer import Vocabulary
+    >>> col = RegionColumn([(0, 5, 'alice'), (7, 12, 'rabbit'), (14, 19, 'alice')], vocabulary=Vocabulary())
+    >>> col, col.rvalue
+    ([(0, 5, 'alice'), (7, 12, 'rabbit'), (14, 19, 'alice')], array('q', [0, 1, 0]))
+    >>> col[1:]
+    [(7, 12, 'rabbit'), (14, 19, 'alice')]
+
+Columns can be moved to another vocabulary, e.g. one shared across a corpus::
+
+    >>> shared = Vocabulary(['rabbit'])
+    >>> col.set_vocabulary(shared)
+    >>> col, col.rvalue
+    ([(0, 5, 'alice'), (7, 12, 'rabbit'), (14, 19, 'alice')], array('q', [1, 0, 1]))
+
+Part of a column can be replaced with new regions, moving everything after
+by a given offset::
+
+    >>> col = RegionColumn([(0, 5), (7, 12), (14, 20)])
+    >>> col.splice(1, 2, [(7, 9), (10, 14)], delta=2)
+    >>> col
+    [(0, 5), (7, 9), (10, 14), (16, 22)]
+
+A :py:class:`RegionIndex` finds the regions in a column at a position, or
+overlapping a range, by bisecting rather than scanning the column::
+
+    >>> index = RegionIndex(col)
+    >>> index.overlapping(8, 12)
+    [(7, 9), (10, 14)]
+    >>> index.at(9), index.at(10)
+    ([], [(10, 14)])
+"""
+
+import array
+import bisect
+import collections.abc
+import itertools
+
+
+class RegionColumn(collections.abc.Sequence):
+    """
+    A list of (start, end) or (start, end, rvalue) region tuples, stored as arrays.
+
+    - regions: Iterable of region tuples to initialise the column with
+    - vocabulary: Optional :py:class:`~clictagger.tokenizer.Vocabulary`, to store
+      region values as IDs in
+    """
+
+    def __init__(self, regions=(), vocabulary=None):
+        self.start = array.array("q")
+        self.end = array.array("q")
+        self.rvalue = None if vocabulary is None else array.array("q")
+        self.vocabulary = vocabulary
+        self.extend(regions)
+
+    @classmethod
+    def from_arrays(cls, start, end, rvalue=None, vocabulary=None):
+        """
+        Make a column from existing arrays, without copying them. The arrays can
+        also be read-only, e.g. memoryviews of a memory-mapped file, in which case
+        they will be copied the first time the column is changed.
+
+            >>> RegionColumn.from_arrays(memoryview(array.array("q", [0, 7])), array.array("q", [5, 12]))
+            [(0, 5), (7, 12)]
+        """
+        col = cls(vocabulary=vocabulary)
+        col.start = start
+        col.end = end
+        col.rvalue = rvalue
+        return col
+
+    def _writable(self):
+        """Make sure our arrays can be modified"""
+        if not isinstance(self.start, array.array):
+            self.start = array.array("q", self.start)
+            self.end = array.array("q", self.end)
+        if self.rvalue is not None and not isinstance(self.rvalue, (array.array, list)):
+            self.rvalue = array.array("q", self.rvalue)
+
+    def set_vocabulary(self, vocabulary):
+        """Store region values as IDs within (vocabulary) instead"""
+        if self.vocabulary is vocabulary:
+            return  # Nothing to do
+        new_ids = array.array("q", (vocabulary.id(t) for t in self.vocabulary))
+        self.rvalue = array.array("q", (new_ids[i] for i in self.rvalue))
+        self.vocabulary = vocabulary
+
+    def append(self, region):
+        """Add (region) tuple to the end of the column"""
+        if len(region) > 2 and self.rvalue is None:
+            if len(self.start) > 0:
+                raise ValueError("Cannot add region value to column without values")
+            self.rvalue = array.array("q") if isinstance(region[2], int) else []
+        elif len(region) < 3 and self.rvalue is not None:
+            raise ValueError("Region value missing for %s" % str(region))
+
+        self._writable()
+        self.start.append(region[0])
+        self.end.append(region[1])
+        if self.vocabulary is not None:
+            self.rvalue.append(self.vocabulary.id(region[2]))
+        elif self.rvalue is not None:
+            try:
+                self.rvalue.append(region[2])
+            except TypeError:
+                # Not an integer after all, fall back to a list
+                self.rvalue = list(self.rvalue)
+                self.rvalue.append(region[2])
+
+    def extend(self, regions):
+        """Add all (regions) to the end of the column"""
+        for r in regions:
+            self.append(r)
+
+    def splice(self, i, j, regions, delta=0):
+        """
+        Replace regions i..j (end-exclusive) of the column with (regions),
+        adding (delta) to the start & end of all regions after j
+        """
+        self._writable()
+        middle = RegionColumn(regions, vocabulary=self.vocabulary)
+        if self.rvalue is None and middle.rvalue is not None and len(self) > 0:
+            raise ValueError("Cannot add region value to column without values")
+
+        def shifted(arr):
+            return array.array("q", map(delta.__add__, arr[j:]))
+
+        self.start = self.start[:i] + middle.start + shifted(self.start)
+        self.end = self.end[:i] + middle.end + shifted(self.end)
+        if self.rvalue is None:
+            self.rvalue = middle.rvalue
+        elif middle.rvalue is None:
+            self.rvalue = self.rvalue[:i] + self.rvalue[j:]
+        elif isinstance(self.rvalue, list) or isinstance(middle.rvalue, list):
+            self.rvalue = (
+                list(self.rvalue[:i]) + list(middle.rvalue) + list(self.rvalue[j:])
+            )
+        else:
+            self.rvalue = self.rvalue[:i] + middle.rvalue + self.rvalue[j:]
+
+    def __getstate__(self):
+        # Memoryviews can't be pickled, copy them before sending to another process
+        self._writable()
+        return self.__dict__
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            # NB: Only build the regions within the slice
+            if self.rvalue is None:
+                return list(zip(self.start[i], self.end[i]))
+            if self.vocabulary is not None:
+                return list(
+                    zip(
+                        self.start[i],
+                        self.end[i],
+                        map(self.vocabulary.types.__getitem__, self.rvalue[i]),
+                    )
+                )
+            return list(zip(self.start[i], self.end[i], self.rvalue[i]))
+        if self.rvalue is None:
+            return (self.start[i], self.end[i])
+        if self.vocabulary is not None:
+            return (self.start[i], self.end[i], self.vocabulary[self.rvalue[i]])
+        return (self.start[i], self.end[i], self.rvalue[i])
+
+    def __iter__(self):
+        if self.rvalue is None:
+            return zip(self.start, self.end)
+        if self.vocabulary is not None:
+            return zip(
+                self.start,
+                self.end,
+                map(self.vocabulary.types.__getitem__, self.rvalue),
+            )
+        return zip(self.start, self.end, self.rvalue)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            tuple(a) == tuple(b) for a, b in zip(self, other)
+        )
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class RegionIndex:
+    """
+    An index of a :py:class:`RegionColumn`, to find regions by position. Regions
+    are sorted by start, so bisecting the starts finds the last region that
+    could overlap a range. To find the first, we bisect the greatest end of all
+    regions so far. For regions that don't overlap each other, i.e. most region
+    classes, this is the end of each region, so the column's ends are used as-is::
+
+        >>> index = RegionIndex(RegionColumn([(0, 20, 'a'), (2, 5, 'b'), (6, 9, 'c'), (12, 30, 'd')]))
+        >>> index.max_end
+        array('q', [20, 20, 20, 30])
+        >>> index.overlapping(7, 13)
+        [(0, 20, 'a'), (6, 9, 'c'), (12, 30, 'd')]
+        >>> index.at(5)
+        [(0, 20, 'a')]
+
+    The index doesn't notice changes to the column, make a new one if it changes.
+
+    - col: The :py:class:`RegionColumn` to index, sorted by start
+    """
+
+    def __init__(self, col):
+        self.col = col
+        self.max_end = array.array("q", itertools.accumulate(col.end, max))
+        if self.max_end == col.end:
+            # Ends are in order, use them as-is
+            self.max_end = col.end
+
+    def indices(self, start, end):
+        """Return a range of the indices of regions that could overlap start..end"""
+        return range(
+            bisect.bisect_right(self.max_end, start),
+            bisect.bisect_left(self.col.start, end),
+        )
+
+    def overlapping(self, start, end):
+        """Return a list of regions overlapping (start)..(end)"""
+        col = self.col
+        return [col[i] for i in self.indices(start, end) if col.end[i] > start]
+
+    def at(self, pos):
+        """Return a list of regions containing character (pos)"""
+        return self.overlapping(pos, pos + 1)
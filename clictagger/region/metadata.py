@@ -35,9 +35,12 @@ Anything that doesn't match this gets ignored::
 """
 import re
 
+from .utils import tagger_io
+
 TITLE_AUTHOR_REGEX = re.compile(r"^(.+)\n(.+)\n\n")
 
 
+@tagger_io(outputs=["metadata.title", "metadata.author"])
 def tagger_metadata(book):
     """
     Add metadata.* tags to regions
@@ -280,13 +280,11 @@ Embedded quotes can also be found in multi-paragraph quotes, example from ChiLit
 
 .. http://unicode.org/reports/tr29/#Word_Boundaries
 """
+import bisect
 import re
 
-import icu
-
-from ..icuconfig import DEFAULT_LOCALE
-from ..tokenizer import word_boundary_type
-from .utils import region_append_without_whitespace, regions_invert
+from ..tokenizer import WordIndex
+from .utils import region_append_without_whitespace, regions_invert, tagger_io
 
 
 QUOTES = {
@@ -297,19 +295,42 @@ QUOTES = {
     "'": "'",  # Single universal.
 }
 
+#: Any character that could open or close a quote
+QUOTE_MARKS_REGEX = re.compile(
+    "[%s]" % "".join(re.escape(x) for x in sorted(set(QUOTES) | set(QUOTES.values())))
+)
+
+
+def quote_opening(s, q_start):
+    """
+    The parts of :py:func:`is_quote` that only need the opening quote mark at
+    (q_start), so they can be worked out before the closing quote mark is found.
+    Returns (single, punctuation), is it a single quote-mark, and is it surrounded by punctuation?
+    """
+    return (
+        s[q_start] in set(("’", "'")),
+        # ... select punctuation before the quote
+        bool(re.search(r"(?:\-\-|\(|,|:|;)\s*$", s[q_start - 4 : q_start]))
+        # ... select punctuation at the start
+        or bool(re.search(r"^\s*(?:\-\-)", s[q_start + 1 : q_start + 6])),
+    )
+
 
-def is_quote(s, q_start, q_end, wc):
-    """Is this pair of quote-marks a valid quote, or "other construct" that should be ignored?"""
+def is_quote(s, q_start, q_end, wc, opening=None):
+    """
+    Is this pair of quote-marks a valid quote, or "other construct" that should be ignored?
+
+    - opening: The result of :py:func:`quote_opening` for (q_start), if already known
+    """
+    if opening is None:
+        opening = quote_opening(s, q_start)
     # Quotes should have one of...
 
     # ...five or more words (for double quotes)
-    if wc >= 5 and s[q_start] not in set(("’", "'")):
-        return True
-    # ... select punctuation before the quote
-    if re.search(r"(?:\-\-|\(|,|:|;)\s*$", s[q_start - 4 : q_start]):
+    if wc >= 5 and not opening[0]:
         return True
-    # ... select punctuation at the start
-    if re.search(r"^\s*(?:\-\-)", s[q_start + 1 : q_start + 6]):
+    # ... select punctuation before the quote, or at the start
+    if opening[1]:
         return True
     # ... select punctuation before the end
     if re.search(r"--\s*$|[,?.!-;_]$", s[q_end - 5 : q_end - 1]):
@@ -320,65 +341,105 @@ def is_quote(s, q_start, q_end, wc):
     return False
 
 
+def paragraph_continues_quote(s, containing_r):
+    """
+    Can an open quote from a previous paragraph continue into paragraph (containing_r)?
+    Only if the paragraph starts with a quote marker or an indent.
+    """
+    return (
+        s[containing_r[0] : containing_r[0] + 1] in QUOTES
+        or s[containing_r[0] - 3 : containing_r[0]] == "   "
+    )
+
+
+@tagger_io(inputs=["chapter.paragraph"], outputs=["quote.quote", "quote.embedded"])
 def tagger_quote_quote(book):
     """Add quote.quote tags to (book)"""
     if len(book.get("quote.quote", [])) > 0:
         return  # Nothing to do
 
-    # Create a word iterator for this book
-    bi = icu.BreakIterator.createWordInstance(DEFAULT_LOCALE)
-    bi.setText(book["content"])
-
     book["quote.quote"] = []
     book["quote.embedded"] = []
-    open_quote = None  # NB: Don't reset last-open-quote on each paragraph
+    find_quotes(book, book["chapter.paragraph"], words=book.get("word_index", None))
+
+
+def find_quotes(book, paragraphs, open_quote=None, words=None):
+    """
+    Add quote.quote / quote.embedded tags found in (paragraphs) to (book).
+
+    - paragraphs: A list of consecutive chapter.paragraph regions
+    - open_quote: A quote left open by a previous call, if continuing on from it
+    - words: A :py:class:`~clictagger.tokenizer.WordIndex` for the content, by
+      default one is made for just (paragraphs)
+
+    Returns any quote still open at the end of (paragraphs), for passing onto a
+    following call.
+    """
+    if words is None:
+        words = (
+            WordIndex(book["content"], paragraphs[0][0], paragraphs[-1][1])
+            if len(paragraphs) > 0
+            else WordIndex("")
+        )
+    content = book["content"]
+    offsets = words.offsets
+    classes = words.classes
+    word_counts = words.word_counts
+
+    # NB: Word counts in open_quote are relative to the end of the previous call
     embedded_quote = None
     word_count = 0
-    for containing_r in book["chapter.paragraph"]:
-        last_b = containing_r[0]
-
-        if open_quote and not (
-            book["content"][containing_r[0] : containing_r[0] + 1] in QUOTES
-            or book["content"][containing_r[0] - 3 : containing_r[0]] == "   "
-        ):
+    for containing_r in paragraphs:
+        if open_quote and not paragraph_continues_quote(content, containing_r):
             # Continuing an open_quote from a previous paragarph, but paragraph didn't start with a quote marker or indent, ditch.
             open_quote = None
 
-        # Get all word breaks after containing_r[0]
-        bi.following(containing_r[0] - 1)
-        for b in bi:
-            if b > containing_r[1]:
-                # Outside the chapter now, so stop. Leave any open quotes still open, assume any embedded quotes broken
-                embedded_quote = None
-                break
-            word = book["content"][last_b:b]
-
-            if word_boundary_type(book["content"], bi, last_b):
-                # Text up to this boundary is "wordy", this includes our own extras, such as:
-                # * Posessives, "3 days' work".
-                # * Abbreviations, "'twas a dark and stormy night"
-                # ...increase our word count and ignore these characters for quote-finding purposes.
-                word_count += 1  # NB: Ideally shouldn't count over-the-top as 5, but too much of an edge case
-
-            elif embedded_quote and word == embedded_quote[0]:
+        # Word breaks first..last-1 are within containing_r
+        first = min(words.following(containing_r[0]) + 1, len(offsets))
+        last = bisect.bisect_right(offsets, containing_r[1], first)
+        # Words counted before this paragraph, so base + word_counts[i] is the word count at break i
+        base = word_count - word_counts[first - 1] if first > 0 else word_count
+
+        # Only breaks either side of a quote mark can change anything, so skip
+        # straight to them, and get the count of "wordy" breaks between from the word index.
+        # "Wordy" breaks include our own extras, such as:
+        # * Posessives, "3 days' work".
+        # * Abbreviations, "'twas a dark and stormy night"
+        # NB: Ideally shouldn't count over-the-top as 5, but too much of an edge case
+        for m in QUOTE_MARKS_REGEX.finditer(content, containing_r[0], containing_r[1]):
+            i = bisect.bisect_left(offsets, m.end(), first, last)
+            if i >= last or offsets[i] != m.end() or classes[i] > 0:
+                # Mark is part of a word, e.g. "'tis", or not on its own, ignore it.
+                continue
+            last_b = containing_r[0] if i == first else offsets[i - 1]
+            if last_b != m.start():
+                continue
+            b = offsets[i]
+            word = m.group()
+
+            if embedded_quote and word == embedded_quote[0]:
                 # Found the closing quote for an embedded quote
                 if is_quote(
-                    book["content"],
+                    content,
                     embedded_quote[1],
                     b,
-                    word_count - embedded_quote[2],
+                    base + word_counts[i] - embedded_quote[2],
                 ):
                     book["quote.embedded"].append((embedded_quote[1], b))
                 embedded_quote = None  # Clear open-quote regardless, we matched a pair of scare-quotes
 
-            elif open_quote and last_b == containing_r[0]:
+            elif open_quote and i == first:
                 # Quote still open from previous paragraph, ignore it and move on
                 pass
 
             elif open_quote and word == open_quote[0]:
                 # Found the closing quote we were looking for
                 if is_quote(
-                    book["content"], open_quote[1], b, word_count - open_quote[2]
+                    content,
+                    open_quote[1],
+                    b,
+                    base + word_counts[i] - open_quote[2],
+                    opening=open_quote[3],
                 ):
                     book["quote.quote"].append((open_quote[1], b))
                     if embedded_quote:
@@ -389,13 +450,34 @@ def tagger_quote_quote(book):
             elif word in QUOTES:
                 if open_quote and QUOTES[word] != open_quote[0]:
                     # An open-quote using a different marker within the quote, it's an embedded quote
-                    embedded_quote = (QUOTES[word], last_b, word_count)
+                    embedded_quote = (QUOTES[word], last_b, base + word_counts[i])
                 else:
                     # Not in an open quote and found one
-                    open_quote = (QUOTES[word], last_b, word_count)
-            last_b = b
-
-
+                    # NB: Check the opening now, it may not be in book["content"] when the quote closes
+                    open_quote = (
+                        QUOTES[word],
+                        last_b,
+                        base + word_counts[i],
+                        quote_opening(content, last_b),
+                    )
+
+        word_count = base + word_counts[last - 1] if last > 0 else word_count
+        if last < len(offsets):
+            # Outside the paragraph now. Leave any open quotes still open, assume any embedded quotes broken
+            embedded_quote = None
+
+    if open_quote:
+        # Make word count relative to the end of this call
+        open_quote = (
+            open_quote[0],
+            open_quote[1],
+            open_quote[2] - word_count,
+            open_quote[3],
+        )
+    return open_quote
+
+
+@tagger_io(inputs=["chapter.text", "quote.quote"], outputs=["quote.nonquote"])
 def tagger_quote_nonquote(book):
     """Add quote.nonquote tags to (book)"""
     if len(book.get("quote.nonquote", [])) > 0:
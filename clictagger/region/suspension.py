@@ -180,14 +180,17 @@ suspension. From ``ChiLit/daisy.txt``::
 """
 import re
 
-import icu
-
-from ..icuconfig import DEFAULT_LOCALE
+from ..tokenizer import WordIndex
+from .utils import tagger_io
 
 
 INITIAL_ALPHANUMERIC_REGEX = re.compile(r"^(?:\W|_)*(.)")
 
 
+@tagger_io(
+    inputs=["chapter.paragraph", "chapter.sentence", "quote.nonquote"],
+    outputs=["quote.suspension.short", "quote.suspension.long"],
+)
 def tagger_quote_suspension(book):
     """Add quote.suspension tags to (book)"""
     if (
@@ -196,27 +199,25 @@ def tagger_quote_suspension(book):
     ):
         return  # Nothing to do
 
-    # Create a word iterator for this book
-    bi = icu.BreakIterator.createWordInstance(DEFAULT_LOCALE)
-    bi.setText(book["content"])
+    book["quote.suspension.short"] = []
+    book["quote.suspension.long"] = []
+    find_suspensions(book, book["quote.nonquote"], words=book.get("word_index", None))
 
-    def count_words(f, t):
-        out = 0
-        bi.following(f - 1)
-        for b in bi:
-            if b > t:
-                break
-            if bi.getRuleStatus() > 0:
-                out += 1
-        return out
+
+def find_suspensions(book, nonquotes, words=None):
+    """
+    Add quote.suspension tags to (book) for any of (nonquotes) that are suspensions.
+
+    - nonquotes: A list of quote.nonquote regions, in order, to consider
+    - words: A :py:class:`~clictagger.tokenizer.WordIndex` for the content, by
+      default one is made for each suspension found
+    """
 
     cur_sent_b = -10  # i.e. a value we'll consider before-range
-    book["quote.suspension.short"] = []
-    book["quote.suspension.long"] = []
     s_i = 0
     paragraph_starts = set(r[0] for r in book["chapter.paragraph"])
     sentence_starts = set(r[0] for r in book["chapter.sentence"])
-    for containing_r in book["quote.nonquote"]:
+    for containing_r in nonquotes:
         if containing_r[0] in paragraph_starts:
             # Starts with a paragraph break, so not a suspension
             continue
@@ -244,7 +245,9 @@ def tagger_quote_suspension(book):
                 cur_sent_b = book["chapter.sentence"][s_i][1] - 1
         else:
             # Considered all potential sentence boundaries and none found, this is a suspension.
-            word_count = count_words(*containing_r)
+            word_count = (
+                WordIndex(book["content"], *containing_r) if words is None else words
+            ).count_words(*containing_r)
             if word_count >= 5:
                 book["quote.suspension.long"].append(containing_r)
             elif word_count >= 1:
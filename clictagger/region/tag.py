@@ -3,20 +3,127 @@ clic.region.tag: Tag a book with all region taggers
 ***************************************************
 
 Applies all the tagging modules on a book in turn
+
+Each tagger function declares which region classes it needs (``inputs``) and
+which it adds (``outputs``). Using this, we can work out which taggers need to
+run to get a particular region class, for instance chapter titles don't need
+any other regions::
+
+    >>> [fn.__name__ for fn in taggers_for(["chapter.title"])]
+    ['tagger_chapter_title']
+
+...whereas suspensions need most of the other taggers to run first::
+
+    >>> [fn.__name__ for fn in taggers_for(["quote.suspension.short"])]
+    ['tagger_metadata', 'tagger_chapter_part', 'tagger_chapter_title',
+     'tagger_chapter_text', 'tagger_chapter_paragraph', 'tagger_chapter_sentence',
+     'tagger_quote_quote', 'tagger_quote_nonquote', 'tagger_quote_suspension']
+
+Taggers that have already run on a book aren't needed again::
+
+    >>> book = dict(content="CHAPTER I.\\n\\nOnce upon a time")
+    >>> tagger(book, ["chapter.text"])
+    >>> [fn.__name__ for fn in taggers_for(["chapter.paragraph"], book)]
+    ['tagger_chapter_paragraph']
 """
+from ..timing import stage
+from ..tokenizer import WordIndex, tagger_tokens
 from .metadata import tagger_metadata
-from .chapter import tagger_chapter
-from .quote import tagger_quote
+from .chapter import (
+    tagger_chapter_part,
+    tagger_chapter_title,
+    tagger_chapter_text,
+    tagger_chapter_paragraph,
+    tagger_chapter_sentence,
+)
+from .quote import tagger_quote_quote, tagger_quote_nonquote
 from .suspension import tagger_quote_suspension
 
+#: All tagger functions, in an order they can be run in
+TAGGERS = [
+    tagger_metadata,
+    tagger_chapter_part,
+    tagger_chapter_title,
+    tagger_chapter_text,
+    tagger_chapter_paragraph,
+    tagger_chapter_sentence,
+    tagger_quote_quote,
+    tagger_quote_nonquote,
+    tagger_quote_suspension,
+    tagger_tokens,
+]
+
+#: Tagger functions that walk every word boundary of the content
+WORD_TAGGERS = set((tagger_quote_quote, tagger_tokens))
 
-def tagger(book):
+#: Map of region class to the tagger function that adds it
+TAGGER_FOR_RCLASS = {rclass: fn for fn in TAGGERS for rclass in fn.outputs}
+
+#: All region classes that can be added to a book
+ALL_RCLASSES = list(TAGGER_FOR_RCLASS.keys())
+
+
+def taggers_for(rclasses, book={}):
+    """
+    Return a list of tagger functions that need to be run, in order, to add
+    (rclasses) to (book). Any region classes we know nothing about are ignored.
+    """
+    needed = set()
+
+    def visit(rclass):
+        fn = TAGGER_FOR_RCLASS.get(rclass, None)
+        if fn is None or fn in needed or all(x in book for x in fn.outputs):
+            return
+        needed.add(fn)
+        for x in fn.inputs:
+            visit(x)
+
+    for rclass in rclasses:
+        visit(rclass)
+    return [fn for fn in TAGGERS if fn in needed]
+
+
+def stage_name(fn):
+    """
+    Name of the :py:func:`~clictagger.timing.stage` a tagger function is timed as::
+
+        >>> stage_name(tagger_quote_nonquote)
+        'quote.nonquote'
+    """
+    return fn.__name__.replace("tagger_", "", 1).replace("_", ".")
+
+
+def tagger(book, rclasses=None, keep_word_index=False):
     """
     Add any missing tags to (book).
     This is just a wrapper for each of the metadata/chapter/quote tagging
     modules. For more information, look at the documentation for each.
+
+    - rclasses: Only run the taggers required to add these region classes.
+      By default, all region classes other than tokens are added.
+    - keep_word_index: Leave the WordIndex (see below) in ``book["word_index"]``
+
+    Every output of a tagger that has run will be in (book), even if there
+    were no regions found.
+
+    The word boundaries of the content are only found once, in a
+    :py:class:`~clictagger.tokenizer.WordIndex` shared between all taggers that
+    need them (quotes, suspensions & tokens). If ``book["word_index"]`` is
+    already set, it is used rather than making a new one.
     """
-    tagger_metadata(book)
-    tagger_chapter(book)
-    tagger_quote(book)
-    tagger_quote_suspension(book)
+    if rclasses is None:
+        rclasses = [x for x in ALL_RCLASSES if x != "tokens"]
+
+    fns = taggers_for(rclasses, book)
+    if "word_index" not in book and any(fn in WORD_TAGGERS for fn in fns):
+        with stage("word_index"):
+            book["word_index"] = WordIndex(book["content"])
+    try:
+        for fn in fns:
+            with stage(stage_name(fn)):
+                fn(book)
+            for rclass in fn.outputs:
+                book.setdefault(rclass, [])
+    finally:
+        if not keep_word_index:
+            book.pop("word_index", None)
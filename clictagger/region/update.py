@@ -0,0 +1,282 @@
+"""
+clic.region.update: Re-tag a book after an edit
+***********************************************
+
+Re-tagging a whole book after changing a few lines of it is wasteful, most of
+the regions will be the same, just moved along a bit. :py:func:`regions_update`
+finds the part of the book that changed, and re-runs taggers only where they
+could be affected:
+
+* Headings (``metadata.*``, ``chapter.part``, ``chapter.title``) are cheap to
+  find, so are always found again. If they have changed (other than moving),
+  chapters aren't the same any more and we give up, re-tagging everything.
+* ``chapter.paragraph`` and ``chapter.sentence`` are found again for any
+  chapter near the edit.
+* ``quote.quote`` and ``quote.embedded`` are found again from the last paragraph
+  before the edit that can't continue an open quote, to the first one after.
+* ``quote.nonquote`` is found again from the quotes.
+* ``quote.suspension.*`` are found again for nonquote regions in chapters
+  where quotes have been found again.
+* ``tokens`` are found again between the line breaks either side of the edit.
+
+Everything after the edit is moved by the change in length. The result is the
+same as tagging the new content from scratch::
+
+    >>> from .tag import tagger
+    >>> old = "CHAPTER I.\\n\\n‘Oh dear!’ said the Rabbit, ‘I shall be late!’\\n\\nCHAPTER II.\\n\\n‘Curious!’ said Alice.\\n"
+    >>> new = old.replace("the Rabbit", "the White Rabbit")
+    >>> book = dict(content=old)
+    >>> tagger(book, ["quote.suspension.short", "tokens"])
+    >>> regions = {k: RegionColumn(v) for k, v in book.items() if k not in ("content", "vocabulary")}
+    >>> regions_update(regions, old, new)
+    True
+    >>> regions["quote.suspension.short"]
+    [(23, 45)]
+    >>> new_book = dict(content=new)
+    >>> tagger(new_book, ["quote.suspension.short", "tokens"])
+    >>> all(regions[k] == new_book[k] for k in regions)
+    True
+
+Edits that change a chapter heading can't be handled, and ``False`` is returned
+with the regions untouched::
+
+    >>> regions_update(regions, new, new.replace("CHAPTER II.", "CHAPTER 2."))
+    False
+"""
+import bisect
+
+from ..tokenizer import types_from_string
+from .chapter import (
+    tagger_chapter_part,
+    tagger_chapter_title,
+    tagger_chapter_text,
+    tagger_chapter_paragraph,
+    tagger_chapter_sentence,
+)
+from .column import RegionColumn
+from .metadata import tagger_metadata
+from .quote import find_quotes, paragraph_continues_quote, tagger_quote_nonquote
+from .suspension import find_suspensions
+
+#: Region classes that are found again on every update
+HEADING_RCLASSES = [
+    "metadata.title",
+    "metadata.author",
+    "chapter.part",
+    "chapter.title",
+]
+
+#: Characters either side of an edit that taggers may look at, e.g. for quote punctuation
+EDIT_MARGIN = 16
+
+
+def edit_range(old_content, new_content):
+    """
+    Return (start, old_end, new_end), the range of characters that differ between
+    (old_content) and (new_content)
+
+        >>> edit_range("The cat sat", "The dog sat")
+        (4, 7, 7)
+        >>> edit_range("The cat sat", "The cat sat down")
+        (11, 11, 16)
+    """
+    max_len = min(len(old_content), len(new_content))
+
+    # Binary search for the longest common prefix, then suffix
+    # NB: Comparing slices is much quicker than comparing one character at a time
+    lo, hi = 0, max_len
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old_content[lo:mid] == new_content[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    start = lo
+
+    lo, hi = 0, max_len - start
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if (
+            old_content[len(old_content) - mid : len(old_content) - lo]
+            == new_content[len(new_content) - mid : len(new_content) - lo]
+        ):
+            lo = mid
+        else:
+            hi = mid - 1
+    return (start, len(old_content) - lo, len(new_content) - lo)
+
+
+def _moved(regions, start, old_end, delta):
+    """Regions from (regions) clear of start..old_end, moved along by (delta)"""
+    return [r for r in regions if r[1] <= start] + [
+        (r[0] + delta, r[1] + delta) + tuple(r[2:]) for r in regions if r[0] >= old_end
+    ]
+
+
+def _splice(regions, rclass, old_lo, old_hi, new_regions, delta):
+    """Replace regions in (rclass) starting within old_lo..old_hi with (new_regions)"""
+    col = regions[rclass]
+    i = bisect.bisect_left(col.start, old_lo)
+    j = bisect.bisect_left(col.start, old_hi)
+    col.splice(i, j, new_regions, delta=delta)
+
+
+def regions_update(regions, old_content, new_content):
+    """
+    Update (regions), a dict of region class to
+    :py:class:`~clictagger.region.column.RegionColumn` tagged from (old_content),
+    so they match (new_content).
+
+    Returns False if the regions couldn't be updated, and the content needs to
+    be tagged from scratch.
+    """
+    if old_content == new_content:
+        return True  # Nothing to do
+    start, old_end, new_end = edit_range(old_content, new_content)
+    delta = new_end - old_end
+
+    # Find all headings again, if anything other than offsets change, give up
+    book = dict(content=new_content)
+    for fn in (tagger_metadata, tagger_chapter_part, tagger_chapter_title):
+        fn(book)
+    for rclass in HEADING_RCLASSES:
+        book.setdefault(rclass, [])
+        if rclass in regions and book[rclass] != _moved(
+            regions[rclass], start, old_end, delta
+        ):
+            return False
+
+    if "chapter.text" in regions:
+        tagger_chapter_text(book)
+        old_chapters = regions["chapter.text"]
+        new_chapters = book["chapter.text"]
+        if len(old_chapters) != len(new_chapters):
+            return False
+
+        # Chapters near the edit need re-tagging, the rest should only move
+        affected = []
+        for i, (old_r, new_r) in enumerate(zip(old_chapters, new_chapters)):
+            if new_r[1] + EDIT_MARGIN > start and new_r[0] - EDIT_MARGIN < new_end:
+                affected.append(i)
+            elif [tuple(new_r)] != _moved([old_r], start, old_end, delta):
+                return False
+
+        # Everything will work now, so start updating regions
+        old_chapters = list(old_chapters)
+        regions["chapter.text"] = RegionColumn(new_chapters)
+    for rclass in HEADING_RCLASSES:
+        if rclass in regions:
+            regions[rclass] = RegionColumn(book[rclass])
+
+    if "chapter.text" in regions:
+        _update_chapters(
+            regions, new_content, start, new_end, delta, old_chapters, affected
+        )
+    if "tokens" in regions:
+        _update_tokens(regions, new_content, start, new_end, delta)
+    return True
+
+
+def _update_chapters(
+    regions, new_content, start, new_end, delta, old_chapters, affected
+):
+    """Update all regions within chapter.text, re-tagging (affected) chapters"""
+    new_chapters = regions["chapter.text"]
+
+    # Re-tag paragraphs & sentences within affected chapters
+    if affected:
+        chapter_book = dict(
+            content=new_content, **{"chapter.text": [new_chapters[i] for i in affected]}
+        )
+        old_lo = old_chapters[affected[0]][0]
+        old_hi = old_chapters[affected[-1]][1]
+        for rclass, fn in (
+            ("chapter.paragraph", tagger_chapter_paragraph),
+            ("chapter.sentence", tagger_chapter_sentence),
+        ):
+            if rclass in regions:
+                fn(chapter_book)
+                _splice(
+                    regions, rclass, old_lo, old_hi, chapter_book.get(rclass, []), delta
+                )
+
+        # Anything that could change is now within the affected chapters
+        start = min(start, new_chapters[affected[0]][0])
+        new_end = max(new_end, new_chapters[affected[-1]][1])
+
+    if "quote.quote" not in regions:
+        return
+
+    # Find paragraphs either side of the edit where any open quotes will be forgotten
+    paragraphs = regions["chapter.paragraph"]
+    p_lo = bisect.bisect_right(paragraphs.start, start - EDIT_MARGIN) - 1
+    while p_lo > 0 and paragraph_continues_quote(new_content, paragraphs[p_lo]):
+        p_lo -= 1
+    p_lo = max(p_lo, 0)
+    p_hi = bisect.bisect_left(paragraphs.start, new_end + EDIT_MARGIN)
+    while p_hi < len(paragraphs) and paragraph_continues_quote(
+        new_content, paragraphs[p_hi]
+    ):
+        p_hi += 1
+    lo = paragraphs.start[p_lo] if p_lo > 0 else 0
+    hi = paragraphs.start[p_hi] if p_hi < len(paragraphs) else len(new_content) + 1
+
+    # Find quotes again between these paragraphs
+    quote_book = {"content": new_content, "quote.quote": [], "quote.embedded": []}
+    find_quotes(quote_book, paragraphs[p_lo:p_hi])
+    for rclass in ("quote.quote", "quote.embedded"):
+        _splice(regions, rclass, lo, hi - delta, quote_book[rclass], delta)
+
+    if "quote.nonquote" not in regions:
+        return
+    nonquote_book = {
+        "content": new_content,
+        "chapter.text": new_chapters,
+        "quote.quote": regions["quote.quote"],
+    }
+    tagger_quote_nonquote(nonquote_book)
+    regions["quote.nonquote"] = RegionColumn(nonquote_book["quote.nonquote"])
+
+    if "quote.suspension.short" not in regions:
+        return
+    # Find suspensions again for any chapter with new quotes in it
+    c = bisect.bisect_right(new_chapters.start, lo) - 1
+    lo = min(lo, new_chapters.start[c]) if c >= 0 else 0
+    nonquotes = regions["quote.nonquote"]
+    suspension_book = {
+        "content": new_content,
+        "chapter.paragraph": paragraphs,
+        "chapter.sentence": regions["chapter.sentence"],
+        "quote.suspension.short": [],
+        "quote.suspension.long": [],
+    }
+    find_suspensions(
+        suspension_book,
+        nonquotes[
+            bisect.bisect_left(nonquotes.start, lo) : bisect.bisect_left(
+                nonquotes.start, hi
+            )
+        ],
+    )
+    for rclass in ("quote.suspension.short", "quote.suspension.long"):
+        _splice(regions, rclass, lo, hi - delta, suspension_book[rclass], delta)
+
+
+def _update_tokens(regions, new_content, start, new_end, delta):
+    """Tokenise again between the line breaks either side of the edit"""
+    # NB: Tokens can't cross line breaks, and tokenising is unaffected by text the other side of one
+    lo = new_content.rfind("\n", 0, start) + 1
+    hi = new_content.find("\n", new_end) + 1 or len(new_content)
+    _splice(
+        regions,
+        "tokens",
+        lo,
+        hi - delta,
+        (
+            (t_start, t_end, ttype)
+            for ttype, t_start, t_end in types_from_string(
+                new_content[lo:hi], offset=lo
+            )
+        ),
+        delta,
+    )
@@ -5,6 +5,28 @@ clic.region.utils: Internal utilities for tagging
 """
 
 
+def tagger_io(inputs=(), outputs=()):
+    """
+    Decorator to declare which region classes a tagger function needs in the
+    book before it can run (inputs), and which region classes it adds (outputs).
+
+        >>> @tagger_io(inputs=["chapter.text"], outputs=["chapter.paragraph"])
+        ... def tagger_example(book):
+        ...     pass
+        >>> tagger_example.inputs, tagger_example.outputs
+        (('chapter.text',), ('chapter.paragraph',))
+
+    See :py:func:`clictagger.region.tag.taggers_for` for how these are used.
+    """
+
+    def decorator(fn):
+        fn.inputs = tuple(inputs)
+        fn.outputs = tuple(outputs)
+        return fn
+
+    return decorator
+
+
 def region_append_without_whitespace(book, rclass, start, end, *extra):
     """
     Shrink the region (start, end) until there is no whitespace either end of
@@ -92,6 +114,8 @@ def regions_flatten(book):
             continue
         if rclass == "content":
             continue
+        if rclass == "vocabulary":
+            continue
         for r in book[rclass]:
             out.append(
                 (
@@ -23,17 +23,60 @@ Output :py:data:`default region tags <clictagger.taggedtext.DEFAULT_HIGHLIGHT_RE
 
     clictagger --csv alice.csv alice.txt
 
-On Windows, to tag all text files in the current directory at once::
+CSV files for large books can get big, particularly with tokens. Give a path
+ending ``.csv.gz`` or ``.csv.xz`` to compress as it's written, and use
+``--csv-content`` to shorten or leave out (with 0) the Content column::
 
-    for %f in (*.txt) do (clictagger --csv %f.csv %f)
+    clictagger --csv alice-tokens.csv.gz --csv-content 0 alice.txt tokens
 
-On MacOs, to tag all text files in the current directory at once::
+Tagging many files at once
+--------------------------
 
-    for f in *.txt ; do clictagger --csv $f.csv $f; done
+Give more than one input file, and ``--csv-dir`` to write a CSV file for each
+into a directory. For example, to tag all text files in ``corpus/`` into ``out/``,
+tagging 16 files at a time::
 
-If the previous step does not work for you on Linux, to tag all text files in the current directory at once, try the following::
+    clictagger --csv-dir out/ -j 16 corpus/*.txt
 
-    for f in *.txt ; do ./bin/clictagger --csv $f.csv $f; done
+Any region names should come after all the input files, and STDIN (``-``) can't
+be one of several input files. ``out/alice.csv`` will be skipped if it is newer
+than ``corpus/alice.txt``, so you can re-run the command after adding or
+editing a few files. Use ``--force`` to write all CSV files
+regardless.
+
+Alternatively, to write all regions from all files into one CSV file, with an extra
+"Document" column containing the input file name::
+
+    clictagger --csv all.csv -j 16 corpus/*.txt quote.quote
+
+If you tag the same files many times, set ``CLICTAGGER_CACHE_DIR`` to keep tagged
+regions in a cache, see :mod:`clictagger.cache`::
+
+    export CLICTAGGER_CACHE_DIR=~/.cache/clictagger
+
+For very large files, ``--mmap`` memory-maps the file rather than reading it
+into memory, and tags it a chapter at a time, see :mod:`clictagger.mapped`.
+With only one input file, ``-j`` tags its chapters in that many processes at
+once instead, see :mod:`clictagger.region.chapterwise`::
+
+    clictagger --csv collected-works.csv -j 8 collected-works.txt
+
+Profiling
+---------
+
+To see how long each stage of tagging took, and how long writing the output
+took, use ``--profile``. A table of stages is printed to STDERR once the output is
+written, see :mod:`clictagger.timing`::
+
+    clictagger --profile --csv alice.csv alice.txt
+
+Memory allocated in each stage is only recorded if :py:mod:`tracemalloc` is
+tracing, which slows everything down, so set ``PYTHONTRACEMALLOC=1`` to include it.
+Give a path to ``--profile`` to also run under :py:mod:`cProfile`, writing
+statistics to that path to read with :py:mod:`pstats`::
+
+    clictagger --profile alice.pstats --csv alice.csv alice.txt
+    python -m pstats alice.pstats
 
 Using clictagger as a webserver for cleaning text
 -------------------------------------------------
@@ -48,48 +91,81 @@ clictagger can be used to assist this process by creating a preview of the tagge
 2. In a terminal window, run ``clictagger --serve new.txt``
 3. If a web-browser window hasn't automatically opened, open http://localhost:8080/ in your web browser.
 
-Now you can make edits to ``new.txt``, reload your browser window, and changes will be visible.
+Now you can make edits to ``new.txt``, and as soon as you save them, your browser window
+will reload to show the changes. ``new.txt`` is only tagged again when it changes, and then
+only the chapters you have edited, see :mod:`clictagger.serve`. Each chapter
+is shown on a page of its own, with links at the top and bottom to the others.
 """
 import argparse
-import http.server
-import subprocess
-import shutil
+import functools
+import os
 import sys
-import webbrowser
-
-from .taggedtext import TaggedText
-
-
-def _serve_method(fn):
-    """Start a server that serves the single-page result. fn is a function that returns an iterator"""
-
-    class RequestHandler(http.server.BaseHTTPRequestHandler):
-        def do_GET(self):
-            if self.path == "/":
-                self.send_response(200)
-                self.send_header("Content-type", "text/html; charset=utf-8")
-                self.end_headers()
-                for x in fn():
-                    self.wfile.write(x.encode("utf8"))
-            else:
-                self.send_response(404)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                self.wfile.write("NOT FOUND".encode("utf8"))
-
-    server_address = ("0.0.0.0", 8080)
-    httpd = http.server.HTTPServer(server_address, RequestHandler)
-    print("Starting webserver. Press Ctrl-C to stop.")
-    print(
-        "Visit http://localhost:%d/ in your webbrowser to view output"
-        % server_address[1]
+
+# NB: Anything else is imported when needed, so e.g. --help doesn't wait for ICU
+
+
+def _csv_dir_path(csv_dir, input_path):
+    """Return the path within (csv_dir) to write CSV for (input_path)"""
+    return os.path.join(
+        csv_dir, os.path.splitext(os.path.basename(input_path))[0] + ".csv"
     )
+
+
+def _is_up_to_date(input_path, out_path):
+    """True iff (out_path) exists and is newer than (input_path)"""
     try:
-        webbrowser.open("http://localhost:%d/" % server_address[1])
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        httpd.server_close()
-        pass
+        return os.path.getmtime(out_path) >= os.path.getmtime(input_path)
+    except OSError:
+        return False
+
+
+def _write_csv(input_path, csv_dir, highlight, use_mmap=False, content=True):
+    """Tag (input_path), and write CSV into (csv_dir)"""
+    from .taggedtext import TaggedText
+
+    out_path = _csv_dir_path(csv_dir, input_path)
+    # Write to a temporary file first, so a half-written file isn't considered up to date
+    with open(out_path + ".tmp", "w", newline="", encoding="utf8") as out_f:
+        tt = TaggedText.from_file(input_path, regions=highlight, use_mmap=use_mmap)
+        tt.table(highlight=highlight).write_csv(out_f, content=content)
+    os.replace(out_path + ".tmp", out_path)
+    return out_path
+
+
+def _gen_merged_csv_rows(input_path, highlight, use_mmap=False, content=True):
+    """Tag (input_path), return CSV with a document column as a string"""
+    from .taggedtext import TaggedText
+
+    return "".join(
+        TaggedText.from_file(input_path, regions=highlight, use_mmap=use_mmap)
+        .table(highlight=highlight)
+        .gen_csv(document_column=True, content=content)
+    )
+
+
+def _gen_merged_csv(inputs, highlight, jobs=1, use_mmap=False, content=True):
+    """Tag all (inputs), yielding a single CSV file as each is finished"""
+    from .corpus import imap_files
+
+    for i, (input_path, csv) in enumerate(
+        imap_files(
+            functools.partial(
+                _gen_merged_csv_rows,
+                highlight=highlight,
+                use_mmap=use_mmap,
+                content=content,
+            ),
+            inputs,
+            workers=jobs,
+        )
+    ):
+        # Only include the header line once
+        yield csv if i == 0 else csv.partition("\r\n")[2]
+
+
+def _writelines(out_iter):
+    """Return a function that writes all strings in (out_iter) to a file"""
+    return lambda out_f: out_f.writelines(out_iter)
 
 
 def clictagger():
@@ -106,6 +182,11 @@ def clictagger():
         type=str,
         help="Output CSV to file (or '-' STDOUT)",
     )
+    ap_mode.add_argument(
+        "--csv-dir",
+        type=str,
+        help="Output CSV for each input file into this directory",
+    )
     ap_mode.add_argument(
         "--html",
         type=str,
@@ -116,12 +197,47 @@ def clictagger():
         help="Start a webserver to view output",
         action="store_true",
     )
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of input files to tag at the same time, or with one input file,"
+        " number of its chapters to tag at the same time. Defaults to 1",
+    )
+    ap.add_argument(
+        "--mmap",
+        help="Memory-map input files and tag them a chapter at a time,"
+        " using much less memory for very large files",
+        action="store_true",
+    )
+    ap.add_argument(
+        "--csv-content",
+        type=int,
+        help="Only include up to this many characters of each region in the CSV"
+        " Content column, or 0 to leave the column out",
+    )
+    ap.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="-",
+        metavar="PATH",
+        help="Print the time each stage of tagging took to STDERR."
+        " If PATH is given, also write cProfile statistics to PATH",
+    )
+    ap.add_argument(
+        "--force",
+        help="With --csv-dir, write CSV files even if they are newer than the input file",
+        action="store_true",
+    )
     ap.add_argument(
         "input",
         type=str,
         nargs="?",
         default="-",
-        help="File containing input text, or '-' for STDIN. Defaults to STDIN",
+        help="File containing input text, or '-' for STDIN. Defaults to STDIN."
+        " Multiple input files can be given with --csv or --csv-dir",
     )
     ap.add_argument(
         "region",
@@ -131,22 +247,87 @@ def clictagger():
     )
     args = ap.parse_args()
 
-    if args.serve:
-
-        def serve_iter():
-            yield "<!DOCTYPE html>\n<html><head></head><body>\n"
-
-            # NB: Re-parse file on every request
-            for h in (
-                TaggedText.from_file(args.input)
-                .markup(highlight=args.region)
-                .gen_html()
-            ):
-                yield h
-
-            yield "</body></html>\n"
+    # Any files at the start of the region list are further inputs
+    inputs = [args.input]
+    while len(args.region) > 0 and (
+        args.region[0] == "-" or os.path.isfile(args.region[0])
+    ):
+        inputs.append(args.region.pop(0))
+
+    from .region.tag import ALL_RCLASSES
+
+    if args.input != "-" and not os.path.isfile(args.input):
+        ap.error("Input file %s does not exist" % args.input)
+    for rclass in args.region:
+        if rclass not in ALL_RCLASSES:
+            ap.error(
+                "%s is neither an input file nor a region name (one of %s)"
+                % (rclass, ", ".join(ALL_RCLASSES))
+            )
+    if len(inputs) > 1 and args.csv is None and args.csv_dir is None:
+        ap.error("Multiple input files can only be used with --csv or --csv-dir")
+    if len(inputs) > 1 and "-" in inputs:
+        ap.error("Cannot use STDIN with multiple input files")
+    if args.csv_dir is not None and "-" in inputs:
+        ap.error("Cannot use STDIN with --csv-dir")
+    if args.profile is not None and (
+        len(inputs) > 1 or args.csv_dir is not None or args.serve
+    ):
+        ap.error("--profile can only be used with a single input file")
+
+    from .taggedtext import TaggedText, DEFAULT_HIGHLIGHT_REGIONS
+
+    # Only tag the regions we are going to output. CSV & ANSI contain highlighted regions,
+    # HTML markup also shows any other regions (apart from tokens) when hovering
+    highlight = args.region or DEFAULT_HIGHLIGHT_REGIONS
+    # NB: 0 means no content column at all
+    csv_content = True if args.csv_content is None else (args.csv_content or False)
+    markup_regions = [x for x in ALL_RCLASSES if x != "tokens"] + highlight
+
+    if args.csv_dir is not None:
+        from .corpus import imap_files
+
+        os.makedirs(args.csv_dir, exist_ok=True)
+        out_paths = set()
+        todo = []
+        for input_path in inputs:
+            out_path = _csv_dir_path(args.csv_dir, input_path)
+            if out_path in out_paths:
+                ap.error("More than one input file would be written to %s" % out_path)
+            out_paths.add(out_path)
+            if args.force or not _is_up_to_date(input_path, out_path):
+                todo.append(input_path)
+
+        for input_path, out_path in imap_files(
+            functools.partial(
+                _write_csv,
+                csv_dir=args.csv_dir,
+                highlight=highlight,
+                use_mmap=args.mmap,
+                content=csv_content,
+            ),
+            todo,
+            workers=args.jobs,
+            ordered=False,
+        ):
+            print("%s -> %s" % (input_path, out_path), file=sys.stderr)
+        exit(0)
 
-        _serve_method(serve_iter)
+    if args.serve:
+        from .serve import FilePreview, serve
+
+        if args.input == "-":
+            ap.error("Cannot use STDIN with --serve, give a file to watch")
+        serve(
+            FilePreview(
+                args.input,
+                lambda tt, chapter: tt.markup(
+                    highlight=highlight, chapter=chapter
+                ).gen_html(),
+                regions=markup_regions,
+                paged=True,
+            )
+        )
         exit(0)
 
     if args.input == "-" and sys.stdin.isatty():
@@ -159,43 +340,94 @@ def clictagger():
         print("    clictagger --help")
         exit(1)
 
-    if args.csv is not None:
-        out_iter = (
-            TaggedText.from_file(args.input).table(highlight=args.region).gen_csv()
+    profiler = None
+    if args.profile not in (None, "-"):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    tt = None
+    if args.csv is not None and len(inputs) > 1:
+        write_out = _writelines(
+            _gen_merged_csv(
+                inputs,
+                highlight,
+                jobs=args.jobs,
+                use_mmap=args.mmap,
+                content=csv_content,
+            )
+        )
+        out_path = args.csv
+    elif args.csv is not None:
+        tt = TaggedText.from_file(
+            args.input, regions=highlight, use_mmap=args.mmap, workers=args.jobs
         )
+        table = tt.table(highlight=highlight)
+        write_out = functools.partial(table.write_csv, content=csv_content)
         out_path = args.csv
     elif args.html is not None:
-        out_iter = (
-            TaggedText.from_file(args.input).markup(highlight=args.region).gen_html()
+        tt = TaggedText.from_file(
+            args.input,
+            regions=markup_regions,
+            use_mmap=args.mmap,
+            workers=args.jobs,
         )
+        write_out = tt.markup(highlight=highlight).write_html
         out_path = args.html
     else:  # Assume ansi if nothing else given
-        out_iter = (
-            TaggedText.from_file(args.input).markup(highlight=args.region).gen_ansi()
+        tt = TaggedText.from_file(
+            args.input,
+            # NB: Unlike HTML, only highlighted regions are shown
+            regions=highlight,
+            use_mmap=args.mmap,
+            workers=args.jobs,
         )
+        write_out = tt.markup(highlight=highlight).write_ansi
         out_path = "-"
 
     pager = None
-    less_path = shutil.which("less")
-    if (
-        out_path == "-" and less_path is not None and sys.stdout.isatty()
-    ):  # Wrap direct TTY output with a pager
+    less_path = None
+    if out_path == "-" and sys.stdout.isatty():
+        import shutil
+
+        less_path = shutil.which("less")
+    if less_path is not None:  # Wrap direct TTY output with a pager
+        import subprocess
+
         pager = subprocess.Popen(
             [less_path, "-RSFi"], stdin=subprocess.PIPE, encoding="utf8"
         )
         out_f = pager.stdin
     elif out_path == "-":
         out_f = sys.stdout
+    elif args.csv is not None:
+        from .table import open_csv
+
+        # NB: Compressed if the path ends with .gz or .xz
+        out_f = open_csv(out_path)
     else:
-        out_f = open(out_path, "w", newline="", encoding="utf8")
+        out_f = open(out_path, "w", encoding="utf8")
 
     try:
-        for h in out_iter:
-            out_f.write(h)
+        if args.profile is not None and tt is not None:
+            from .timing import recording, stage
+
+            with recording(tt.timings), stage("output"):
+                write_out(out_f)
+        else:
+            write_out(out_f)
     except BrokenPipeError:
         # Pager lost interest
         pass
 
     if pager is not None:
         pager.communicate("")
-    out_f.close()
+    elif out_f is not sys.stdout:
+        out_f.close()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    if args.profile is not None:
+        print(tt.timings, file=sys.stderr)
@@ -0,0 +1,294 @@
+"""
+clictagger.serve: Preview tagged text in a web browser
+******************************************************
+
+This powers ``clictagger --serve``, see :mod:`clictagger.script`.
+
+A :py:class:`FilePreview` tags a file, and keeps the rendered page until the
+file changes::
+
+    >>> preview = FilePreview('alice.txt', lambda tt: tt.markup().gen_html())
+    >>> preview.version
+    1
+    >>> b'new EventSource("/events?version=1")' in preview.page()
+    True
+    >>> preview.refresh()  # File hasn't changed, nothing to do
+    False
+
+When the file does change, it is tagged again using :py:meth:`TaggedText.update()
+<clictagger.taggedtext.TaggedText.update>`, so only the chapters that changed
+need to be tagged. A background thread started with :py:meth:`FilePreview.watch`
+checks for changes, so the work is done as soon as the file is saved, not when
+the page is next asked for.
+
+With ``paged=True``, each chapter is a page of its own, with links to the
+others, and only the chapter asked for is rendered. A whole novel is too much
+HTML for a browser to show at once::
+
+    >>> preview = FilePreview(
+    ...     'alice.txt',
+    ...     lambda tt, chapter: tt.markup(chapter=chapter).gen_html(),
+    ...     paged=True,
+    ... )
+    >>> preview.chapters()[:3]
+    ['(start)', 'CHAPTER I. Down the Rabbit-Hole', 'CHAPTER II. The Pool of Tears']
+    >>> page = preview.page(chapter=2)
+    >>> b'Curiouser and curiouser!' in page, b'queer-looking party' in page
+    (True, False)
+    >>> b'<a href="/?chapter=3">Next</a>' in page
+    True
+
+The page served has a script that listens to ``/events`` using
+`Server-Sent Events <https://html.spec.whatwg.org/multipage/server-sent-events.html>`__,
+and reloads the page whenever the file has been tagged again.
+"""
+import html
+import http.server
+import os
+import socketserver
+import threading
+import time
+import traceback
+import urllib.parse
+import webbrowser
+
+from .taggedtext import TaggedText
+
+PAGE_HEADER = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><script>
+new EventSource("/events?version=%d").onmessage = function () {
+    window.location.reload();
+};
+</script></head><body>
+"""
+
+PAGE_FOOTER = "</body></html>\n"
+
+#: Number of rendered chapters to keep, when paged
+PAGE_CACHE_SIZE = 16
+
+
+def _stat_key(path):
+    """Return something that will change when the file at (path) does"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FilePreview:
+    """
+    A rendered page for a file, kept up to date with the file's contents
+
+    - path: Path to the UTF-8 text file to tag
+    - render: Function that turns a :py:class:`~clictagger.taggedtext.TaggedText` into
+      an iterator of HTML strings. If paged, it is called as ``render(tt, chapter)``
+    - regions: Region classes to tag, passed to :py:class:`~clictagger.taggedtext.TaggedText`
+    - paged: Render one chapter at a time, as it is asked for
+    """
+
+    def __init__(self, path, render, regions=None, paged=False):
+        self.path = path
+        self.render = render
+        self.regions = regions
+        self.paged = paged
+        self.tt = None
+        self.version = 0
+        self._stat_key = None
+        self._page = None
+        self._chapter_pages = {}
+        self._refresh_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self.refresh()
+
+    def refresh(self):
+        """Tag & render the file again if it has changed. Returns True iff it had"""
+        with self._refresh_lock:
+            try:
+                stat_key = _stat_key(self.path)
+            except FileNotFoundError:
+                # Probably being replaced by an editor, try again later
+                return False
+            if stat_key == self._stat_key:
+                return False
+
+            try:
+                with open(self.path, "r", encoding="utf8") as f:
+                    content = f.read()
+                changed_while_reading = _stat_key(self.path) != stat_key
+            except (OSError, UnicodeDecodeError):
+                if self.tt is None:
+                    raise  # No previous version to show instead
+                # Probably caught mid-write, keep the last version and try again later
+                return False
+            if changed_while_reading and self.tt is not None:
+                return False
+            if self.tt is None:
+                self.tt = TaggedText(content, name=self.path, regions=self.regions)
+            else:
+                self.tt.update(content)
+            page = None
+            if not self.paged:
+                page = "".join(
+                    [PAGE_HEADER % (self.version + 1)]
+                    + list(self.render(self.tt))
+                    + [PAGE_FOOTER]
+                ).encode("utf8")
+
+            with self._changed:
+                self._stat_key = stat_key
+                self._page = page
+                self._chapter_pages = {}
+                self.version += 1
+                self._changed.notify_all()
+            return True
+
+    def chapters(self):
+        """Return a list of titles for each chapter, when paged. Chapter 0 is the text before the first"""
+        titles = self.tt.regions["chapter.title"]
+        return ["(start)"] + [self.tt.content[r[0] : r[1]] for r in titles]
+
+    def _render_chapter(self, chapter):
+        """Render page for (chapter), with links to the other chapters"""
+        chapters = self.chapters()
+        if chapter < 0 or chapter >= len(chapters):
+            raise IndexError("No chapter %d" % chapter)
+        nav = ['<nav class="chapters">']
+        if chapter > 0:
+            nav.append('<a href="/?chapter=%d">Previous</a>' % (chapter - 1))
+        for i, title in enumerate(chapters):
+            nav.append(
+                "<b>%s</b>" % html.escape(title)
+                if i == chapter
+                else '<a href="/?chapter=%d">%s</a>' % (i, html.escape(title))
+            )
+        if chapter < len(chapters) - 1:
+            nav.append('<a href="/?chapter=%d">Next</a>' % (chapter + 1))
+        nav.append("</nav>")
+        nav = " ".join(nav)
+        return "".join(
+            [PAGE_HEADER % self.version, nav]
+            + list(self.render(self.tt, chapter))
+            + [nav, PAGE_FOOTER]
+        ).encode("utf8")
+
+    def page(self, chapter=0):
+        """
+        Return the page for the current version of the file, as bytes.
+        If paged, only (chapter) is rendered, raising IndexError if there's no such chapter
+        """
+        self.refresh()
+        if not self.paged:
+            return self._page
+        with self._refresh_lock:
+            if chapter not in self._chapter_pages:
+                if len(self._chapter_pages) >= PAGE_CACHE_SIZE:
+                    self._chapter_pages.clear()
+                self._chapter_pages[chapter] = self._render_chapter(chapter)
+            return self._chapter_pages[chapter]
+
+    def wait(self, version, timeout=None):
+        """Wait for up to (timeout) seconds for a version other than (version), return the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def watch(self, interval=0.5):
+        """Start a background thread checking for changes every (interval) seconds"""
+
+        def watcher():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    # Carry on watching, the next save might fix it
+                    traceback.print_exc()
+
+        thread = threading.Thread(target=watcher, name="clictagger-watcher")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """HTTPServer that can have several /events requests open at once"""
+
+    daemon_threads = True
+
+
+def make_server(preview, port=8080, keepalive=15):
+    """
+    Return an HTTP server for (preview) on (port)
+
+    - keepalive: Seconds between keep-alive messages sent to ``/events``
+    """
+
+    class RequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path == "/":
+                try:
+                    chapter = int(
+                        urllib.parse.parse_qs(url.query).get("chapter", ["0"])[0]
+                    )
+                    page = preview.page(chapter=chapter)
+                except (ValueError, IndexError):
+                    self.send_not_found()
+                    return
+                self.send_response(200)
+                self.send_header("Content-type", "text/html; charset=utf-8")
+                self.send_header("Content-length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+            elif url.path == "/events":
+                try:
+                    version = int(
+                        urllib.parse.parse_qs(url.query).get("version", ["0"])[0]
+                    )
+                except ValueError:
+                    self.send_not_found()
+                    return
+                self.send_response(200)
+                self.send_header("Content-type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self.send_events(version)
+            else:
+                self.send_not_found()
+
+        def send_not_found(self):
+            self.send_response(404)
+            self.send_header("Content-type", "text/plain")
+            self.end_headers()
+            self.wfile.write("NOT FOUND".encode("utf8"))
+
+        def send_events(self, version):
+            """Send an event whenever there's a new version, until the browser goes away"""
+            try:
+                while True:
+                    new_version = preview.wait(version, timeout=keepalive)
+                    if new_version == version:
+                        self.wfile.write(b": keepalive\n\n")
+                    else:
+                        self.wfile.write(b"data: %d\n\n" % new_version)
+                        version = new_version
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return ThreadingHTTPServer(("0.0.0.0", port), RequestHandler)
+
+
+def serve(preview, port=8080, open_browser=True):
+    """Watch (preview) for changes and serve it on (port) until interrupted"""
+    preview.watch()
+    httpd = make_server(preview, port=port)
+    print("Starting webserver. Press Ctrl-C to stop.")
+    print("Visit http://localhost:%d/ in your webbrowser to view output" % port)
+    try:
+        if open_browser:
+            webbrowser.open("http://localhost:%d/" % port)
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,213 @@
+"""
+clictagger.store: Save tagged text to disk
+******************************************
+
+A :py:class:`~clictagger.taggedtext.TaggedText` can be saved to a file with
+:py:meth:`~clictagger.taggedtext.TaggedText.save`, and loaded again, e.g. in
+another process, with :py:meth:`~clictagger.taggedtext.TaggedText.load`::
+
+    >>> import os.path, tempfile
+    >>> from clictagger.taggedtext import TaggedText
+    >>> path = os.path.join(tempfile.mkdtemp(), 'alice.clictt')
+    >>> TaggedText.from_file('alice.txt').save(path)
+    >>> tt = TaggedText.load(path)
+    >>> print(tt)
+    TaggedText: alice.txt
+        characters=144396
+        metadata.title=1
+        metadata.author=1
+        chapter.title=12
+        chapter.text=12
+        chapter.paragraph=804
+        chapter.sentence=1674
+        quote.quote=1098
+        quote.embedded=47
+        quote.nonquote=865
+        quote.suspension.short=166
+        quote.suspension.long=106
+        tokens=26548
+
+Only region classes that have been tagged are saved, anything else will be
+tagged when first used after loading.
+
+File format
+-----------
+
+All numbers are little-endian. A file contains:
+
+1. The magic bytes ``CLICTT``, then the format version as a 2-byte integer,
+   then the length of the header as a 4-byte integer.
+2. A UTF-8 encoded JSON header, describing where everything else is in the file.
+3. Sections, each starting at a multiple of 8 bytes:
+
+   * The UTF-8 encoded content, unless saved without content.
+   * The vocabulary token types are stored in, as a JSON list of types.
+   * For each region class, arrays of 8-byte integers for start, end and
+     (if regions have integer values) region value. Token values are IDs
+     in the vocabulary.
+
+When loading, the file is memory-mapped, and region arrays are used directly
+from the file, rather than being read into memory. The content has to be
+decoded, however.
+"""
+import array
+import json
+import mmap
+import struct
+import sys
+
+from .region.column import RegionColumn
+from .tokenizer import Vocabulary
+
+#: Bytes at the start of every file
+MAGIC = b"CLICTT"
+
+#: Current version of the format. Files from other versions can't be loaded
+FORMAT_VERSION = 1
+
+PREAMBLE = struct.Struct("<6sHI")
+
+
+class FormatError(ValueError):
+    """A file isn't a tagged text file, or isn't a version we can read"""
+
+
+def _int_array(values):
+    """Return bytes for (values) as little-endian 8-byte integers"""
+    arr = values if isinstance(values, array.array) else array.array("q", values)
+    if sys.byteorder != "little":
+        arr = array.array("q", arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_regions(f, regions, content=None, name=None):
+    """
+    Write (regions), a dict of region class to
+    :py:class:`~clictagger.region.column.RegionColumn`, to binary file object (f).
+
+    - content: The text that was tagged, if it should be saved too
+    - name: Name of the text, saved in the header
+    """
+    sections = []
+    offset = 0
+
+    def add_section(data):
+        nonlocal offset
+        start = offset
+        sections.append(data)
+        offset += len(data)
+        padding = -offset % 8
+        if padding:
+            sections.append(b"\0" * padding)
+            offset += padding
+        return [start, len(data)]
+
+    header = dict(name=name, content=None, vocabulary=None, regions={})
+    if content is not None:
+        header["content"] = add_section(content.encode("utf8"))
+
+    # Gather up types used by any column, store them in one vocabulary
+    vocabulary = Vocabulary()
+    rclass_ids = {}
+    for rclass, col in regions.items():
+        if getattr(col, "vocabulary", None) is not None:
+            col_types = col.vocabulary.types
+            rclass_ids[rclass] = [vocabulary.id(col_types[i]) for i in col.rvalue]
+    if rclass_ids:
+        header["vocabulary"] = add_section(
+            json.dumps(vocabulary.types, ensure_ascii=False).encode("utf8")
+        )
+
+    for rclass, col in regions.items():
+        if not isinstance(col, RegionColumn):
+            col = RegionColumn(col)
+        h = header["regions"][rclass] = dict(
+            count=len(col),
+            start=add_section(_int_array(col.start))[0],
+            end=add_section(_int_array(col.end))[0],
+            rvalue=None,
+            rvalue_type=None,
+        )
+        if rclass in rclass_ids:
+            h["rvalue_type"] = "vocabulary"
+            h["rvalue"] = add_section(_int_array(rclass_ids[rclass]))[0]
+        elif isinstance(col.rvalue, list):
+            h["rvalue_type"] = "json"
+            h["rvalue"] = add_section(
+                json.dumps(col.rvalue, ensure_ascii=False).encode("utf8")
+            )
+        elif col.rvalue is not None:
+            h["rvalue_type"] = "int"
+            h["rvalue"] = add_section(_int_array(col.rvalue))[0]
+
+    header = json.dumps(header).encode("utf8")
+    header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+    f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+    f.write(header)
+    for data in sections:
+        f.write(data)
+
+
+def read_regions(path, use_mmap=True):
+    """
+    Read a file written by :py:func:`write_regions`, returning (header, content, regions)
+
+    - use_mmap: Memory-map the file, rather than reading it all into memory. The
+      regions returned will use the file directly, until they are changed
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # i.e. empty file
+                buf = b""
+        else:
+            buf = f.read()
+    buf = memoryview(buf)
+
+    if len(buf) < PREAMBLE.size:
+        raise FormatError("%s is not a tagged text file" % path)
+    magic, version, header_len = PREAMBLE.unpack(buf[: PREAMBLE.size])
+    if magic != MAGIC:
+        raise FormatError("%s is not a tagged text file" % path)
+    if version != FORMAT_VERSION:
+        raise FormatError(
+            "%s is format version %d, can only read version %d"
+            % (path, version, FORMAT_VERSION)
+        )
+    header = json.loads(bytes(buf[PREAMBLE.size : PREAMBLE.size + header_len]))
+    data = buf[PREAMBLE.size + header_len :]
+
+    def section(start, length):
+        return data[start : start + length]
+
+    def int_array(start, count):
+        out = section(start, count * 8).cast("q")
+        if sys.byteorder != "little":
+            out = array.array("q", out)
+            out.byteswap()
+        return out
+
+    content = None
+    if header["content"] is not None:
+        content = str(section(*header["content"]), "utf8")
+
+    vocabulary = None
+    if header["vocabulary"] is not None:
+        vocabulary = Vocabulary(json.loads(str(section(*header["vocabulary"]), "utf8")))
+
+    regions = {}
+    for rclass, h in header["regions"].items():
+        rvalue = None
+        if h["rvalue_type"] in ("int", "vocabulary"):
+            rvalue = int_array(h["rvalue"], h["count"])
+        elif h["rvalue_type"] == "json":
+            rvalue = json.loads(str(section(*h["rvalue"]), "utf8"))
+        regions[rclass] = RegionColumn.from_arrays(
+            int_array(h["start"], h["count"]),
+            int_array(h["end"], h["count"]),
+            rvalue,
+            vocabulary=vocabulary if h["rvalue_type"] == "vocabulary" else None,
+        )
+    return header, content, regions
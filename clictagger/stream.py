@@ -0,0 +1,210 @@
+"""
+clictagger.stream: Tag text as it is read
+*****************************************
+
+:py:meth:`TaggedText.iter_chapters() <clictagger.taggedtext.TaggedText.iter_chapters>`
+reads a file (or STDIN) a piece at a time, yielding regions for each chapter as
+soon as it has been tagged::
+
+    >>> from clictagger.taggedtext import TaggedText
+    >>> for chapter in TaggedText.iter_chapters('alice.txt', regions=["quote.quote"]):
+    ...     print(chapter.start, chapter.end, len(chapter.regions["quote.quote"]))
+    0 11508 36
+    11508 22504 49
+    22504 32066 72
+    32066 45944 62
+    45944 57937 99
+    57937 71804 108
+    71804 84499 145
+    84499 98162 90
+    98162 110787 136
+    110787 122324 116
+    122324 132711 100
+    132711 144396 85
+
+Each :py:class:`Chapter` has the regions that start within it, from the start of
+the headings before the chapter, to the start of the headings after. Offsets
+are from the start of the whole text, the same as
+:py:class:`~clictagger.taggedtext.TaggedText` would give.
+
+Only the text around the chapter being tagged is kept in memory, so the memory
+used depends on the size of the largest chapter, not the whole text. See
+:mod:`clictagger.region.chapterwise` for how this works. The one exception is a
+quote left open at the end of a chapter, which may be closed in the next. Any
+chapters after it are held back until we know.
+"""
+import collections
+import sys
+
+from .region.chapterwise import CHUNK_SIZE, iter_chapter_regions
+from .region.column import RegionColumn
+from .region.tag import ALL_RCLASSES
+from .tokenizer import Vocabulary
+
+Chapter = collections.namedtuple("Chapter", "start end content regions")
+Chapter.__doc__ = """
+A chapter yielded by :py:func:`iter_chapters`
+
+- start: Character position of the start of the chapter, including headings before it
+- end: Character position of the end of the chapter, i.e. the start of the next
+- content: The text between start and end
+- regions: Dict of region class to a :py:class:`~clictagger.region.column.RegionColumn`
+  of regions starting within the chapter. Note a quote could continue past end
+"""
+
+
+class StreamText:
+    """
+    A read-only string-like view of a text file object, reading more from the
+    file only when needed. Supports indexing & slicing, ``find()`` and ``rfind()``
+    with positive offsets. ``len()`` works, but has to read the rest of the file.
+
+    Text before a position can be forgotten with :py:meth:`StreamText.release`.
+
+        >>> import io
+        >>> text = StreamText(io.StringIO("Once upon a time\\n\\nThe end"), read_size=4)
+        >>> text.find("\\n\\n")
+        16
+        >>> text.release(18)
+        >>> text[18:21]
+        'The'
+        >>> text[0:4]
+        Traceback (most recent call last):
+          ...
+        IndexError: Text before 18 has been released
+
+    - f: File object to read, opened in text mode
+    - read_size: Characters to read at once
+    """
+
+    def __init__(self, f, read_size=CHUNK_SIZE):
+        self._f = f
+        self._read_size = read_size
+        self._buf = ""
+        self._offset = 0  # Position of the start of self._buf
+        self._eof = False
+
+    def _read_to(self, pos):
+        """Read until (pos) is in the buffer, or the file ends. If pos is None, read everything"""
+        parts = [self._buf]
+        buf_end = self._offset + len(self._buf)
+        while not self._eof and (pos is None or buf_end < pos):
+            data = self._f.read(self._read_size)
+            if data:
+                parts.append(data)
+                buf_end += len(data)
+            else:
+                self._eof = True
+        if len(parts) > 1:
+            self._buf = "".join(parts)
+
+    def _buf_pos(self, pos):
+        """Position of (pos) within the buffer"""
+        if pos < self._offset:
+            raise IndexError("Text before %d has been released" % self._offset)
+        return pos - self._offset
+
+    def release(self, pos):
+        """Forget text before (pos), it won't be used again"""
+        if pos > self._offset:
+            self._read_to(pos)
+            self._buf = self._buf[pos - self._offset :]
+            self._offset = pos
+
+    def __len__(self):
+        self._read_to(None)
+        return self._offset + len(self._buf)
+
+    def __getitem__(self, i):
+        if not isinstance(i, slice):
+            if i < 0:
+                i += len(self)
+            self._read_to(i + 1)
+            return self._buf[self._buf_pos(i)]
+
+        if (i.start or 0) < 0 or (i.stop or 0) < 0:
+            i = slice(*i.indices(len(self)))
+        start = i.start or 0
+        if i.stop is not None and i.stop <= start:
+            return ""
+        self._read_to(i.stop)
+        return self._buf[
+            self._buf_pos(start) : None if i.stop is None else i.stop - self._offset
+        ]
+
+    def find(self, sub, start=0, end=None):
+        """Return the lowest index of (sub) within start..end, or -1, as ``str.find``"""
+        search_start = start
+        while True:
+            out = self._buf.find(
+                sub,
+                self._buf_pos(search_start),
+                None if end is None else max(end - self._offset, 0),
+            )
+            buf_end = self._offset + len(self._buf)
+            if out > -1:
+                return out + self._offset
+            if self._eof or (end is not None and buf_end >= end):
+                return -1
+            # Read some more, search again from the end of the buffer
+            search_start = max(start, buf_end - len(sub) + 1)
+            self._read_to(buf_end + 1)
+
+    def rfind(self, sub, start=0, end=None):
+        """Return the highest index of (sub) within start..end, or -1, as ``str.rfind``"""
+        self._read_to(end)
+        out = self._buf.rfind(
+            sub,
+            max(start - self._offset, 0),
+            None if end is None else max(end - self._offset, 0),
+        )
+        if out > -1:
+            return out + self._offset
+        self._buf_pos(start)  # i.e. raise an error if (start) has been released
+        return -1
+
+    def __repr__(self):
+        return "<StreamText %s>" % getattr(self._f, "name", "")
+
+
+def iter_chapters(f, rclasses=None, vocabulary=None, chunk_size=CHUNK_SIZE):
+    """
+    Read (f) a piece at a time, yielding a :py:class:`Chapter` for each chapter.
+
+    - f: A file object opened in text mode
+    - rclasses: Region classes to tag, defaults to all region classes
+    - vocabulary: A :py:class:`~clictagger.tokenizer.Vocabulary` to store token types in
+    - chunk_size: Characters to read at once
+    """
+    if rclasses is None:
+        rclasses = ALL_RCLASSES
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+
+    for span, text, regions in iter_chapter_regions(
+        StreamText(f, read_size=chunk_size), rclasses, chunk_size=chunk_size
+    ):
+        yield Chapter(
+            start=span[0],
+            end=span[1],
+            content=text,
+            regions={
+                rclass: RegionColumn(
+                    r, vocabulary=vocabulary if rclass == "tokens" else None
+                )
+                for rclass, r in regions.items()
+                if rclass in rclasses
+            },
+        )
+
+
+def iter_chapters_from_file(text_path, **kwargs):
+    """
+    Read the file at (text_path), or STDIN if "-", yielding a :py:class:`Chapter`
+    for each chapter. Any other arguments are passed to :py:func:`iter_chapters`
+    """
+    if text_path == "-":
+        yield from iter_chapters(sys.stdin, **kwargs)
+        return
+    with open(text_path, "r", encoding="utf8") as f:
+        yield from iter_chapters(f, **kwargs)
@@ -1,31 +1,87 @@
+import base64
+import gzip
 import html
+import lzma
+
+from .markup import _iter_chunks
 
 
 def _gen_table_html(ttrt):
     yield "<table>\n"
-    yield "<tr><th>Region class</th><th>Start</th><th>End</th><th>Region value</th><th>Content</th></tr>\n"
+    yield "<tr><th>Region class</th><th>Start</th><th>End</th><th>Region value</th><th>Words</th><th>Content</th></tr>\n"
     for r in ttrt.iter():
-        yield '<tr><td>%s</td> <td>%d</td> <td>%d</td> <td>%s</td> <td style="text-align: left">%s</td></tr>\n' % (
+        yield '<tr><td>%s</td> <td>%d</td> <td>%d</td> <td>%s</td> <td>%d</td> <td style="text-align: left">%s</td></tr>\n' % (
             r.rclass,
             r.pos_start,
             r.pos_end,
             html.escape(str(r.rvalue or "")),
+            r.words,
             html.escape(ttrt.tt.content[r.pos_start : r.pos_end]),
         )
     yield "</table>\n"
 
 
-def _gen_table_csv(ttrt):
-    def escape_cell(s):
-        # NB: Newline mangling from clic/client/lib/filesystem.js
+def _escape_cell(s):
+    # NB: Newline mangling from clic/client/lib/filesystem.js
+    if '"' in s or "\n" in s:
         return s.replace('"', '""').replace("\n\n", "¶ ").replace("\n", " ")
+    return s
 
-    yield '"Region class","Start","End","Region value","Content"\r\n'
-    for r in ttrt.iter():
-        yield '%s,%d,%d,"%s","%s"\r\n' % (
-            r.rclass,
-            r.pos_start,
-            r.pos_end,
-            escape_cell(str(r.rvalue or "")),
-            escape_cell(ttrt.tt.content[r.pos_start : r.pos_end]),
+
+def open_csv(path):
+    """
+    Open (path) to write CSV to. If it ends with ``.gz`` or ``.xz``, the CSV is
+    compressed as it is written
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf8", newline="")
+    if path.endswith(".xz"):
+        return lzma.open(path, "wt", encoding="utf8", newline="")
+    return open(path, "w", encoding="utf8", newline="")
+
+
+def _gen_table_csv(ttrt, header=True, document_column=False, content=True):
+    # Prefix each line with the document name if asked for
+    prefix = '"%s",' % _escape_cell(ttrt.tt.name or "") if document_column else ""
+    text = ttrt.tt.content
+    count_words = ttrt.tt.count_words
+    # Content is added to the end of each row by hand
+    row_format = prefix + '%s,%d,%d,"%s",%d' + ("," if content is not False else "\r\n")
+
+    if header:
+        yield '%s"Region class","Start","End","Region value","Words"%s\r\n' % (
+            '"Document",' if document_column else "",
+            ',"Content"' if content is not False else "",
         )
+    for rclass in ttrt.highlight:
+        for r in ttrt.tt.regions.get(rclass, []):
+            start, end = r[0], r[1]
+            row = row_format % (
+                rclass,
+                start,
+                end,
+                _escape_cell(str(r[2] or "")) if len(r) > 2 else "",
+                count_words(start, end),
+            )
+            if content is False:
+                yield row
+                continue
+            if content is not True:
+                # Truncate to (content) characters
+                end = min(end, start + content)
+            yield '%s"%s"\r\n' % (row, _escape_cell(text[start:end]))
+
+
+def _gen_table_csv_download(ttrt):
+    """Generate a download link for CSV, base64-encoding a chunk at a time"""
+    name = html.escape((ttrt.tt.name or "regions") + ".csv")
+    yield '<a download="%s" href="data:text/csv;base64,' % name
+    pending = b""
+    for chunk in _iter_chunks(_gen_table_csv(ttrt)):
+        pending += chunk.encode("utf8")
+        # Encode whole 3-byte groups, so no padding is added mid-way
+        split = len(pending) - len(pending) % 3
+        yield base64.b64encode(pending[:split]).decode("ascii")
+        pending = pending[split:]
+    yield base64.b64encode(pending).decode("ascii")
+    yield '" target="_blank">Download %s</a>' % name
@@ -76,31 +76,32 @@ by pretty printed by IPython using ``IPython.display``::
     <span title="chapter.paragraph:1 chapter.sentence:1 chapter.text:0 quote.quote" class="chapter-paragraph chapter-sentence chapter-text quote-quote">‘Well!’</span><span class="chapter-sentence-close"></span><span title="chapter.paragraph:1 chapter.text:0" class="chapter-paragraph chapter-text"> </span><span title="chapter.paragraph:1 chapter.text:0 chapter.sentence:2 quote.nonquote quote.suspension.short" class="chapter-paragraph chapter-text chapter-sentence quote-nonquote quote-suspension-short">thought Alice to herself,</span><span title="chapter.paragraph:1 chapter.text:0 chapter.sentence:2" class="chapter-paragraph chapter-text chapter-sentence"> </span><span title="chapter.paragraph:1 chapter.text:0 chapter.sentence:2 quote.quote" class="chapter-paragraph chapter-text chapter-sentence quote-quote">‘after such a fall as this, I shall think nothing of tumbling down stairs!’</span><span class="chapter-sentence-close"></span>
     >>> display(tt.table())
     <table>
-    <tr><th>Region class</th><th>Start</th><th>End</th><th>Region value</th><th>Content</th></tr>
-    <tr><td>chapter.sentence</td> <td>0</td> <td>7</td> <td>1</td> <td style="text-align: left">‘Well!’</td></tr>
-    <tr><td>chapter.sentence</td> <td>8</td> <td>109</td> <td>2</td> <td style="text-align: left">thought Alice to herself, ‘after such a fall as this, I shall think nothing of tumbling down stairs!’</td></tr>
-    <tr><td>quote.quote</td> <td>0</td> <td>7</td> <td></td> <td style="text-align: left">‘Well!’</td></tr>
-    <tr><td>quote.quote</td> <td>34</td> <td>109</td> <td></td> <td style="text-align: left">‘after such a fall as this, I shall think nothing of tumbling down stairs!’</td></tr>
-    <tr><td>quote.suspension.short</td> <td>8</td> <td>33</td> <td></td> <td style="text-align: left">thought Alice to herself,</td></tr>
+    <tr><th>Region class</th><th>Start</th><th>End</th><th>Region value</th><th>Words</th><th>Content</th></tr>
+    <tr><td>chapter.sentence</td> <td>0</td> <td>7</td> <td>1</td> <td>1</td> <td style="text-align: left">‘Well!’</td></tr>
+    <tr><td>chapter.sentence</td> <td>8</td> <td>109</td> <td>2</td> <td>18</td> <td style="text-align: left">thought Alice to herself, ‘after such a fall as this, I shall think nothing of tumbling down stairs!’</td></tr>
+    <tr><td>quote.quote</td> <td>0</td> <td>7</td> <td></td> <td>1</td> <td style="text-align: left">‘Well!’</td></tr>
+    <tr><td>quote.quote</td> <td>34</td> <td>109</td> <td></td> <td>14</td> <td style="text-align: left">‘after such a fall as this, I shall think nothing of tumbling down stairs!’</td></tr>
+    <tr><td>quote.suspension.short</td> <td>8</td> <td>33</td> <td></td> <td>4</td> <td style="text-align: left">thought Alice to herself,</td></tr>
     </table>
 
 The :py:meth:`TaggedText.table` method also supports generating a CSV download link::
 
     >>> display(tt.table(display="csv-download"))
-    <a download="regions.csv" href="data:text/csv;base64,IlJlZ2lvbiBjbGFzcyIsIlN0YXJ0IiwiRW5kIiwiUmVnaW9uIHZhbHVlIiwiQ29udGVudCINCmNoYXB0ZXIuc2VudGVuY2UsMCw3LCIxIiwi4oCYV2VsbCHigJkiDQpjaGFwdGVyLnNlbnRlbmNlLDgsMTA5LCIyIiwidGhvdWdodCBBbGljZSB0byBoZXJzZWxmLCDigJhhZnRlciBzdWNoIGEgZmFsbCBhcyB0aGlzLCBJIHNoYWxsIHRoaW5rIG5vdGhpbmcgb2YgdHVtYmxpbmcgZG93biBzdGFpcnMh4oCZIg0KcXVvdGUucXVvdGUsMCw3LCIiLCLigJhXZWxsIeKAmSINCnF1b3RlLnF1b3RlLDM0LDEwOSwiIiwi4oCYYWZ0ZXIgc3VjaCBhIGZhbGwgYXMgdGhpcywgSSBzaGFsbCB0aGluayBub3RoaW5nIG9mIHR1bWJsaW5nIGRvd24gc3RhaXJzIeKAmSINCnF1b3RlLnN1c3BlbnNpb24uc2hvcnQsOCwzMywiIiwidGhvdWdodCBBbGljZSB0byBoZXJzZWxmLCINCg==" target="_blank">Download regions.csv</a>
+    <a download="regions.csv" href="data:text/csv;base64,IlJlZ2lvbiBjbGFzcyIsIlN0YXJ0IiwiRW5kIiwiUmVnaW9uIHZhbHVlIiwiV29yZHMiLCJDb250ZW50Ig0KY2hhcHRlci5zZW50ZW5jZSwwLDcsIjEiLDEsIuKAmFdlbGwh4oCZIg0KY2hhcHRlci5zZW50ZW5jZSw4LDEwOSwiMiIsMTgsInRob3VnaHQgQWxpY2UgdG8gaGVyc2VsZiwg4oCYYWZ0ZXIgc3VjaCBhIGZhbGwgYXMgdGhpcywgSSBzaGFsbCB0aGluayBub3RoaW5nIG9mIHR1bWJsaW5nIGRvd24gc3RhaXJzIeKAmSINCnF1b3RlLnF1b3RlLDAsNywiIiwxLCLigJhXZWxsIeKAmSINCnF1b3RlLnF1b3RlLDM0LDEwOSwiIiwxNCwi4oCYYWZ0ZXIgc3VjaCBhIGZhbGwgYXMgdGhpcywgSSBzaGFsbCB0aGluayBub3RoaW5nIG9mIHR1bWJsaW5nIGRvd24gc3RhaXJzIeKAmSINCnF1b3RlLnN1c3BlbnNpb24uc2hvcnQsOCwzMywiIiw0LCJ0aG91Z2h0IEFsaWNlIHRvIGhlcnNlbGYsIg0K" target="_blank">Download regions.csv</a>
 """
-import base64
+import bisect
 import collections
+import functools
+import heapq
 import sys
 
-from .tokenizer import tagger_tokens
-from .region.metadata import tagger_metadata
-from .region.chapter import tagger_chapter
-from .region.quote import tagger_quote
-from .region.suspension import tagger_quote_suspension
-
-from .markup import _gen_markup_ansi, _gen_markup_html
-from .table import _gen_table_csv, _gen_table_html
+from .cache import get_cache
+from .region.chapterwise import tag_chapterwise
+from .region.column import RegionColumn, RegionIndex
+from .region.tag import ALL_RCLASSES, TAGGER_FOR_RCLASS, tagger
+from .region.update import regions_update
+from .timing import Timings, recording, stage
+from .tokenizer import WordCounter, count_words
 
 
 DEFAULT_HIGHLIGHT_REGIONS = [
@@ -120,47 +121,403 @@ without specifying which region tags you want in your CSV.
 """
 
 
+class TaggedTextRegions(dict):
+    """
+    A dict of region class to a :py:class:`~clictagger.region.column.RegionColumn`
+    of regions in a :py:class:`TaggedText`.
+    Region classes that haven't been tagged yet will be tagged when first asked for.
+
+    - content: The string containing the content to tag, or a
+      :py:class:`~clictagger.mapped.MappedText`, which will be tagged a chapter at a time
+    - vocabulary: :py:class:`~clictagger.tokenizer.Vocabulary` to store token types in
+    - workers: Number of worker processes to tag chapters with, if more than 1
+    - timings: :py:class:`~clictagger.timing.Timings` to record the time each tagger takes in
+    - cache: :py:class:`~clictagger.cache.TagCache` to store regions in whenever
+      more are tagged, or None
+
+    If the whole content was tagged at once, ``word_counter`` is a
+    :py:class:`~clictagger.tokenizer.WordCounter` made from the word boundaries
+    the taggers found, otherwise None. The boundaries themselves aren't kept,
+    as they take up several times the memory of the tokens.
+    """
+
+    def __init__(self, content, vocabulary=None, workers=1, timings=None, cache=None):
+        super().__init__()
+        self.content = content
+        self.vocabulary = vocabulary
+        self.workers = workers
+        self.timings = Timings() if timings is None else timings
+        self.cache = cache
+        self.word_counter = None
+
+    def __getstate__(self):
+        # NB: Word counts can be found again, don't send them to another process
+        state = dict(self.__dict__)
+        state["word_counter"] = None
+        return state
+
+    def ensure(self, rclasses):
+        """Make sure (rclasses) have been tagged, running any taggers required"""
+        if all(rclass in self for rclass in rclasses):
+            return  # Nothing to do
+
+        book = dict(self)
+        book["content"] = self.content
+        book["vocabulary"] = self.vocabulary
+        with recording(self.timings):
+            if isinstance(self.content, str) and self.workers <= 1:
+                tagger(book, rclasses, keep_word_index=True)
+                words = book.pop("word_index", None)
+                if words is not None:
+                    self.word_counter = WordCounter(words)
+            else:
+                # Too big to tag all at once, or tagging chapters in parallel,
+                # see clictagger.region.chapterwise
+                tag_chapterwise(book, rclasses, workers=self.workers)
+        del book["content"]
+        del book["vocabulary"]
+        for rclass, regions in book.items():
+            if rclass not in self:
+                self[rclass] = (
+                    regions
+                    if isinstance(regions, RegionColumn)
+                    else RegionColumn(regions)
+                )
+        if self.cache is not None:
+            # Add the new region classes to the cache entry
+            self.cache.put(self.content, self)
+
+    def set_regions(self, regions):
+        """Add already-tagged (regions), a dict of region class to RegionColumn"""
+        self.update(regions)
+        if "tokens" in regions and self.vocabulary is not None:
+            self["tokens"].set_vocabulary(self.vocabulary)
+        elif "tokens" in regions:
+            self.vocabulary = regions["tokens"].vocabulary
+
+    def __missing__(self, rclass):
+        if rclass not in TAGGER_FOR_RCLASS:
+            raise KeyError(rclass)
+        self.ensure([rclass])
+        return self[rclass]
+
+    def get(self, rclass, default=None):
+        if rclass in TAGGER_FOR_RCLASS:
+            self.ensure([rclass])
+        return super().get(rclass, default)
+
+
 class TaggedText:
     """
     Initialise a TaggedText object from a string.
 
-    - content: The string containing the content to tag
+    - content: The string containing the content to tag, or a :py:class:`~clictagger.mapped.MappedText`
     - name: A descriptive name, if not given, and one is found, the "metadata.title" region is used
+    - regions: List of region classes to tag now, defaults to all region classes.
+      Any other region classes will be tagged when they are first used
+    - vocabulary: A :py:class:`~clictagger.tokenizer.Vocabulary` to store token types in.
+      By default each TaggedText has its own, share one to have the same type IDs across a corpus
+    - cache: A :py:class:`~clictagger.cache.TagCache` (or directory path) to load regions
+      from if this content has been tagged before, or False to not use a cache.
+      By default, the ``CLICTAGGER_CACHE_DIR`` environment variable is used, if set.
+      See :mod:`clictagger.cache`
+    - workers: Tag chapters in this many worker processes at once, for a large
+      text on a machine with many CPUs. See :mod:`clictagger.region.chapterwise`
+    - timings_callback: Function to call with (stage, timing) as each stage of
+      tagging finishes. See :mod:`clictagger.timing`
+
+    For example, chapter titles can be found without tokenising the text::
+
+        >>> tt = TaggedText("CHAPTER I.\\n\\nOnce upon a time", regions=["chapter.title"])
+        >>> tt.region_classes()
+        ['chapter.title', 'metadata.title', 'metadata.author']
+        >>> tt.regions["chapter.title"]
+        [(0, 10, 1)]
+        >>> tt.regions["tokens"]
+        [(0, 7, 'chapter'), (8, 9, 'i'), (12, 16, 'once'), (17, 21, 'upon'), (22, 23, 'a'), (24, 28, 'time')]
+        >>> tt.region_classes()
+        ['chapter.title', 'metadata.title', 'metadata.author', 'tokens']
     """
 
-    def __init__(self, content, name=None):
-        book = dict(content=content)
-        tagger_metadata(book)
-        tagger_chapter(book)
-        tagger_quote(book)
-        tagger_quote_suspension(book)
-        tagger_tokens(book)
-        del book["content"]
+    def __init__(
+        self,
+        content,
+        name=None,
+        regions=None,
+        vocabulary=None,
+        cache=None,
+        workers=1,
+        timings_callback=None,
+    ):
+        self.content = content
+        cache = get_cache(cache)
+        self.regions = TaggedTextRegions(
+            content,
+            vocabulary=vocabulary,
+            workers=workers,
+            timings=Timings(callback=timings_callback),
+            cache=cache,
+        )
+
+        cached = None if cache is None else cache.get(content)
+        if cached is not None:
+            self.regions.set_regions(cached)
+        self.regions.ensure(ALL_RCLASSES if regions is None else regions)
+        self._region_indexes = {}
 
-        if name is None and len(book.get("metadata.title", [])) > 0:
+        if name is None:
+            metadata_title = self.regions["metadata.title"]
+        if name is None and len(metadata_title) > 0:
             # If no name, but have a title, extract that
-            self.name = content[
-                book["metadata.title"][0][0] : book["metadata.title"][0][1]
-            ]
+            self.name = content[metadata_title[0][0] : metadata_title[0][1]]
         else:
             self.name = name
+
+    def update(self, content):
+        """
+        Replace the content of this TaggedText with (content), for instance after
+        correcting a typo. Only the chapters near the edit are tagged again,
+        see :mod:`clictagger.region.update`::
+
+            >>> tt = TaggedText("CHAPTER I.\\n\\n‘Oh dear!’ said the Rabbit, ‘I shall be late!’")
+            >>> tt.regions["quote.suspension.short"]
+            [(23, 39)]
+            >>> tt.update(tt.content.replace("the Rabbit", "the White Rabbit"))
+            >>> tt.regions["quote.suspension.short"]
+            [(23, 45)]
+            >>> tt.regions["tokens"][-4:]
+            [(47, 48, 'i'), (49, 54, 'shall'), (55, 57, 'be'), (58, 62, 'late')]
+        """
+        # NB: Word boundaries of the old content are no use. Edited content
+        # is unlikely to be seen again, so don't fill the cache with it
+        self.regions.word_counter = None
+        self.regions.cache = None
+        with recording(self.regions.timings), stage("update"):
+            updated = regions_update(self.regions, self.content, content)
+        if not updated:
+            # Can't update regions, tag everything we had again
+            rclasses = list(self.regions.keys())
+            self.regions = TaggedTextRegions(
+                content,
+                vocabulary=self.regions.vocabulary,
+                workers=self.regions.workers,
+                timings=self.regions.timings,
+            )
+            self.regions.ensure(rclasses)
         self.content = content
-        self.regions = book
+        self.regions.content = content
+        self._region_indexes = {}
+
+    @property
+    def timings(self):
+        """
+        A :py:class:`~clictagger.timing.Timings` of the time each stage of tagging
+        has taken so far::
+
+            >>> tt = TaggedText("CHAPTER I.\\n\\n‘Oh dear!’ said the Rabbit.", regions=["chapter.title"])
+            >>> list(tt.timings.keys())
+            ['chapter.title', 'metadata']
+            >>> tt.regions["tokens"][:1]
+            [(0, 7, 'chapter')]
+            >>> list(tt.timings.keys())
+            ['chapter.title', 'metadata', 'word_index', 'tokens']
+        """
+        return self.regions.timings
+
+    def count_words(self, start, end):
+        """
+        Return the number of words between (start) and (end), counted the same
+        way as :mod:`quote.suspension <clictagger.region.suspension>` regions do::
+
+            >>> tt = TaggedText("CHAPTER I.\\n\\n‘Oh dear!’ said the Rabbit, ‘I shall be late!’")
+            >>> [(r, tt.count_words(*r)) for r in tt.regions["quote.quote"]]
+            [((12, 22), 2), ((40, 58), 4)]
+
+        If the taggers found the word boundaries of the whole content, each count
+        is a lookup in ``tt.regions.word_counter``. Otherwise, e.g. when tagged a
+        chapter at a time, the boundaries are found in just the text of (start)..(end).
+        """
+        counter = self.regions.word_counter
+        if counter is not None:
+            return counter.count_words(start, end)
+        return count_words(self.content[start:end])
+
+    def region_index(self, rclass):
+        """
+        Return a :py:class:`~clictagger.region.column.RegionIndex` of (rclass)
+        regions, made the first time it is asked for
+        """
+        col = self.regions[rclass]
+        index = self._region_indexes.get(rclass)
+        if index is None or index.col is not col or len(index.max_end) != len(col):
+            index = self._region_indexes[rclass] = RegionIndex(col)
+        return index
+
+    def regions_at(self, pos, rclasses=None):
+        """
+        Return a dict of region class to a list of regions containing character (pos)
+
+        - pos: Character position in the text
+        - rclasses: Region classes to look in, defaults to all region classes tagged so far
+
+        For example, to find the chapter, sentence, quote and token a position is in::
+
+            >>> tt = TaggedText.from_file("alice.txt")
+            >>> tt.regions_at(11560, ["chapter.text", "chapter.sentence", "quote.quote", "tokens"])
+            {'chapter.text': [(11539, 22499, 2)], 'chapter.sentence': [(11539, 11565, 1)], 'quote.quote': [(11539, 11565)], 'tokens': [(11554, 11563, 'curiouser')]}
+            >>> tt.content[11539:11565]
+            '‘Curiouser and curiouser!’'
+
+        Region classes with nothing at (pos) are left out.
+        """
+        out = {}
+        for rclass in self.region_classes() if rclasses is None else rclasses:
+            regions = self.region_index(rclass).at(pos)
+            if len(regions) > 0:
+                out[rclass] = regions
+        return out
+
+    def regions_overlapping(self, rclass, start, end):
+        """
+        Return a list of (rclass) regions overlapping (start)..(end)
+
+            >>> tt = TaggedText.from_file("alice.txt")
+            >>> tt.regions_overlapping("quote.quote", 11540, 11700)
+            [(11539, 11565), (11671, 11750)]
+
+        Each region class is indexed the first time it is used, after which each
+        lookup bisects the index, see :py:class:`~clictagger.region.column.RegionIndex`.
+        """
+        return self.region_index(rclass).overlapping(start, end)
+
+    def frequencies(self, n=1, within=None):
+        """
+        Return a :py:class:`collections.Counter` of how often each type, or
+        n-gram of types, occurs. N-grams are strings of types separated by spaces
+
+        - n: Count n-grams of this many tokens, 1 for single types
+        - within: Only count tokens within regions of this class, e.g. "quote.quote".
+          N-grams don't continue from one region to the next
+
+        For example, to compare clusters in and out of quotes::
+
+            >>> tt = TaggedText.from_file("alice.txt")
+            >>> tt.frequencies(3, within="quote.quote").most_common(2)
+            [("i don't know", 7), ('the same thing', 7)]
+            >>> tt.frequencies(3, within="quote.nonquote").most_common(3)
+            [('the mock turtle', 47), ('said the king', 29), ('the march hare', 28)]
+
+        The token numbers inside each region are found by bisecting, then n-grams
+        are counted as tuples of type IDs by zipping shifted slices of the token
+        type array, and only turned into strings at the end. Counters from
+        different texts can be added together, see :py:meth:`TaggedText.corpus_frequencies`.
+        """
+        if n < 1:
+            raise ValueError("n-grams need at least 1 token, not %d" % n)
+        tokens = self.regions["tokens"]
+        ids = tokens.rvalue
+        if within is None:
+            spans = [(0, len(tokens))]
+        else:
+            spans = (
+                (
+                    bisect.bisect_left(tokens.start, r[0]),
+                    bisect.bisect_right(tokens.end, r[1]),
+                )
+                for r in self.regions[within]
+            )
+
+        counts = collections.Counter()
+        for i, j in spans:
+            if j - i < n:
+                continue
+            if n == 1:
+                counts.update(ids[i:j])
+            else:
+                counts.update(zip(*(ids[i + k : j - n + 1 + k] for k in range(n))))
+
+        types = tokens.vocabulary.types
+        if n == 1:
+            return collections.Counter({types[k]: v for k, v in counts.items()})
+        return collections.Counter(
+            {" ".join(map(types.__getitem__, k)): v for k, v in counts.items()}
+        )
+
+    def save(self, path):
+        """
+        Save content and all tagged regions to (path), to load with :py:meth:`TaggedText.load`.
+        See :mod:`clictagger.store`
+        """
+        from .store import write_regions
+
+        with open(path, "wb") as f:
+            write_regions(f, self.regions, content=self.content, name=self.name)
 
     @classmethod
-    def from_file(cls, text_path):
+    def load(cls, path, vocabulary=None, use_mmap=True):
+        """
+        Load a TaggedText saved with :py:meth:`TaggedText.save`
+
+        - path: The path of the file to load
+        - vocabulary: A :py:class:`~clictagger.tokenizer.Vocabulary` to store token types in
+        - use_mmap: Memory-map the file, rather than reading region data into memory
+        """
+        from .store import FormatError, read_regions
+
+        header, content, regions = read_regions(path, use_mmap=use_mmap)
+        if content is None:
+            raise FormatError("%s does not contain content" % path)
+        tt = cls(
+            content,
+            name=header["name"],
+            regions=[],
+            vocabulary=vocabulary,
+            cache=False,
+        )
+        tt.regions.set_regions(regions)
+        return tt
+
+    @classmethod
+    def from_file(cls, text_path, use_mmap=False, **kwargs):
         """
         Initialise a TaggedText object from a file.
 
         - text_path: The path of the file to read. Should be a UTF-8 encoded file
+        - use_mmap: Memory-map the file rather than reading it into memory, and tag
+          it a chapter at a time. Uses much less memory for very large files,
+          see :mod:`clictagger.mapped`
+
+        Any other arguments are passed through to :py:class:`TaggedText`.
         """
         if text_path == "-":
-            return cls(sys.stdin.read(), name="stdin")
+            return cls(sys.stdin.read(), name="stdin", **kwargs)
+        if use_mmap:
+            from .mapped import map_text
+
+            return cls(map_text(text_path), name=text_path, **kwargs)
         with open(text_path, "r", encoding="utf8") as f:
-            return cls(f.read(), name=text_path)
+            return cls(f.read(), name=text_path, **kwargs)
+
+    @staticmethod
+    def iter_chapters(source, regions=None, vocabulary=None):
+        """
+        Tag text a chapter at a time as it is read, rather than reading it all
+        into memory first. Yields a :py:class:`~clictagger.stream.Chapter` for each
+        chapter, see :mod:`clictagger.stream`.
+
+        - source: The path of a UTF-8 encoded file to read, "-" for STDIN, or a
+          file object opened in text mode
+        - regions: List of region classes to tag, defaults to all region classes
+        - vocabulary: A :py:class:`~clictagger.tokenizer.Vocabulary` to store token types in
+        """
+        from .stream import iter_chapters, iter_chapters_from_file
+
+        if hasattr(source, "read"):
+            return iter_chapters(source, rclasses=regions, vocabulary=vocabulary)
+        return iter_chapters_from_file(source, rclasses=regions, vocabulary=vocabulary)
 
     @classmethod
-    def from_github(cls, file_path, repo="mahlberg-lab/corpora", tag="HEAD"):
+    def from_github(cls, file_path, repo="mahlberg-lab/corpora", tag="HEAD", **kwargs):
         """
         Initialise a TaggedText object from a github repository
 
@@ -168,6 +525,7 @@ class TaggedText:
         - repo: The repo name & organisation, defaults to "mahlberg-lab/corpora"
         - tag: The branch/tag/version to download, defaults to "HEAD"
 
+        Any other arguments are passed through to :py:class:`TaggedText`.
         For example::
 
             TaggedText.from_github("ChiLit/alice.txt", tag = "80d00e4")
@@ -176,16 +534,18 @@ class TaggedText:
         if repo == "mahlberg-lab/corpora" and not file_path.endswith(".txt"):
             file_path += ".txt"
         return cls.from_url(
-            "/".join(("https://raw.githubusercontent.com", repo, tag, file_path))
+            "/".join(("https://raw.githubusercontent.com", repo, tag, file_path)),
+            **kwargs
         )
 
     @classmethod
-    def from_url(cls, url):
+    def from_url(cls, url, **kwargs):
         """
         Initialise a TaggedText object from a URL
 
         - url: URL pointing at the UTF-8 encoded file to read
 
+        Any other arguments are passed through to :py:class:`TaggedText`.
         For example::
 
             TaggedText.from_url("http://www.gutenberg.org/files/36/36-0.txt")
@@ -193,7 +553,90 @@ class TaggedText:
         import urllib.request
 
         with urllib.request.urlopen(url) as f:
-            return cls(f.read().decode("utf8"), name=url)
+            return cls(f.read().decode("utf8"), name=url, **kwargs)
+
+    @classmethod
+    def tag_corpus(
+        cls,
+        paths,
+        workers=None,
+        ordered=True,
+        max_memory=None,
+        max_tasks_per_worker=None,
+        vocabulary=None,
+        **kwargs
+    ):
+        """
+        Tag many files in parallel, returning an iterator of TaggedText objects.
+        See :mod:`clictagger.corpus` for more information.
+
+        - paths: List of file paths to tag
+        - workers: Number of worker processes to use, defaults to the number of CPUs
+        - ordered: If True, return TaggedText objects in the same order as (paths),
+          otherwise return them as soon as they are ready
+        - max_memory: Limit the memory used by each worker to this many bytes
+        - max_tasks_per_worker: Replace each worker process after tagging this many files
+        - vocabulary: A :py:class:`~clictagger.tokenizer.Vocabulary` to store token types for all files in
+
+        Any other arguments are passed through to :py:class:`TaggedText`.
+
+        For example::
+
+            for tt in TaggedText.tag_corpus(glob.glob("corpus/*.txt"), workers=16):
+                tt.table().gen_csv()
+        """
+        from .corpus import imap_files
+
+        for path, tt in imap_files(
+            functools.partial(cls.from_file, **kwargs),
+            paths,
+            workers=workers,
+            ordered=ordered,
+            max_memory=max_memory,
+            max_tasks_per_worker=max_tasks_per_worker,
+        ):
+            if vocabulary is not None:
+                # Workers will have their own vocabulary, move tokens to the shared one.
+                # Any tokens tagged later will also use it
+                if "tokens" in tt.regions:
+                    tt.regions["tokens"].set_vocabulary(vocabulary)
+                tt.regions.vocabulary = vocabulary
+            yield tt
+
+    @classmethod
+    def corpus_frequencies(cls, paths, n=1, within=None, workers=None, **kwargs):
+        """
+        Tag many files in parallel, returning a :py:class:`collections.Counter`
+        of type n-grams across all of them. Each worker counts the n-grams in a
+        file with :py:meth:`TaggedText.frequencies`, and the counts are merged as
+        they are returned.
+
+        - paths: List of file paths to tag
+        - n: Count n-grams of this many tokens
+        - within: Only count tokens within regions of this class
+        - workers: Number of worker processes to use, defaults to the number of CPUs
+
+        Any other arguments are passed through to :py:class:`TaggedText`::
+
+            >>> TaggedText.corpus_frequencies(['alice.txt', 'alice.txt'], n=2, workers=2).most_common(2)
+            [('said the', 420), ('of the', 260)]
+        """
+        from .corpus import imap_files
+
+        if n < 1:
+            # NB: Check before starting workers
+            raise ValueError("n-grams need at least 1 token, not %d" % n)
+        counts = collections.Counter()
+        for path, file_counts in imap_files(
+            functools.partial(
+                _frequencies_from_file, cls, n=n, within=within, **kwargs
+            ),
+            paths,
+            workers=workers,
+            ordered=False,
+        ):
+            counts.update(file_counts)
+        return counts
 
     def __str__(self):
         str_parts = [
@@ -229,15 +672,53 @@ class TaggedText:
         """Return a list of all region classes searched for in the document"""
         return list(self.regions.keys())
 
-    def markup(self, highlight=DEFAULT_HIGHLIGHT_REGIONS):
+    def markup(
+        self, highlight=DEFAULT_HIGHLIGHT_REGIONS, start=0, end=None, chapter=None
+    ):
         """
         Return a :py:class:`TaggedTextRegionMarkup` object for displaying text with region tags highlighted
 
         - highlight: List of region tag classes to highlight
+        - start: Character position to start at, to only display part of the text
+        - end: Character position to end at, defaults to the end of the text
+        - chapter: Only display this chapter, from its ``chapter.title`` up to the next.
+          Chapter 0 is anything before the first chapter
+
+        For example, to show just the second chapter of a book in a notebook, rather
+        than the whole book::
+
+            >>> tt = TaggedText.from_file("alice.txt")
+            >>> markup = tt.markup(chapter=2)
+            >>> markup.start, markup.end
+            (11508, 22504)
+            >>> html = "".join(markup.gen_html())
+            >>> "CHAPTER II." in html, "CHAPTER III." in html
+            (True, False)
+
+        Only the regions within the window are rendered, found by bisecting each
+        region class.
         """
         if len(highlight) == 0:
             highlight = DEFAULT_HIGHLIGHT_REGIONS
-        return TaggedTextRegionMarkup(self, highlight)
+        if chapter is not None:
+            start, end = self.chapter_span(chapter)
+        return TaggedTextRegionMarkup(self, highlight, start=start, end=end)
+
+    def chapter_span(self, chapter):
+        """
+        Return (start, end) of (chapter), from the start of its ``chapter.title``
+        to the start of the next. Chapter 0 is anything before the first chapter
+
+            >>> TaggedText.from_file("alice.txt").chapter_span(12)
+            (132711, 144396)
+        """
+        titles = self.regions["chapter.title"]
+        if chapter < 0 or chapter > len(titles):
+            raise IndexError("No chapter %d" % chapter)
+        return (
+            0 if chapter == 0 else titles.start[chapter - 1],
+            len(self.content) if chapter == len(titles) else titles.start[chapter],
+        )
 
     def table(self, highlight=DEFAULT_HIGHLIGHT_REGIONS, display="html"):
         """
@@ -251,60 +732,105 @@ class TaggedText:
         return TaggedTextRegionTable(self, highlight, display=display)
 
 
+def _frequencies_from_file(cls, path, n=1, within=None, **kwargs):
+    """Tag (path), only as much as needed, and return its n-gram frequencies"""
+    rclasses = ["tokens"] if within is None else ["tokens", within]
+    return cls.from_file(path, regions=rclasses, **kwargs).frequencies(
+        n=n, within=within
+    )
+
+
+Insert = collections.namedtuple("Insert", "pos region_start opening rclass rvalue")
+Insert.__doc__ = """
+The start or end of a region, yielded by :py:meth:`TaggedTextRegionMarkup.iter`
+
+- pos: Integer character position in text
+- region_start: Character position the region starts at
+- opening: Boolean, an opening tag or closing tag?
+- rclass: Region class this relates to, e.g. ``quote.quote``
+- rvalue: Integer value associated with this rclass, e.g. chapter number
+"""
+
+
+def _iter_inserts(rclass, regions, start=0, end=None):
+    """
+    Yield an opening and closing :py:class:`Insert` for each of (regions), in order.
+    A region can close after the next has opened, so closes are kept in a heap
+    until they are due.
+
+    If (start) or (end) are given, only regions overlapping start..end are
+    included, with inserts moved to be within start..end.
+    """
+    if start > 0 or end is not None:
+        # Regions of one class don't overlap, so ends are in order as well as starts
+        regions = regions[
+            bisect.bisect_right(regions.end, start) : (
+                len(regions) if end is None else bisect.bisect_left(regions.start, end)
+            )
+        ]
+    closing = []
+    for r in regions:
+        rvalue = r[2] if len(r) > 2 else None
+        opening = Insert(max(r[0], start), r[0], True, rclass, rvalue)
+        while len(closing) > 0 and closing[0] < opening:
+            yield heapq.heappop(closing)
+        yield opening
+        heapq.heappush(
+            closing,
+            Insert(
+                r[1] if end is None else min(r[1], end), r[0], False, rclass, rvalue
+            ),
+        )
+    while len(closing) > 0:
+        yield heapq.heappop(closing)
+
+
 class TaggedTextRegionMarkup:
     """
     Represents a stream of starting/closing tags for all regions, which can be turned into e.g. HTML markup.
 
     - tt: The :py:class:`TaggedText` object to present
     - highlight: A list of region classes to highlight in the output, e.g. ``['quote.quote']``
+    - start: Character position to start output at
+    - end: Character position to end output at, defaults to the end of the text
     """
 
-    def __init__(self, tt, highlight):
+    def __init__(self, tt, highlight, start=0, end=None):
         self.tt = tt
         self.highlight = highlight
+        self.start = start
+        self.end = end
 
-    def iter(self):
+    def iter(self, rclasses=None):
         """
-        Returns an iterator of `Insert` objects, which correspond to the position of HTML tags,
-        in order of position in text.
-
-        An `Insert` object is a namedtuple of:
-
-        - pos: Integer character position in text
-        - opening: Boolean, an opening tag or closing tag?
-        - rclass: Region class this relates to, e.g. ``quote.quote``
-        - rvalue: Integer value associated with this rclass, e.g. chapter number
+        Returns an iterator of :py:class:`Insert` objects, which correspond to the
+        position of HTML tags, in order of position in text. Closing inserts come
+        before opening inserts at the same position.
+
+        - rclasses: Region classes to include, defaults to the highlighted region classes
+
+        Each region class is already in order, so inserts are merged from each
+        as they are needed, rather than gathered up and sorted::
+
+            >>> tt = TaggedText("‘Well!’ thought Alice.", regions=["quote.quote"])
+            >>> for insert in tt.markup(highlight=["quote.quote", "chapter.sentence"]).iter():
+            ...     print(insert)
+            Insert(pos=0, region_start=0, opening=True, rclass='chapter.sentence', rvalue=1)
+            Insert(pos=0, region_start=0, opening=True, rclass='quote.quote', rvalue=None)
+            Insert(pos=7, region_start=0, opening=False, rclass='chapter.sentence', rvalue=1)
+            Insert(pos=7, region_start=0, opening=False, rclass='quote.quote', rvalue=None)
+            Insert(pos=8, region_start=8, opening=True, rclass='chapter.sentence', rvalue=2)
+            Insert(pos=22, region_start=8, opening=False, rclass='chapter.sentence', rvalue=2)
         """
-        Insert = collections.namedtuple(
-            "Insert", "pos region_start opening rclass rvalue"
+        if rclasses is None:
+            rclasses = self.highlight
+        self.tt.regions.ensure(rclasses)
+        return heapq.merge(
+            *(
+                _iter_inserts(rclass, self.tt.regions[rclass], self.start, self.end)
+                for rclass in dict.fromkeys(rclasses)
+            )
         )
-        # Generate opening/closing inserts for each region we are interested in
-        inserts = []
-        for rclass in self.tt.regions.keys():
-            if rclass == "tokens" and "tokens" not in self.highlight:
-                continue
-            for r in self.tt.regions[rclass]:
-                inserts.append(
-                    Insert(
-                        pos=r[0],
-                        region_start=r[0],
-                        opening=True,
-                        rclass=rclass,
-                        rvalue=r[2] if len(r) > 2 else None,
-                    )
-                )
-                inserts.append(
-                    Insert(
-                        pos=r[1],
-                        region_start=r[0],
-                        opening=False,
-                        rclass=rclass,
-                        rvalue=r[2] if len(r) > 2 else None,
-                    )
-                )
-        # NB: We want to sort by pos, then region_start, so closes happen before opens
-        inserts.sort()
-        return iter(inserts)
 
     def _repr_html_(self):
         """Return concatenated HTML for IPython"""
@@ -319,14 +845,44 @@ class TaggedTextRegionMarkup:
         """
         Returns an iterator that gives :py:class:`TaggedText` content as HTML markup.
         """
+        from .markup import _gen_markup_html
+
         return _gen_markup_html(self)
 
+    def write_html(self, fp):
+        """
+        Write :py:class:`TaggedText` content as HTML markup to (fp), a file object
+        opened in text or binary mode (e.g. a socket), in large chunks rather
+        than a write for each part of :py:meth:`gen_html`::
+
+            >>> import io
+            >>> out = io.BytesIO()
+            >>> TaggedText("‘Hello <there>!’").markup(highlight=["quote.quote"]).write_html(out)
+            >>> html = out.getvalue().decode("utf8")
+            >>> html[html.index("‘") : html.index("’") + 1]
+            '‘Hello &lt;there&gt;!’'
+        """
+        from .markup import _gen_markup_html, _write_chunks
+
+        _write_chunks(fp, _gen_markup_html(self))
+
     def gen_ansi(self):
         """
         Returns an iterator that gives :py:class:`TaggedText` content with regions marked up with ANSI color codes.
         """
+        from .markup import _gen_markup_ansi
+
         return _gen_markup_ansi(self)
 
+    def write_ansi(self, fp):
+        """
+        Write :py:class:`TaggedText` content with regions marked up with ANSI color
+        codes to (fp), in large chunks, as :py:meth:`write_html`
+        """
+        from .markup import _gen_markup_ansi, _write_chunks
+
+        _write_chunks(fp, _gen_markup_ansi(self))
+
 
 class TaggedTextRegionTable:
     def __init__(self, tt, highlight, display="html"):
@@ -346,8 +902,11 @@ class TaggedTextRegionTable:
         - pos_start: Integer character starting position in text
         - pos_end: Integer character ending position in text
         - rvalue: Integer value associated with this rclass, e.g. chapter number
+        - words: Number of words in the region, see :py:meth:`TaggedText.count_words`
         """
-        Region = collections.namedtuple("Region", "rclass pos_start pos_end rvalue")
+        Region = collections.namedtuple(
+            "Region", "rclass pos_start pos_end rvalue words"
+        )
 
         # TODO: Markup does all of them here, we don't. Why?
         for i, rclass in enumerate(self.highlight):
@@ -357,6 +916,7 @@ class TaggedTextRegionTable:
                     pos_start=r[0],
                     pos_end=r[1],
                     rvalue=(r[2] if len(r) > 2 else None),
+                    words=self.tt.count_words(r[0], r[1]),
                 )
 
     def _repr_html_(self):
@@ -364,13 +924,9 @@ class TaggedTextRegionTable:
         if self.display == "html":
             return "".join(self.gen_html())
         elif self.display == "csv-download":
-            return '<a download="%s" href="data:text/csv;base64,%s" target="_blank">Download %s</a>' % (
-                (self.tt.name or "regions") + ".csv",
-                base64.b64encode("".join(self.gen_csv()).encode("utf8")).decode(
-                    "ascii"
-                ),
-                (self.tt.name or "regions") + ".csv",
-            )
+            from .table import _gen_table_csv_download
+
+            return "".join(_gen_table_csv_download(self))
         else:
             raise ValueError(
                 "Unknown display type %s, expected 'csv-download' or 'html'" % display
@@ -385,10 +941,51 @@ class TaggedTextRegionTable:
         """
         Returns an iterator that gives :py:class:`TaggedText` content as an HTML table.
         """
+        from .table import _gen_table_html
+
         return _gen_table_html(self)
 
-    def gen_csv(self):
+    def gen_csv(self, header=True, document_column=False, content=True):
         """
         Returns an iterator that gives :py:class:`TaggedText` content as lines of a CSV file.
+
+        - header: Include a header line with column names
+        - document_column: Add an initial "Document" column containing the TaggedText name,
+          for combining multiple documents into one CSV file
+        - content: Include the "Content" column. If a number, only include up to this
+          many characters of each region's content::
+
+            >>> tt = TaggedText("‘Oh dear!’ said the Rabbit.")
+            >>> print("".join(tt.table(highlight=["quote.quote"]).gen_csv(content=4)), end="")
+            "Region class","Start","End","Region value","Words","Content"
+            quote.quote,0,10,"",2,"‘Oh "
+            >>> print("".join(tt.table(highlight=["quote.quote"]).gen_csv(content=False)), end="")
+            "Region class","Start","End","Region value","Words"
+            quote.quote,0,10,"",2
         """
-        return _gen_table_csv(self)
+        from .table import _gen_table_csv
+
+        return _gen_table_csv(
+            self, header=header, document_column=document_column, content=content
+        )
+
+    def write_csv(self, out, header=True, document_column=False, content=True):
+        """
+        Write CSV to (out) in large chunks, rather than a line at a time.
+
+        - out: A file object opened in text mode, or a path to write to. Paths ending
+          ``.gz`` or ``.xz`` are compressed as they are written
+
+        Any other arguments are as :py:meth:`gen_csv`.
+        """
+        from .markup import _write_chunks
+        from .table import open_csv
+
+        rows = self.gen_csv(
+            header=header, document_column=document_column, content=content
+        )
+        if hasattr(out, "write"):
+            _write_chunks(out, rows)
+            return
+        with open_csv(out) as f:
+            _write_chunks(f, rows)
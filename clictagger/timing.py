@@ -0,0 +1,222 @@
+"""
+clictagger.timing: Time each stage of tagging
+*********************************************
+
+A :py:class:`~clictagger.taggedtext.TaggedText` records how long each stage of
+tagging took, i.e. finding word boundaries, then each tagger, in ``tt.timings``::
+
+    >>> from clictagger.taggedtext import TaggedText
+    >>> tt = TaggedText.from_file('alice.txt')
+    >>> list(tt.timings.keys())
+    ['word_index', 'metadata', 'chapter.part', 'chapter.title', 'chapter.text', 'chapter.paragraph', 'chapter.sentence', 'quote.quote', 'quote.nonquote', 'quote.suspension', 'tokens']
+    >>> tt.timings['tokens'].calls, tt.timings['tokens'].wall > 0, tt.timings['tokens'].memory
+    (1, True, None)
+
+Printing it gives a table of stages, in the order they first ran::
+
+    >>> print(tt.timings)  # doctest: +SKIP
+    Stage                Calls    Wall (s)     CPU (s)  Alloc (MiB)   Peak (MiB)
+    metadata                 1       0.000       0.000            -            -
+    ...
+    tokens                   1       0.040       0.040            -            -
+    Total                            0.098       0.097
+
+Tagging a chapter at a time (see :mod:`clictagger.region.chapterwise`) records
+the same stages, once for each chapter. If chapters are tagged in worker
+processes, their times are added up, so can be more than the time taken.
+
+Wall and CPU time are always recorded, as timing a stage is cheap. Memory is
+only recorded if :py:mod:`tracemalloc` is tracing, since that slows everything
+down. ``memory`` is then the memory still allocated at the end of the stage,
+and ``peak_memory`` the most allocated during it, both in bytes::
+
+    >>> import tracemalloc
+    >>> tracemalloc.start()
+    >>> tt = TaggedText.from_file('alice.txt')
+    >>> tracemalloc.stop()
+    >>> tt.timings['tokens'].peak_memory > 0
+    True
+
+To export each stage as it is recorded, e.g. to a metrics system, give a
+``timings_callback`` to :py:class:`~clictagger.taggedtext.TaggedText`. It is
+called with the stage name and a :py:class:`StageTiming` for that call::
+
+    >>> tt = TaggedText("‘Well!’ thought Alice.", timings_callback=lambda name, t: print(name, t.calls))
+    word_index 1
+    metadata 1
+    chapter.part 1
+    chapter.title 1
+    chapter.text 1
+    chapter.paragraph 1
+    chapter.sentence 1
+    quote.quote 1
+    quote.nonquote 1
+    quote.suspension 1
+    tokens 1
+
+From the command line, use ``clictagger --profile``, see :mod:`clictagger.script`.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+# NB: tracemalloc itself imports pickle etc., only import it if it's tracing
+import _tracemalloc
+
+StageTiming = collections.namedtuple("StageTiming", "calls wall cpu memory peak_memory")
+StageTiming.__doc__ = """
+Time taken by a stage of tagging
+
+- calls: Number of times the stage was run, e.g. once per chapter
+- wall: Total wall-clock time in seconds
+- cpu: Total CPU time in seconds, of the process the stage ran in
+- memory: Bytes still allocated at the end of the stage, or None if tracemalloc wasn't tracing
+- peak_memory: Most bytes allocated at once during the stage, or None
+"""
+
+#: Per-thread state, ``timings`` is what :py:func:`stage` records into, if any
+_local = threading.local()
+
+
+def _add(a, b):
+    return b if a is None else a if b is None else a + b
+
+
+class Timings(dict):
+    """
+    A dict of stage name to :py:class:`StageTiming`, in the order stages first ran
+
+    - callback: Function to call with (name, timing) every time a stage is recorded
+    """
+
+    def __init__(self, callback=None):
+        super().__init__()
+        self.callback = callback
+
+    def record(self, name, timing):
+        """Add (timing), a :py:class:`StageTiming`, to the totals for stage (name)"""
+        old = self.get(name)
+        self[name] = (
+            timing
+            if old is None
+            else StageTiming(
+                old.calls + timing.calls,
+                old.wall + timing.wall,
+                old.cpu + timing.cpu,
+                _add(old.memory, timing.memory),
+                (
+                    max(old.peak_memory or 0, timing.peak_memory or 0)
+                    if old.peak_memory is not None or timing.peak_memory is not None
+                    else None
+                ),
+            )
+        )
+        if self.callback is not None:
+            self.callback(name, timing)
+
+    def merge(self, other):
+        """Add all stages in (other), e.g. from a worker process"""
+        for name, timing in other.items():
+            self.record(name, timing)
+
+    def __str__(self):
+        def mib(x):
+            return "-" if x is None else "%.1f" % (x / 1024**2)
+
+        lines = [
+            "%-20s %5s %11s %11s %12s %12s"
+            % ("Stage", "Calls", "Wall (s)", "CPU (s)", "Alloc (MiB)", "Peak (MiB)")
+        ]
+        for name, t in self.items():
+            lines.append(
+                "%-20s %5d %11.3f %11.3f %12s %12s"
+                % (name, t.calls, t.wall, t.cpu, mib(t.memory), mib(t.peak_memory))
+            )
+        lines.append(
+            "%-20s %5s %11.3f %11.3f"
+            % (
+                "Total",
+                "",
+                sum(t.wall for t in self.values()),
+                sum(t.cpu for t in self.values()),
+            )
+        )
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "<Timings %s>" % ", ".join(
+            "%s=%.3fs" % (name, t.wall) for name, t in self.items()
+        )
+
+
+@contextlib.contextmanager
+def recording(timings):
+    """Record any :py:func:`stage` run within this block into (timings)"""
+    old = getattr(_local, "timings", None)
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = old
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Time the code within this block as stage (name), if within :py:func:`recording`
+
+        >>> timings = Timings()
+        >>> with recording(timings):
+        ...     for i in range(3):
+        ...         with stage("count"):
+        ...             x = sum(range(1000))
+        >>> timings["count"].calls
+        3
+    """
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        yield
+        return
+
+    tracing = _tracemalloc.is_tracing()
+    if tracing:
+        import tracemalloc
+
+        mem_start = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        memory = peak_memory = None
+        if tracing:
+            memory, peak_memory = tracemalloc.get_traced_memory()
+            memory -= mem_start
+            peak_memory -= mem_start
+        timings.record(name, StageTiming(1, wall, cpu, memory, peak_memory))
+
+
+def timed_call(fn, *args):
+    """
+    Call fn(*args) recording into a new :py:class:`Timings`, return (result, timings).
+    For calling in worker processes, where there's nothing to record into
+    """
+    timings = Timings()
+    with recording(timings):
+        return fn(*args), timings
+
+
+def merge_recorded(result, timings):
+    """
+    Add (timings) from :py:func:`timed_call` to those being recorded, if any,
+    and return (result)
+    """
+    active = getattr(_local, "timings", None)
+    if active is not None:
+        active.merge(timings)
+    return result
@@ -56,7 +56,7 @@ Tokens are then normalised into types by:-
 
 Queries for concordance searches are also turned into a list of types by this
 module. In this case we consider ``*`` as being part of a token for wildcard
-searches. See later examples for more information.
+searches, see :mod:`clictagger.concordance`. See later examples for more information.
 
 Examples / edge cases
 ---------------------
@@ -126,12 +126,14 @@ word in the unicode standard::
     ... ''')]
     ['had', 'some', 'reputation', 'as', 'a', 'connoisseur']
 """
+import array
+import bisect
+import itertools
 import re
 
-import icu
-import unidecode
-
-from .icuconfig import DEFAULT_LOCALE
+from .icuconfig import default_locale
+from .region.column import RegionColumn
+from .region.utils import tagger_io
 
 HYPHEN_WORD_PARTS = set(
     (
@@ -174,8 +176,14 @@ def word_boundary_type(s, bi, last_b, additional_word_parts=set()):
     if bi.getRuleStatus() > 0:
         # We already think it's a word-boundary, just return
         return bi.getRuleStatus()
+    return word_part_type(s, last_b, bi.current(), additional_word_parts)
+
 
-    b = bi.current()
+def word_part_type(s, last_b, b, additional_word_parts=set()):
+    """
+    Our own boundary type for a boundary at (b) that ICU doesn't consider to
+    be the end of a word, 200 if (last_b)..(b) should be part of a word, or 0
+    """
     word = s[last_b:b]
 
     if word in additional_word_parts:
@@ -199,64 +207,298 @@ def word_boundary_type(s, bi, last_b, additional_word_parts=set()):
         if s[b - 2 : b - 1] == "s":
             return 200
         # For select words, hyphen should be part of the word
-        if re.search(
-            INITIAL_ABBREVIATIONS_REGEX, s[b : b + INITIAL_ABBREVIATIONS_MAXLEN + 1]
+        if INITIAL_ABBREVIATIONS_REGEX.search(
+            s[b : b + INITIAL_ABBREVIATIONS_MAXLEN + 1]
         ):
             return 200
 
     return 0
 
 
-def types_from_string(s, offset=0, additional_word_parts=set()):
+class WordIndex:
+    """
+    All word boundaries in (s), found with one pass of an ICU word BreakIterator.
+    Quote-finding, suspension word counts and tokenising all walk the same
+    boundaries, so :py:func:`~clic.region.tag.tagger` makes one index to share
+    between them::
+
+        >>> words = WordIndex("The cat’s in-the-hat.")
+        >>> words.offsets
+        array('q', [0, 3, 4, 9, 10, 12, 13, 16, 17, 20, 21])
+        >>> [words.is_word(i) for i in range(len(words))]
+        [False, True, False, True, False, True, True, True, True, True, False]
+
+    - s: String to find word boundaries in
+    - start: Only index boundaries from the first at or after (start)...
+    - end: ...to the first after (end), by default the end of (s)
+    - additional_word_parts: Passed to :py:func:`word_boundary_type`
+
+    For each boundary, the index stores:
+
+    - offsets: Position of the boundary in (s)
+    - statuses: ICU's rule status for the text up to the boundary, see [ICU_RSV]_
+    - classes: Our own boundary type, i.e. the output of :py:func:`word_boundary_type`
+    - word_counts: The number of "wordy" boundaries up to and including this one
+    - status_counts: The number of boundaries with an ICU rule status up to and
+      including this one, for :py:meth:`WordIndex.count_words`
+
+    The text before the first boundary isn't part of the index, so it always
+    has a status and class of 0.
+    """
+
+    def __init__(self, s, start=0, end=None, additional_word_parts=set()):
+        import icu
+
+        offsets = []
+        statuses = []
+
+        bi = icu.BreakIterator.createWordInstance(default_locale())
+        bi.setText(s)
+        b = bi.following(start - 1) if start > 0 else bi.first()
+        if b >= 0:  # i.e. start isn't after the end of s
+            offsets.append(b)
+            statuses.append(0)
+            # NB: The Python work per boundary is most of the cost, so keep these loops tight
+            append_offset = offsets.append
+            append_status = statuses.append
+            get_status = bi.getRuleStatus
+            if end is None:
+                for b in bi:
+                    append_offset(b)
+                    append_status(get_status())
+            else:
+                for b in bi:
+                    append_offset(b)
+                    append_status(get_status())
+                    if b > end:
+                        break
+
+        self.offsets = array.array("q", offsets)
+        self.statuses = array.array("i", statuses)
+        self.classes = array.array("i", statuses)
+
+        # Add our own word parts, which are all (relatively rare) non-word ICU segments
+        if offsets:
+            word_parts = sorted(
+                HYPHEN_WORD_PARTS | APOSTROPHE_WORD_PARTS | set(additional_word_parts),
+                key=len,
+                reverse=True,
+            )
+            word_parts_regex = re.compile(
+                "(?=(%s))" % "|".join(re.escape(x) for x in word_parts)
+            )
+            for m in word_parts_regex.finditer(s, offsets[0], offsets[-1]):
+                i = bisect.bisect_left(offsets, m.start())
+                if (
+                    i + 1 < len(offsets)
+                    and offsets[i] == m.start()
+                    and offsets[i + 1] == m.end(1)
+                    and statuses[i + 1] == 0
+                ):
+                    self.classes[i + 1] = word_part_type(
+                        s, offsets[i], offsets[i + 1], additional_word_parts
+                    )
+        self.word_counts = array.array(
+            "q", itertools.accumulate(map(bool, self.classes))
+        )
+        self.status_counts = array.array(
+            "q", itertools.accumulate(map(bool, self.statuses))
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def following(self, pos):
+        """Return the index of the first boundary at or after (pos)"""
+        return bisect.bisect_left(self.offsets, pos)
+
+    def is_word(self, i):
+        """Is the text before boundary (i) "wordy", according to :py:func:`word_boundary_type`?"""
+        return self.classes[i] > 0
+
+    def count_words(self, start, end):
+        """
+        Count ICU words in (start)..(end), i.e. boundaries with a rule status after
+        the first boundary at or after (start), up to (end)::
+
+            >>> WordIndex("The cat’s in-the-hat.").count_words(4, 21)
+            4
+        """
+        i = self.following(start)
+        j = bisect.bisect_right(self.offsets, end) - 1
+        if j <= i:
+            return 0
+        return self.status_counts[j] - self.status_counts[i]
+
+
+class WordCounter:
+    """
+    Count ICU words the same as :py:meth:`WordIndex.count_words`, keeping only the
+    start & end of each word rather than every boundary of (words), a :py:class:`WordIndex`::
+
+        >>> words = WordIndex("The cat’s in-the-hat.")
+        >>> counter = WordCounter(words)
+        >>> counter.starts, counter.ends
+        (array('q', [0, 4, 10, 13, 17]), array('q', [3, 9, 12, 16, 20]))
+        >>> [(counter.count_words(s, e), words.count_words(s, e)) for s, e in ((4, 21), (5, 21), (0, 12))]
+        [(4, 4), (3, 3), (3, 3)]
+
+    A word is counted if it is entirely within (start)..(end), so a count is
+    the difference of 2 bisects.
+    """
+
+    def __init__(self, words):
+        is_word = words.statuses[1:]
+        self.starts = array.array("q", itertools.compress(words.offsets, is_word))
+        self.ends = array.array(
+            "q", itertools.compress(itertools.islice(words.offsets, 1, None), is_word)
+        )
+
+    def count_words(self, start, end):
+        """Count ICU words in (start)..(end)"""
+        return max(
+            0,
+            bisect.bisect_right(self.ends, end)
+            - bisect.bisect_left(self.starts, start),
+        )
+
+
+def count_words(s):
+    """
+    Count ICU words in (s), the same as :py:meth:`WordIndex.count_words` over the
+    whole of (s), without building an index::
+
+        >>> count_words("The cat’s in-the-hat."), WordIndex("The cat’s in-the-hat.").count_words(0, 21)
+        (5, 5)
+    """
+    import icu
+
+    bi = icu.BreakIterator.createWordInstance(default_locale())
+    bi.setText(s)
+    get_status = bi.getRuleStatus
+    return sum(1 for b in bi if get_status())
+
+
+def types_from_string(s, offset=0, additional_word_parts=set(), words=None):
     """
     Extract tuples of (type, start, end) from s, optionally adding (offset) to
     the start and end values
+
+    - words: A :py:class:`WordIndex` for (s), if one has already been made
     """
+    import unidecode
 
     def get_token(word_start, word_end):
         """Return (type, start, end)"""
         ttype = s[word_start:word_end].lower()
         ttype = unidecode.unidecode(ttype)
-        ttype = re.sub(REGEX_WORD_REMOVALS, "", ttype)
+        ttype = REGEX_WORD_REMOVALS.sub("", ttype)
         return (
             ttype,
             word_start + offset,
             word_end + offset,
         )
 
-    bi = icu.BreakIterator.createWordInstance(DEFAULT_LOCALE)
-    bi.setText(s)
+    if words is None:
+        words = WordIndex(s, additional_word_parts=additional_word_parts)
+    offsets = words.offsets
+    classes = words.classes
 
     out = [None]
-    last_b = 0
     word_start = None
-    for b in bi:
-        if word_boundary_type(s, bi, last_b, additional_word_parts) > 0:
+    for i in range(1, len(offsets)):
+        if classes[i] > 0:
             if word_start is None:
                 # This boundary has something word-y before it, start a word
-                word_start = last_b
+                word_start = offsets[i - 1]
         elif word_start is not None:
             # A non-wordy boundary but a word still open, finalise it
-            yield get_token(word_start, last_b)
+            yield get_token(word_start, offsets[i - 1])
             word_start = None
-        last_b = b
     if word_start is not None:
         # At end, finish any final word
-        yield get_token(word_start, last_b)
+        yield get_token(word_start, offsets[-1])
 
     # Convert token list to types
     # NB: This needs to be developed in lock-step with client/lib/concordance_utils.js
     return (unidecode.unidecode(s.lower()) for s in out)
 
 
+class Vocabulary:
+    """
+    A table of types, each with a dense integer ID. Token regions store the ID
+    of their type in a vocabulary, rather than a string per token::
+
+        >>> vocab = Vocabulary()
+        >>> book = dict(content="The cat and the hat.", vocabulary=vocab)
+        >>> tagger_tokens(book)
+        >>> book["tokens"]
+        [(0, 3, 'the'), (4, 7, 'cat'), (8, 11, 'and'), (12, 15, 'the'), (16, 19, 'hat')]
+        >>> book["tokens"].rvalue
+        array('q', [0, 1, 2, 0, 3])
+        >>> vocab.id("hat"), vocab[3], len(vocab), "cat" in vocab
+        (3, 'hat', 4, True)
+
+    Counting types is then integer work, converting back to types at the end::
+
+        >>> import collections
+        >>> [(vocab[i], n) for i, n in collections.Counter(book["tokens"].rvalue).most_common(2)]
+        [('the', 2), ('cat', 1)]
+
+    The same vocabulary can be shared between many books, so IDs are the same
+    across a corpus.
+
+    - types: Initial list of types to add
+    """
+
+    def __init__(self, types=()):
+        self.types = []
+        self.ids = {}
+        for t in types:
+            self.id(t)
+
+    def id(self, ttype):
+        """Return the ID for (ttype), adding it if it's not already in the vocabulary"""
+        try:
+            return self.ids[ttype]
+        except KeyError:
+            self.ids[ttype] = len(self.types)
+            self.types.append(ttype)
+            return self.ids[ttype]
+
+    def __getitem__(self, i):
+        return self.types[i]
+
+    def __len__(self):
+        return len(self.types)
+
+    def __contains__(self, ttype):
+        return ttype in self.ids
+
+    def __iter__(self):
+        return iter(self.types)
+
+
+@tagger_io(outputs=["tokens"])
 def tagger_tokens(book):
     """
-    Add tokens tags to (book)
+    Add tokens tags to (book). Types are stored in book["vocabulary"]
+    if available, otherwise a new :py:class:`Vocabulary`
     """
     if len(book.get("tokens", [])) > 0:
         return  # Nothing to do
 
+    vocabulary = book.get("vocabulary", None)
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+
     # Return value for tokens is wrong way around, reverse it.
-    book["tokens"] = [
-        (start, end, type) for type, start, end in types_from_string(book["content"])
-    ]
+    book["tokens"] = RegionColumn(
+        (
+            (start, end, type)
+            for type, start, end in types_from_string(
+                book["content"], words=book.get("word_index", None)
+            )
+        ),
+        vocabulary=vocabulary,
+    )
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from clictagger.cache import TAGGER_MODULES, TagCache, get_cache
+from clictagger.region import tag
+from clictagger.region.tag import ALL_RCLASSES
+from clictagger.taggedtext import TaggedText
+from clictagger.tokenizer import Vocabulary
+
+
+class TestTagCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_get_cache(self):
+        cache = TagCache(self.tempdir)
+        self.assertIs(get_cache(cache), cache)
+        self.assertEqual(get_cache(self.tempdir).path, self.tempdir)
+        self.assertIsNone(get_cache(False))
+        with unittest.mock.patch.dict(os.environ, {"CLICTAGGER_CACHE_DIR": ""}):
+            self.assertIsNone(get_cache())
+        with unittest.mock.patch.dict(
+            os.environ, {"CLICTAGGER_CACHE_DIR": self.tempdir}
+        ):
+            self.assertEqual(get_cache().path, self.tempdir)
+            self.assertIsNone(get_cache(False))
+
+    def test_taggedtext(self):
+        cache = TagCache(self.tempdir)
+        tt_orig = TaggedText("‘Hello,’ said the rabbit.", regions=["quote.quote"])
+
+        # Cache is filled with the regions asked for, nothing else is tagged
+        tt = TaggedText(
+            "‘Hello,’ said the rabbit.", regions=["chapter.title"], cache=cache
+        )
+        self.assertEqual(len(cache.entries()), 1)
+        self.assertNotIn("tokens", tt.region_classes())
+        self.assertNotIn("word_index", tt.timings)
+        cached = cache.get("‘Hello,’ said the rabbit.")
+        self.assertEqual(set(cached.keys()), set(tt.region_classes()))
+
+        # Regions tagged later are added to the entry
+        tt.regions["quote.quote"]
+        cached = cache.get("‘Hello,’ said the rabbit.")
+        self.assertIn("quote.quote", cached)
+        self.assertNotIn("tokens", cached)
+
+        # Asking for everything tags what's missing, and fills the entry
+        tt = TaggedText("‘Hello,’ said the rabbit.", cache=cache)
+        self.assertIn("tokens", tt.timings)
+        self.assertNotIn("chapter.title", tt.timings)
+        self.assertEqual(len(cache.entries()), 1)
+        self.assertEqual(
+            set(cache.get("‘Hello,’ said the rabbit.").keys()), set(ALL_RCLASSES)
+        )
+
+        # Content is loaded from cache without tagging
+        with unittest.mock.patch("clictagger.taggedtext.tagger") as mock_tagger:
+            tt = TaggedText("‘Hello,’ said the rabbit.", cache=self.tempdir)
+            vocab = Vocabulary(["rabbit"])
+            tt_vocab = TaggedText(
+                "‘Hello,’ said the rabbit.", cache=self.tempdir, vocabulary=vocab
+            )
+        mock_tagger.assert_not_called()
+        for rclass in ALL_RCLASSES:
+            self.assertEqual(tt.regions[rclass], tt_orig.regions[rclass], rclass)
+        self.assertEqual(tt_vocab.regions["tokens"], tt_orig.regions["tokens"])
+        self.assertEqual(list(tt_vocab.regions["tokens"].rvalue), [1, 2, 3, 0])
+
+        # Different content isn't in the cache
+        self.assertIsNone(cache.get("‘Hello,’ said the hare."))
+
+        # Broken entries are ignored
+        with open(cache.entry_path(cache.key("‘Hello,’ said the rabbit.")), "wb") as f:
+            f.write(b"camels")
+        self.assertIsNone(cache.get("‘Hello,’ said the rabbit."))
+
+    def test_evict(self):
+        cache = TagCache(self.tempdir)
+        for word in ("one", "two", "three"):
+            TaggedText("A line containing %s." % word, cache=cache)
+        entries = cache.entries()
+        self.assertEqual(len(entries), 3)
+
+        # Using an entry makes it most-recently-used
+        for i, word in enumerate(("one", "two", "three")):
+            path = cache.entry_path(cache.key("A line containing %s." % word))
+            os.utime(path, (i, i))
+        cache.get("A line containing one.")
+
+        # Shrinking the cache removes the least-recently used entries
+        cache.max_size = sum(e[1] for e in entries) - 1
+        cache.evict()
+        self.assertEqual(len(cache.entries()), 2)
+        self.assertIsNotNone(cache.get("A line containing one."))
+        self.assertIsNone(cache.get("A line containing two."))
+        self.assertIsNotNone(cache.get("A line containing three."))
+
+        cache.clear()
+        self.assertEqual(cache.entries(), [])
+
+    def test_tag_corpus(self):
+        # Several processes can fill the cache at once
+        paths = ["alice.txt", "alice.txt", "README.rst", "README.rst"]
+        tts = list(TaggedText.tag_corpus(paths, workers=4, cache=self.tempdir))
+        self.assertEqual(len(TagCache(self.tempdir).entries()), 2)
+        self.assertEqual(
+            [len(tt.regions["tokens"]) for tt in tts],
+            [len(TaggedText.from_file(p).regions["tokens"]) for p in paths],
+        )
+        self.assertEqual(
+            [
+                f
+                for d, ds, fs in os.walk(self.tempdir)
+                for f in fs
+                if f.endswith(".tmp")
+            ],
+            [],
+        )
+
+    def test_tagger_version(self):
+        # Changes to any tagger, or how they're run, give a new version
+        self.assertIn(tag, TAGGER_MODULES)
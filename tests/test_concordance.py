@@ -0,0 +1,128 @@
+import re
+import unittest
+
+from clictagger.concordance import ConcordanceIndex, parse_query
+from clictagger.taggedtext import TaggedText
+from clictagger.tokenizer import Vocabulary
+
+
+def alice_content(length=None):
+    with open("alice.txt", "r", encoding="utf8") as f:
+        return f.read()[:length]
+
+
+class TestConcordanceIndex(unittest.TestCase):
+    def setUp(self):
+        content = alice_content()
+        self.books = [
+            TaggedText(content[:40000]),
+            TaggedText(content[40000:90000]),
+            TaggedText(content[90000:]),
+        ]
+        self.index = ConcordanceIndex(
+            self.books, within=["quote.quote", "quote.nonquote", "chapter.sentence"]
+        )
+
+    def brute_force(self, query, within=None):
+        """Find (query) by comparing every position of every book"""
+        terms = [
+            re.compile(re.escape(t).replace(r"\*", ".*")) for t in parse_query(query)
+        ]
+        out = []
+        if len(terms) == 0:
+            return out
+        for book, tt in enumerate(self.books):
+            tokens = list(tt.regions["tokens"])
+            for i in range(len(tokens) - len(terms) + 1):
+                if not all(t.fullmatch(tokens[i + j][2]) for j, t in enumerate(terms)):
+                    continue
+                start, end = tokens[i][0], tokens[i + len(terms) - 1][1]
+                if within is not None and not any(
+                    r[0] <= start and r[1] >= end for r in tt.regions[within]
+                ):
+                    continue
+                out.append((book, i, len(terms), start, end))
+        return out
+
+    def test_search(self):
+        for query in (
+            "alice",
+            "Said the",
+            "the mock turtle",
+            "‘Off with her head!’",
+            "off with * head",
+            "mock tur*",
+            "* rabbit",
+            "rabbit *",
+            "cheshire cat",
+            "s*",
+            "not-a-word",
+            "",
+        ):
+            for within in (None, "quote.quote", "quote.nonquote", "chapter.sentence"):
+                self.assertEqual(
+                    list(self.index.search(query, within=within)),
+                    self.brute_force(query, within=within),
+                    (query, within),
+                )
+        with self.assertRaises(ValueError):
+            list(self.index.search("* *"))
+        # Only within classes the index was made with
+        with self.assertRaises(ValueError):
+            list(self.index.search("alice", within="chapter.paragraph"))
+
+    def test_kwic(self):
+        lines = list(self.index.kwic("white rabbit", context=2))
+        self.assertEqual(len(lines), len(self.brute_force("white rabbit")))
+        for line in lines:
+            self.assertEqual(line.node.lower(), "white rabbit")
+            self.assertEqual(len(parse_query(line.left)), 2)
+            self.assertLessEqual(len(parse_query(line.right)), 2)
+            self.assertNotIn("\n", line.left + line.node + line.right)
+
+        # Context stops at the start/end of a book
+        line = next(self.index.kwic("alice’s adventures", context=10))
+        self.assertEqual((line.book, line.left), (0, ""))
+
+    def test_vocabulary(self):
+        # Books with their own vocabularies are moved to the index's
+        index = ConcordanceIndex()
+        a = TaggedText("The cat sat on the mat.")
+        b = TaggedText("The mat sat on the cat.")
+        index.add(a)
+        index.add(b)
+        self.assertIs(a.regions["tokens"].vocabulary, index.vocabulary)
+        self.assertIs(b.regions["tokens"].vocabulary, index.vocabulary)
+        self.assertEqual(
+            [(m.book, m.token) for m in index.search("the cat")], [(0, 0), (1, 4)]
+        )
+        self.assertEqual(list(b.regions["tokens"])[-1], (19, 22, "cat"))
+
+    def test_tag_corpus(self):
+        # Books tokenized in workers, with the index's vocabulary
+        vocab = Vocabulary()
+        index = ConcordanceIndex(
+            TaggedText.tag_corpus(
+                ["alice.txt", "README.rst"],
+                workers=2,
+                regions=["tokens", "quote.quote"],
+                vocabulary=vocab,
+            ),
+            vocabulary=vocab,
+            within=["quote.quote"],
+        )
+        serial = ConcordanceIndex(
+            [TaggedText.from_file("alice.txt"), TaggedText.from_file("README.rst")],
+            within=["quote.quote"],
+        )
+        for query in ("white rabbit", "the queen", "tagger"):
+            for within in (None, "quote.quote"):
+                self.assertEqual(
+                    list(index.search(query, within=within)),
+                    list(serial.search(query, within=within)),
+                )
+        self.assertNotEqual(list(index.search("white rabbit")), [])
+        # Only what's needed of each TaggedText is kept
+        self.assertEqual(index.books[0].name, "alice.txt")
+        self.assertEqual(list(index.books[0].within.keys()), ["quote.quote"])
+        self.assertEqual(len(index.books[0].start), len(index.books[0].end))
@@ -0,0 +1,130 @@
+import os.path
+import random
+import shutil
+import tempfile
+import unittest
+
+from clictagger.mapped import MappedText, map_text
+from clictagger.region.chapterwise import tag_chapterwise
+from clictagger.region.tag import ALL_RCLASSES, tagger
+from clictagger.taggedtext import TaggedText
+
+
+def alice_content(length=None):
+    with open("alice.txt", "r", encoding="utf8") as f:
+        return f.read()[:length]
+
+
+class TestMappedText(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def write(self, content, name="in.txt"):
+        path = os.path.join(self.tempdir, name)
+        with open(path, "wb") as f:
+            f.write(content.encode("utf8"))
+        return path
+
+    def test_str(self):
+        content = "‘Ça va?’ — “Oui.”\n\n" * 50
+        text = MappedText(self.write(content), block_size=7)
+        self.assertEqual(len(text), len(content))
+        self.assertEqual(str(text), content)
+        self.assertEqual(text, content)
+        for i in (0, 1, 5, -1, len(content) - 1):
+            self.assertEqual(text[i], content[i])
+        with self.assertRaises(IndexError):
+            text[len(content)]
+
+        rnd = random.Random(0)
+        for _ in range(200):
+            start = rnd.randrange(-10, len(content) + 10)
+            end = rnd.randrange(-10, len(content) + 10)
+            self.assertEqual(text[start:end], content[start:end])
+            sub = rnd.choice(["\n\n", "’", "Oui", "missing"])
+            self.assertEqual(
+                text.find(sub, start, end),
+                content.find(sub, start, end),
+                (sub, start, end),
+            )
+            self.assertEqual(
+                text.rfind(sub, start, end),
+                content.rfind(sub, start, end),
+                (sub, start, end),
+            )
+        self.assertEqual(text[::3], content[::3])
+        self.assertEqual(bytes(text.encode("utf8")), content.encode("utf8"))
+
+    def test_empty(self):
+        text = MappedText(self.write(""))
+        self.assertEqual(len(text), 0)
+        self.assertEqual(text[0:10], "")
+        self.assertEqual(text.find("\n\n"), -1)
+
+    def test_map_text(self):
+        self.assertIsInstance(map_text(self.write("Once\n\nupon")), MappedText)
+        # Line endings need converting, so read into a string
+        self.assertEqual(map_text(self.write("Once\r\n\r\nupon")), "Once\n\nupon")
+
+    def test_taggedtext(self):
+        path = self.write(alice_content())
+        tt_read = TaggedText.from_file(path, regions=ALL_RCLASSES)
+        tt_mapped = TaggedText.from_file(path, use_mmap=True, regions=ALL_RCLASSES)
+        self.assertIsInstance(tt_mapped.content, MappedText)
+        self.assertEqual(tt_mapped.name, path)
+        for rclass in ALL_RCLASSES:
+            self.assertEqual(tt_mapped.regions[rclass], tt_read.regions[rclass], rclass)
+
+        # Lazily-tagged regions are tagged chapterwise too
+        tt_mapped = TaggedText.from_file(path, use_mmap=True, regions=[])
+        self.assertEqual(tt_mapped.regions["tokens"], tt_read.regions["tokens"])
+        self.assertEqual(
+            tt_mapped.regions["quote.quote"], tt_read.regions["quote.quote"]
+        )
+
+
+class TestChapterwise(unittest.TestCase):
+    def assertTagsMatch(self, content, **kwargs):
+        book = dict(content=content)
+        tag_chapterwise(book, ALL_RCLASSES, **kwargs)
+        full_book = dict(content=content)
+        tagger(full_book, ALL_RCLASSES)
+        for rclass in ALL_RCLASSES:
+            self.assertEqual(book[rclass], full_book[rclass], rclass)
+
+    def test_alice(self):
+        self.assertTagsMatch(alice_content())
+        self.assertTagsMatch(alice_content(), chunk_size=100)
+
+    def test_edge_cases(self):
+        self.assertTagsMatch("")
+        self.assertTagsMatch("\n\n")
+        self.assertTagsMatch("CHAPTER I.")
+        self.assertTagsMatch("Title\nAuthor\n\nCHAPTER I.\n\nOnce.\n\nCHAPTER II.")
+
+    def test_random(self):
+        rnd = random.Random(0)
+        content = alice_content()
+        snippets = [
+            "‘",
+            "’",
+            "“",
+            "”",
+            "\n",
+            "\n\n",
+            "\n\n\n",
+            "   ",
+            ", ",
+            ". ",
+            " --",
+            "\n\nCHAPTER X.\n\n",
+            "\n\nPART 2.\n\n",
+            "\n\n   ‘",
+        ]
+        for _ in range(100):
+            start = rnd.randrange(len(content))
+            parts = list(content[start : start + rnd.randrange(0, 2000)])
+            for _ in range(rnd.randrange(0, 30)):
+                parts.insert(rnd.randrange(len(parts) + 1), rnd.choice(snippets))
+            self.assertTagsMatch("".join(parts), chunk_size=rnd.choice([1, 100]))
@@ -1,5 +1,8 @@
+import gzip
+import lzma
 import os.path
 import subprocess
+import sys
 import unittest
 import re
 import tempfile
@@ -41,6 +44,7 @@ class TestScript(unittest.TestCase):
             tidy(run_script("'Hello there, 'I said.\n")),
             """
 #[0;37;41m'Hello there, 'I said.#[0m
+#[0m
         """.strip(),
         )
 
@@ -54,6 +58,7 @@ class TestScript(unittest.TestCase):
             """
 #[0;37;45m'Hello there,
 #[0;37;45mthis new line is still part of the quote,'#[0;37;41m #[0;37;46mI said.#[0m
+#[0m
         """.strip(),
         )
 
@@ -67,7 +72,8 @@ class TestScript(unittest.TestCase):
             ),
             """
 #[0;37;44m'Hello there,
-#[0;37;44mthis new line is still part of the quote,'#[0m #[0mI said.#[0m
+#[0;37;44mthis new line is still part of the quote,'#[0m I said.
+#[0m
         """.strip(),
         )
 
@@ -78,10 +84,10 @@ class TestScript(unittest.TestCase):
                 args=["--csv", "-"],
             ),
             """
-"Region class","Start","End","Region value","Content"\r
-chapter.sentence,0,64,"1","'Hello there, this new line is still part of the quote,' I said."\r
-quote.quote,0,56,"","'Hello there, this new line is still part of the quote,'"\r
-quote.suspension.short,57,64,"","I said."
+"Region class","Start","End","Region value","Words","Content"\r
+chapter.sentence,0,64,"1",13,"'Hello there, this new line is still part of the quote,' I said."\r
+quote.quote,0,56,"",11,"'Hello there, this new line is still part of the quote,'"\r
+quote.suspension.short,57,64,"",2,"I said."
         """.strip()
             + "\r\n",
         )
@@ -93,12 +99,156 @@ quote.suspension.short,57,64,"","I said."
                 regions=["quote.quote"],
             ),
             """
-"Region class","Start","End","Region value","Content"\r
-quote.quote,0,56,"","'Hello there, this new line is still part of the quote,'"\r
+"Region class","Start","End","Region value","Words","Content"\r
+quote.quote,0,56,"",11,"'Hello there, this new line is still part of the quote,'"\r
         """.strip()
             + "\r\n",
         )
 
+    def test_csv_dir(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_paths = []
+            for name, content in (
+                ("a.txt", "'Hello there,' I said.\n"),
+                ("b.txt", "'Goodbye,' I said.\n"),
+            ):
+                in_paths.append(os.path.join(tmp_dir, name))
+                with open(in_paths[-1], "w", encoding="utf8") as f:
+                    f.write(content)
+            out_dir = os.path.join(tmp_dir, "out")
+
+            def run_csv_dir(*args):
+                subprocess.run(
+                    [clictagger_path(), "--csv-dir", out_dir, "-j", "2"]
+                    + list(args)
+                    + in_paths
+                    + ["quote.quote"],
+                    check=True,
+                    stderr=subprocess.PIPE,
+                )
+                out = {}
+                for name in sorted(os.listdir(out_dir)):
+                    with open(
+                        os.path.join(out_dir, name), newline="", encoding="utf8"
+                    ) as f:
+                        out[name] = (f.read(), os.path.getmtime(f.name))
+                return out
+
+            # A CSV for each file
+            out = run_csv_dir()
+            self.assertEqual(
+                {k: v[0] for k, v in out.items()},
+                {
+                    "a.csv": '"Region class","Start","End","Region value","Words","Content"\r\n'
+                    + 'quote.quote,0,14,"",2,"\'Hello there,\'"\r\n',
+                    "b.csv": '"Region class","Start","End","Region value","Words","Content"\r\n'
+                    + 'quote.quote,0,10,"",1,"\'Goodbye,\'"\r\n',
+                },
+            )
+
+            # Up-to-date files aren't re-written
+            os.utime(in_paths[0], (0, 0))
+            os.utime(in_paths[1], (0, 0))
+            out2 = run_csv_dir()
+            self.assertEqual(out2, out)
+
+            # ...unless the input changes
+            os.utime(in_paths[1], (time.time() + 10, time.time() + 10))
+            out2 = run_csv_dir()
+            self.assertEqual(out2["a.csv"], out["a.csv"])
+            self.assertNotEqual(out2["b.csv"][1], out["b.csv"][1])
+
+            # ...or we force it
+            out3 = run_csv_dir("--force")
+            self.assertNotEqual(out3["a.csv"][1], out["a.csv"][1])
+
+    def test_csv_merged(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_paths = []
+            for name, content in (
+                ("a.txt", "'Hello there,' I said.\n"),
+                ("b.txt", "'Goodbye,' I said.\n"),
+            ):
+                in_paths.append(os.path.join(tmp_dir, name))
+                with open(in_paths[-1], "w", encoding="utf8") as f:
+                    f.write(content)
+
+            out = subprocess.run(
+                [clictagger_path(), "--csv", "-", "-j", "2"]
+                + in_paths
+                + ["quote.quote"],
+                check=True,
+                stdout=subprocess.PIPE,
+            ).stdout.decode("utf8")
+            self.assertEqual(
+                out,
+                '"Document","Region class","Start","End","Region value","Words","Content"\r\n'
+                + '"%s",quote.quote,0,14,"",2,"\'Hello there,\'"\r\n' % in_paths[0]
+                + '"%s",quote.quote,0,10,"",1,"\'Goodbye,\'"\r\n' % in_paths[1],
+            )
+
+    def test_csv_compressed(self):
+        content = "'Hello there,\nthis new line is still part of the quote,' I said.\n"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for ext, open_fn in ((".csv.gz", gzip.open), (".csv.xz", lzma.open)):
+                out_path = os.path.join(tmp_dir, "out" + ext)
+                run_script(content, args=["--csv", out_path], regions=["quote.quote"])
+                with open_fn(out_path, "rt", encoding="utf8", newline="") as f:
+                    self.assertEqual(
+                        f.read(),
+                        '"Region class","Start","End","Region value","Words","Content"\r\n'
+                        'quote.quote,0,56,"",11,"\'Hello there, this new line is still part of the quote,\'"\r\n',
+                    )
+
+        self.assertEqual(
+            run_script(
+                content,
+                args=["--csv", "-", "--csv-content", "5"],
+                regions=["quote.quote"],
+            ),
+            '"Region class","Start","End","Region value","Words","Content"\r\n'
+            'quote.quote,0,56,"",11,"\'Hell"\r\n',
+        )
+        self.assertEqual(
+            run_script(
+                content,
+                args=["--csv", "-", "--csv-content", "0"],
+                regions=["quote.quote"],
+            ),
+            '"Region class","Start","End","Region value","Words"\r\nquote.quote,0,56,"",11\r\n',
+        )
+
+    def test_bad_arguments(self):
+        def run_error(*args):
+            process = subprocess.run(
+                [clictagger_path()] + list(args),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            self.assertEqual(process.stdout, b"")
+            self.assertEqual(process.returncode, 2)
+            return process.stderr.decode("utf8")
+
+        # Missing input files aren't mistaken for region names
+        self.assertIn(
+            "not-a-file.txt is neither an input file nor a region name",
+            run_error("--csv", "-", "alice.txt", "not-a-file.txt", "quote.quote"),
+        )
+        self.assertIn(
+            "camels is neither an input file nor a region name",
+            run_error("--csv", "-", "alice.txt", "camels"),
+        )
+        self.assertIn(
+            "Input file not-a-file.txt does not exist",
+            run_error("--csv", "-", "not-a-file.txt"),
+        )
+        # STDIN can't be one of many inputs
+        self.assertIn(
+            "Cannot use STDIN with multiple input files",
+            run_error("--csv", "-", "-j", "2", "alice.txt", "-", "README.rst"),
+        )
+
     def test_html(self):
         # Test we at least get output, the HTML is long and convoluted
         self.assertIn(
@@ -109,6 +259,93 @@ quote.quote,0,56,"","'Hello there, this new line is still part of the quote,'"\r
             ),
         )
 
+        # HTML written to a file is the same, even if the path looks like a compressed CSV
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = os.path.join(tmp_dir, "out.html.gz")
+            run_script("'Hello there,' I said.\n", args=["--html", out_path])
+            with open(out_path, "r", encoding="utf8") as f:
+                out = f.read()
+        self.assertEqual(
+            re.sub(r"tt-[a-z]+", "", out),
+            re.sub(
+                r"tt-[a-z]+",
+                "",
+                run_script("'Hello there,' I said.\n", args=["--html", "-"]),
+            ),
+        )
+
+    def test_profile(self):
+        content = "'Hello there,' I said.\n"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pstats_path = os.path.join(tmp_dir, "out.pstats")
+            for profile_args in (["--profile"], ["--profile", pstats_path]):
+                process = subprocess.Popen(
+                    [clictagger_path()] + profile_args + ["--csv", "-", "-"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                out, err = process.communicate(content.encode("utf8"))
+                # Output is unchanged, timings are on STDERR
+                self.assertEqual(
+                    out.decode("utf8"), run_script(content, ["--csv", "-"])
+                )
+                stages = [l.split()[0] for l in err.decode("utf8").splitlines()]
+                self.assertEqual(stages[0], "Stage")
+                self.assertIn("quote.quote", stages)
+                self.assertEqual(stages[-2:], ["output", "Total"])
+            self.assertTrue(os.path.getsize(pstats_path) > 0)
+
+    def test_startup(self):
+        # NB: benchmarks/suite.py checks startup time is within budget, here we
+        # check what makes it slow isn't imported
+        stdin_content = "'Hello there,' I said.\n".encode("utf8")
+
+        def imported_modules(args, stdin=None):
+            return set(
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import sys\n"
+                        "from clictagger.script import clictagger\n"
+                        "sys.argv = ['clictagger'] + sys.argv[1:]\n"
+                        "try:\n"
+                        "    clictagger()\n"
+                        "except SystemExit:\n"
+                        "    pass\n"
+                        "sys.stderr.write(' '.join(sys.modules))\n",
+                    ]
+                    + args,
+                    input=stdin,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    check=True,
+                )
+                .stderr.decode("utf8")
+                .split()
+            )
+
+        others = set(
+            (
+                "pkg_resources",
+                "http.server",
+                "webbrowser",
+                "subprocess",
+                "multiprocessing",
+            )
+        )
+        help_modules = imported_modules(["--help"])
+        self.assertEqual(help_modules & (others | set(("icu", "unidecode"))), set())
+        # --help only needs the script itself
+        self.assertEqual(
+            set(m for m in help_modules if m.startswith("clictagger")),
+            set(("clictagger", "clictagger.script")),
+        )
+        self.assertEqual(
+            imported_modules(["--csv", "-", "-"], stdin_content) & others, set()
+        )
+
     def test_serve(self):
         with tempfile.NamedTemporaryFile() as f:
             f.write("'Hello there,' I said.'\n".encode("utf8"))
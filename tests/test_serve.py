@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+from clictagger.serve import FilePreview, make_server
+
+
+class TestServe(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "alice.txt")
+        shutil.copy("alice.txt", self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def edit(self, old, new):
+        with open(self.path, "r", encoding="utf8") as f:
+            content = f.read()
+        with open(self.path, "w", encoding="utf8") as f:
+            f.write(content.replace(old, new, 1))
+
+    def test_preview(self):
+        renders = []
+
+        def render(tt):
+            renders.append(tt.content)
+            return tt.markup(highlight=["quote.quote"]).gen_html()
+
+        preview = FilePreview(self.path, render)
+        self.assertEqual(preview.version, 1)
+        page = preview.page()
+        self.assertIn(b'EventSource("/events?version=1")', page)
+        self.assertIn(b"Alice was beginning to get very tired", page)
+
+        # Page is cached until the file changes
+        self.assertIs(preview.page(), page)
+        self.assertEqual(len(renders), 1)
+
+        # Changing the file changes the page, regions are updated
+        self.edit("Alice was beginning", "Alice was starting")
+        self.assertEqual(preview.wait(1, timeout=0), 1)
+        page = preview.page()
+        self.assertEqual(preview.version, 2)
+        self.assertIn(b'EventSource("/events?version=2")', page)
+        self.assertIn(b"Alice was starting to get very tired", page)
+        self.assertEqual(len(renders), 2)
+        self.assertEqual(preview.tt.content, renders[-1])
+
+        # A half-written file is ignored, and read again once it changes
+        with open(self.path, "rb") as f:
+            content = f.read()
+        with open(self.path, "wb") as f:
+            f.write(content[: content.index("‘".encode("utf8")) + 1])
+        self.assertEqual(preview.refresh(), False)
+        self.assertEqual(preview.version, 2)
+        self.assertIs(preview.page(), page)
+        with open(self.path, "wb") as f:
+            f.write(content.replace(b"very tired", b"rather tired"))
+        self.assertEqual(preview.refresh(), True)
+        self.assertIn(b"Alice was starting to get rather tired", preview.page())
+
+    def test_server(self):
+        preview = FilePreview(self.path, lambda tt: tt.markup().gen_html())
+        preview.watch(interval=0.05)
+        httpd = make_server(preview, port=0, keepalive=0.1)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        url = "http://localhost:%d" % httpd.server_address[1]
+
+        with urllib.request.urlopen(url + "/") as f:
+            self.assertEqual(f.read(), preview.page())
+
+        with urllib.request.urlopen(url + "/events?version=1", timeout=10) as events:
+            self.assertEqual(events.readline(), b": keepalive\n")
+            self.assertEqual(events.readline(), b"\n")
+
+            # Watcher notices file change without fetching the page
+            self.edit("Alice was beginning", "Alice was starting")
+            while True:
+                line = events.readline()
+                if line != b": keepalive\n" and line != b"\n":
+                    break
+            self.assertEqual(line, b"data: 2\n")
+        with urllib.request.urlopen(url + "/") as f:
+            self.assertIn(b"Alice was starting to get very tired", f.read())
+
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/camels")
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/events?version=camels")
+
+    def test_paged(self):
+        renders = []
+
+        def render(tt, chapter):
+            renders.append(chapter)
+            return tt.markup(highlight=["quote.quote"], chapter=chapter).gen_html()
+
+        preview = FilePreview(self.path, render, paged=True)
+        self.assertEqual(renders, [])  # Nothing rendered until asked for
+        httpd = make_server(preview, port=0, keepalive=0.1)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        url = "http://localhost:%d" % httpd.server_address[1]
+
+        # First page is the text before chapter I
+        with urllib.request.urlopen(url + "/") as f:
+            page = f.read()
+        self.assertIn(b"Lewis Carroll", page)
+        self.assertNotIn(b"Alice was beginning to get very tired", page)
+        self.assertIn(b'<a href="/?chapter=1">Next</a>', page)
+        with urllib.request.urlopen(url + "/?chapter=12") as f:
+            page = f.read()
+        self.assertIn(b'<a href="/?chapter=11">Previous</a>', page)
+        self.assertNotIn(b"Alice was beginning to get very tired", page)
+        self.assertIn(b"the happy summer days", page)
+        self.assertEqual(renders, [0, 12])
+
+        # Pages are rendered again once the file changes
+        self.edit("the happy summer days", "the happy winter days")
+        preview.refresh()
+        self.assertIn(b"the happy winter days", preview.page(chapter=12))
+        self.assertEqual(renders, [0, 12, 12])
+
+        for bad in ("13", "-1", "camels"):
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/?chapter=" + bad)
@@ -0,0 +1,91 @@
+import os.path
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from clictagger.region.column import RegionColumn
+from clictagger.region.tag import ALL_RCLASSES
+from clictagger.store import FormatError, read_regions, write_regions
+from clictagger.taggedtext import TaggedText
+from clictagger.tokenizer import Vocabulary
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, "out.clictt")
+
+    def test_roundtrip(self):
+        tt_orig = TaggedText.from_file("alice.txt")
+        tt_orig.save(self.path)
+
+        for use_mmap in (True, False):
+            tt = TaggedText.load(self.path, use_mmap=use_mmap)
+            self.assertEqual(tt.name, "alice.txt")
+            self.assertEqual(tt.content, tt_orig.content)
+            self.assertEqual(tt.region_classes(), tt_orig.region_classes())
+            for rclass in ALL_RCLASSES:
+                self.assertEqual(tt.regions[rclass], tt_orig.regions[rclass], rclass)
+            self.assertEqual(
+                list(tt.regions["tokens"].vocabulary),
+                list(tt_orig.regions["tokens"].vocabulary),
+            )
+
+        # Loaded regions can be changed
+        tt.update(tt.content.replace("Alice was beginning", "Alice was starting"))
+        self.assertEqual(tt.regions["tokens"][11], (81, 86, "alice"))
+        self.assertEqual(tt.regions["tokens"][13], (91, 99, "starting"))
+
+        # ...and sent to other processes
+        tt = pickle.loads(pickle.dumps(TaggedText.load(self.path)))
+        self.assertEqual(tt.regions["tokens"], tt_orig.regions["tokens"])
+
+    def test_partial(self):
+        # Only tagged regions are saved, the rest get tagged on demand
+        TaggedText("‘Hello,’ said the rabbit.", regions=["quote.quote"]).save(self.path)
+        tt = TaggedText.load(self.path)
+        self.assertNotIn("tokens", tt.region_classes())
+        self.assertEqual(tt.regions["quote.quote"], [(0, 8)])
+        self.assertEqual(
+            tt.regions["tokens"],
+            [(1, 6, "hello"), (9, 13, "said"), (14, 17, "the"), (18, 24, "rabbit")],
+        )
+
+    def test_vocabulary(self):
+        # Only the types used are stored, and can be loaded into a shared vocabulary
+        vocab = Vocabulary(["cat", "dog", "the"])
+        TaggedText("The dog sat.", vocabulary=vocab).save(self.path)
+        header, content, regions = read_regions(self.path)
+        self.assertEqual(list(regions["tokens"].vocabulary), ["the", "dog", "sat"])
+
+        tt = TaggedText.load(self.path, vocabulary=vocab)
+        self.assertIs(tt.regions["tokens"].vocabulary, vocab)
+        self.assertEqual(list(tt.regions["tokens"].rvalue), [2, 1, 3])
+        self.assertEqual(list(vocab), ["cat", "dog", "the", "sat"])
+
+    def test_rvalues(self):
+        regions = dict(
+            ints=RegionColumn([(0, 4, 1), (5, 8, 2)]),
+            strs=RegionColumn([(0, 4, "a"), (5, 8, "b")]),
+            none=RegionColumn([(0, 4), (5, 8)]),
+            empty=RegionColumn(),
+        )
+        with open(self.path, "wb") as f:
+            write_regions(f, regions)
+        header, content, out = read_regions(self.path)
+        self.assertIsNone(content)
+        self.assertEqual(out, regions)
+
+    def test_errors(self):
+        for data in (b"", b"camels", b"CLICTT\x63\x00\x00\x00\x00\x00"):
+            with open(self.path, "wb") as f:
+                f.write(data)
+            with self.assertRaises(FormatError):
+                read_regions(self.path)
+
+        with open(self.path, "wb") as f:
+            write_regions(f, dict(none=RegionColumn([(0, 4)])))
+        with self.assertRaisesRegex(FormatError, "does not contain content"):
+            TaggedText.load(self.path)
@@ -0,0 +1,125 @@
+import io
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+from clictagger.region.tag import ALL_RCLASSES
+from clictagger.stream import StreamText, iter_chapters
+from clictagger.taggedtext import TaggedText
+
+
+def alice_content(length=None):
+    with open("alice.txt", "r", encoding="utf8") as f:
+        return f.read()[:length]
+
+
+class TrackingStreamText(StreamText):
+    """A StreamText that records the most it has held in memory"""
+
+    max_buf = 0
+
+    def _read_to(self, pos):
+        super()._read_to(pos)
+        TrackingStreamText.max_buf = max(TrackingStreamText.max_buf, len(self._buf))
+
+
+class TestStreamText(unittest.TestCase):
+    def test_str(self):
+        content = "‘Ça va?’ — “Oui.”\n\n" * 50
+        for read_size in (1, 7, 1000):
+            text = StreamText(io.StringIO(content), read_size=read_size)
+            self.assertEqual(text.find("Oui", 30), content.find("Oui", 30))
+            self.assertEqual(text.find("\n\n", 0, 10), -1)
+            self.assertEqual(text.rfind("\n\n", 0, 100), content.rfind("\n\n", 0, 100))
+            self.assertEqual(text[5], content[5])
+            self.assertEqual(text[10:20], content[10:20])
+            self.assertEqual(text.find("missing"), -1)
+            self.assertEqual(len(text), len(content))
+            self.assertEqual(text[-3:], content[-3:])
+
+    def test_release(self):
+        text = StreamText(io.StringIO("0123456789" * 10), read_size=10)
+        text.release(55)
+        self.assertEqual(text[55:60], "56789")
+        self.assertEqual(text.find("0", 55), 60)
+        self.assertEqual(text.rfind("9", 55, 70), 69)
+        with self.assertRaises(IndexError):
+            text[50]
+        with self.assertRaises(IndexError):
+            text.find("0", 0)
+
+
+class TestIterChapters(unittest.TestCase):
+    def assertChaptersMatch(self, content, **kwargs):
+        full = TaggedText(content)
+        chapters = list(iter_chapters(io.StringIO(content), **kwargs))
+        self.assertEqual("".join(ch.content for ch in chapters), content)
+        for rclass in ALL_RCLASSES:
+            regions = [r for ch in chapters for r in ch.regions[rclass]]
+            self.assertEqual(regions, list(full.regions[rclass]), rclass)
+        return chapters
+
+    def test_alice(self):
+        chapters = self.assertChaptersMatch(alice_content())
+        self.assertEqual(len(chapters), 12)
+        self.assertChaptersMatch(alice_content(), chunk_size=100)
+
+    def test_quote_across_chapters(self):
+        chapters = self.assertChaptersMatch(
+            "Fly Fishing\nJ R Hartley\n\nCHAPTER I.\n\n"
+            "‘Is this the end of the line,’ he said, ‘or is there more?\n\n"
+            "CHAPTER II.\n\n‘There is more,’ said Hartley.\n",
+            chunk_size=3,
+        )
+        self.assertEqual(
+            [list(ch.regions["quote.quote"]) for ch in chapters],
+            [[(37, 67), (77, 126)], []],
+        )
+
+    def test_memory(self):
+        content = alice_content()
+        TrackingStreamText.max_buf = 0
+        with unittest.mock.patch("clictagger.stream.StreamText", TrackingStreamText):
+            self.assertChaptersMatch(content * 4, chunk_size=1000)
+        # Only held a few chapters at once, never the whole text
+        self.assertGreater(TrackingStreamText.max_buf, 0)
+        self.assertLess(TrackingStreamText.max_buf, len(content) / 2)
+
+    def test_taggedtext(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "in.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(alice_content(20000))
+
+        from_path = list(TaggedText.iter_chapters(path, regions=["quote.quote"]))
+        with open(path, "r", encoding="utf8") as f:
+            from_file = list(TaggedText.iter_chapters(f, regions=["quote.quote"]))
+        self.assertEqual(from_path, from_file)
+        self.assertEqual(list(from_path[0].regions.keys()), ["quote.quote"])
+
+        # "-" reads STDIN
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from clictagger.taggedtext import TaggedText\n"
+                "for ch in TaggedText.iter_chapters('-', regions=['quote.quote']):\n"
+                "    print(ch.start, ch.end, len(ch.regions['quote.quote']))\n",
+            ],
+            input=alice_content(20000),
+            capture_output=True,
+            encoding="utf8",
+            check=True,
+        ).stdout
+        self.assertEqual(
+            out,
+            "".join(
+                "%d %d %d\n" % (ch.start, ch.end, len(ch.regions["quote.quote"]))
+                for ch in from_path
+            ),
+        )
@@ -0,0 +1,489 @@
+import collections
+import html
+import io
+import os.path
+import pickle
+import random
+import re
+import shutil
+import tempfile
+import unittest
+
+from clictagger.mapped import MappedText
+from clictagger.region.column import RegionColumn
+from clictagger.region.tag import ALL_RCLASSES
+from clictagger.taggedtext import TaggedText
+from clictagger.tokenizer import Vocabulary, WordCounter, WordIndex
+
+
+def alice_content(length=None):
+    with open("alice.txt", "r", encoding="utf8") as f:
+        return f.read()[:length]
+
+
+class TestTaggedTextRegions(unittest.TestCase):
+    def test_subset(self):
+        content = alice_content(20000)
+        tt_all = TaggedText(content)
+        self.assertEqual(set(tt_all.region_classes()), set(ALL_RCLASSES))
+
+        for rclass in ALL_RCLASSES:
+            # Only tagging one region class gets the same result
+            tt = TaggedText(content, regions=[rclass])
+            self.assertIn(rclass, tt.region_classes())
+            self.assertEqual(tt.regions[rclass], tt_all.regions[rclass])
+            self.assertEqual(tt.name, tt_all.name)
+
+    def test_lazy(self):
+        tt = TaggedText(alice_content(20000), regions=[])
+        self.assertEqual(tt.region_classes(), ["metadata.title", "metadata.author"])
+
+        # Asking for sentences tags them, and everything they depend on
+        self.assertEqual(len(tt.regions["chapter.sentence"]), 178)
+        self.assertEqual(
+            tt.region_classes(),
+            [
+                "metadata.title",
+                "metadata.author",
+                "chapter.part",
+                "chapter.title",
+                "chapter.text",
+                "chapter.sentence",
+            ],
+        )
+
+        # get() also tags regions
+        self.assertEqual(len(tt.regions.get("quote.quote")), 70)
+        self.assertIn("chapter.paragraph", tt.region_classes())
+
+        # Unknown regions aren't tagged
+        self.assertEqual(tt.regions.get("camels", []), [])
+        with self.assertRaises(KeyError):
+            tt.regions["camels"]
+
+
+class TestTaggedTextVocabulary(unittest.TestCase):
+    def test_shared(self):
+        vocab = Vocabulary()
+        tt_a = TaggedText("The cat sat.", vocabulary=vocab)
+        tt_b = TaggedText("The dog sat.", vocabulary=vocab)
+        self.assertEqual(list(tt_a.regions["tokens"].rvalue), [0, 1, 2])
+        self.assertEqual(list(tt_b.regions["tokens"].rvalue), [0, 3, 2])
+        self.assertEqual(list(vocab), ["the", "cat", "sat", "dog"])
+
+        # Without a shared vocabulary, each has their own
+        tt_c = TaggedText("The dog sat.")
+        self.assertEqual(list(tt_c.regions["tokens"].rvalue), [0, 1, 2])
+        self.assertEqual(tt_c.regions["tokens"], tt_b.regions["tokens"])
+
+    def test_tag_corpus(self):
+        vocab = Vocabulary(["alice", "rabbit"])
+        tts = list(
+            TaggedText.tag_corpus(
+                ["alice.txt", "README.rst"], workers=2, vocabulary=vocab
+            )
+        )
+        for tt in tts:
+            self.assertIs(tt.regions["tokens"].vocabulary, vocab)
+            self.assertEqual(
+                tt.regions["tokens"], TaggedText.from_file(tt.name).regions["tokens"]
+            )
+        self.assertEqual(vocab.id("alice"), 0)
+        self.assertEqual(vocab.id("rabbit"), 1)
+
+    def test_tag_corpus_lazy_tokens(self):
+        vocab = Vocabulary()
+        tts = list(
+            TaggedText.tag_corpus(
+                ["alice.txt", "README.rst"],
+                workers=2,
+                regions=["chapter.title"],
+                vocabulary=vocab,
+            )
+        )
+        for tt in tts:
+            self.assertNotIn("tokens", tt.region_classes())
+            # Tokens tagged after tag_corpus still use the shared vocabulary
+            self.assertIs(tt.regions["tokens"].vocabulary, vocab)
+            self.assertEqual(
+                tt.regions["tokens"], TaggedText.from_file(tt.name).regions["tokens"]
+            )
+        self.assertIn("alice", vocab.ids)
+
+
+class TestTaggedTextUpdate(unittest.TestCase):
+    def assertUpdateMatches(self, tt, new_content):
+        tt.update(new_content)
+        tt_full = TaggedText(new_content)
+        self.assertEqual(tt.content, new_content)
+        for rclass in tt.region_classes():
+            self.assertEqual(tt.regions[rclass], tt_full.regions[rclass], rclass)
+
+    def test_edits(self):
+        content = alice_content(60000)
+        tt = TaggedText(content)
+
+        # Changes within a chapter
+        self.assertUpdateMatches(
+            tt, content.replace("‘and what is the use", "‘and what is THE use")
+        )
+        self.assertUpdateMatches(
+            tt, tt.content.replace("said the Hatter.", "said the Hatter, ‘quite so.’")
+        )
+        # Remove a closing quote mark, new quote will continue to the next paragraph
+        i = tt.content.index("’", 30000)
+        self.assertUpdateMatches(tt, tt.content[:i] + tt.content[i + 1 :])
+        # Merge paragraphs, split them again
+        i = tt.content.index("\n\n", 40000)
+        self.assertUpdateMatches(tt, tt.content[:i] + " " + tt.content[i + 2 :])
+        self.assertUpdateMatches(tt, tt.content[:i] + "\n\n" + tt.content[i + 1 :])
+        # Changes across chapters
+        i = tt.content.index("CHAPTER III.")
+        self.assertUpdateMatches(tt, tt.content[: i - 100] + tt.content[i - 10 :])
+        # Change a chapter heading
+        self.assertUpdateMatches(tt, tt.content.replace("CHAPTER IV.", "CHAPTER 4."))
+        # Changes at either end
+        self.assertUpdateMatches(tt, "‘" + tt.content)
+        self.assertUpdateMatches(tt, tt.content + "\n\n‘The end.’ said Alice.\n")
+
+    def test_random_edits(self):
+        rnd = random.Random(0)
+        snippets = ["‘", "’", "“", "”", "\n", "\n\n", "   ", " said Alice, ", "!", "-"]
+        tt = TaggedText(
+            alice_content(60000), regions=["quote.suspension.short", "tokens"]
+        )
+        for _ in range(20):
+            i = rnd.randrange(len(tt.content))
+            self.assertUpdateMatches(
+                tt,
+                tt.content[:i]
+                + rnd.choice(snippets)
+                + tt.content[i + rnd.randrange(0, 100) :],
+            )
+
+
+class TestTaggedTextCountWords(unittest.TestCase):
+    def test_suspensions(self):
+        # Suspensions are split into short/long by the same word count
+        tt = TaggedText(alice_content())
+        self.assertTrue(
+            all(
+                1 <= tt.count_words(*r) < 5
+                for r in tt.regions["quote.suspension.short"]
+            )
+        )
+        self.assertTrue(
+            all(tt.count_words(*r) >= 5 for r in tt.regions["quote.suspension.long"])
+        )
+
+    def test_table(self):
+        tt = TaggedText(alice_content(5000))
+        rows = list(tt.table(highlight=["chapter.sentence"]).iter())
+        self.assertEqual(
+            [r.words for r in rows],
+            [
+                WordIndex(tt.content[r.pos_start : r.pos_end]).count_words(
+                    0, r.pos_end - r.pos_start
+                )
+                for r in rows
+            ],
+        )
+
+    def test_update(self):
+        tt = TaggedText("‘Oh dear!’ said the Rabbit.")
+        self.assertEqual(tt.count_words(11, 27), 3)
+        tt.update("‘Oh dear!’ said the White Rabbit.")
+        self.assertEqual(tt.count_words(11, 33), 4)
+
+    def test_word_index_reused(self):
+        content = alice_content(50000)
+        words = WordIndex(content)
+        rclasses = ["chapter.title", "chapter.sentence", "quote.quote"]
+
+        # Words the taggers found are kept for counting, but not the WordIndex
+        tt = TaggedText(content, regions=ALL_RCLASSES)
+        self.assertIsInstance(tt.regions.word_counter, WordCounter)
+        self.assertEqual(len(tt.regions.word_counter.ends), words.status_counts[-1])
+        # ...or sent to other processes
+        self.assertIsNone(pickle.loads(pickle.dumps(tt)).regions.word_counter)
+
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "in.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(content)
+        for tt in (
+            tt,
+            # No WordIndex of the whole content, so count around each region
+            TaggedText(content, regions=["chapter.title"]),
+            TaggedText(content, workers=2),
+            TaggedText(MappedText(path)),
+        ):
+            for rclass in rclasses:
+                self.assertEqual(
+                    [tt.count_words(r[0], r[1]) for r in tt.regions[rclass]],
+                    [words.count_words(r[0], r[1]) for r in tt.regions[rclass]],
+                    rclass,
+                )
+            if not isinstance(tt.content, str) or tt.regions.workers > 1:
+                self.assertIsNone(tt.regions.word_counter)
+
+
+class TestTaggedTextWorkers(unittest.TestCase):
+    def assertWorkersMatch(self, content, workers=2):
+        tt = TaggedText(content, workers=workers)
+        tt_serial = TaggedText(str(content), regions=ALL_RCLASSES)
+        for rclass in ALL_RCLASSES:
+            self.assertEqual(tt.regions[rclass], tt_serial.regions[rclass], rclass)
+
+    def test_alice(self):
+        self.assertWorkersMatch(alice_content(), workers=2)
+        self.assertWorkersMatch(alice_content(30000), workers=5)
+
+    def test_quote_across_chapters(self):
+        content = alice_content()
+        # Leave the last quote of each chapter open, so some are closed in the next
+        parts = content.split("CHAPTER ")
+        for i, part in enumerate(parts[:-1]):
+            j = part.rfind("’")
+            parts[i] = part[:j] + part[j + 1 :]
+        self.assertWorkersMatch("CHAPTER ".join(parts))
+        self.assertWorkersMatch("‘" + "\n\nCHAPTER I.\n\n‘Oh".join(parts))
+
+    def test_mapped(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "in.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(alice_content(50000))
+        self.assertWorkersMatch(MappedText(path))
+
+
+class TestTaggedTextMarkup(unittest.TestCase):
+    def test_write_html(self):
+        tt = TaggedText(alice_content(30000) + "\n\n<b>Fish & chips</b>\n")
+        markup = tt.markup(highlight=["quote.quote", "chapter.sentence"])
+        random.seed(0)
+        html = "".join(markup.gen_html())
+        self.assertIn("&lt;b&gt;Fish &amp; chips&lt;/b&gt;", html)
+
+        # Text or binary files get the same as gen_html()
+        random.seed(0)
+        out = io.StringIO()
+        markup.write_html(out)
+        self.assertEqual(out.getvalue(), html)
+        random.seed(0)
+        out = io.BytesIO()
+        markup.write_html(out)
+        self.assertEqual(out.getvalue(), html.encode("utf8"))
+
+    def test_window(self):
+        tt = TaggedText(alice_content(30000))
+        rclasses = [rclass for rclass in ALL_RCLASSES if rclass != "tokens"]
+        rnd = random.Random(0)
+        for _ in range(50):
+            start = rnd.randrange(len(tt.content))
+            end = start + rnd.randrange(1, 2000)
+            # Same as clipping every region overlapping the window, then sorting
+            expected = sorted(
+                insert
+                for rclass in rclasses
+                for r in tt.regions[rclass]
+                if r[1] > start and r[0] < end
+                for insert in (
+                    (
+                        max(r[0], start),
+                        r[0],
+                        True,
+                        rclass,
+                        r[2] if len(r) > 2 else None,
+                    ),
+                    (min(r[1], end), r[0], False, rclass, r[2] if len(r) > 2 else None),
+                )
+            )
+            markup = tt.markup(start=start, end=end)
+            self.assertEqual(list(markup.iter(rclasses)), expected)
+
+        # Chapters cover the whole text
+        ansi = ""
+        for chapter in range(len(tt.regions["chapter.title"]) + 1):
+            ansi += "".join(tt.markup(chapter=chapter).gen_ansi()).partition("-" * 71)[
+                2
+            ]
+        self.assertEqual(
+            re.sub(r"\n|\x1b\[[0-9;]*m", "", ansi), tt.content.replace("\n", "")
+        )
+        out_html = ""
+        for chapter in range(len(tt.regions["chapter.title"]) + 1):
+            out_html += "".join(tt.markup(chapter=chapter).gen_html()).partition(
+                "</ul>"
+            )[2]
+        out_html = html.unescape(re.sub(r"<[^>]*>", "", out_html))
+        self.assertEqual(
+            out_html.replace("\xa0", " "),
+            # Indented lines are indented with &nbsp;s instead
+            re.sub(r"\n( +)", r"\1", tt.content),
+        )
+        with self.assertRaises(IndexError):
+            tt.markup(chapter=len(tt.regions["chapter.title"]) + 1)
+
+
+class TestTaggedTextRegionIndex(unittest.TestCase):
+    def assertIndexMatches(self, tt, rnd, queries=200):
+        for _ in range(queries):
+            start = rnd.randrange(len(tt.content) + 10)
+            end = start + rnd.randrange(1, 500)
+            for rclass in ALL_RCLASSES:
+                self.assertEqual(
+                    tt.regions_overlapping(rclass, start, end),
+                    [r for r in tt.regions[rclass] if r[1] > start and r[0] < end],
+                    rclass,
+                )
+            self.assertEqual(
+                tt.regions_at(start),
+                {
+                    rclass: [r for r in tt.regions[rclass] if r[0] <= start < r[1]]
+                    for rclass in tt.region_classes()
+                    if any(r[0] <= start < r[1] for r in tt.regions[rclass])
+                },
+            )
+
+    def test_alice(self):
+        rnd = random.Random(0)
+        tt = TaggedText(alice_content(30000))
+        self.assertIndexMatches(tt, rnd)
+
+        # Indexes are made again after an update
+        tt.update(tt.content.replace("Alice", "Ms. Alice Liddell"))
+        self.assertIndexMatches(tt, rnd)
+
+    def test_mapped(self):
+        # Regions loaded from a file are memoryviews, which can be indexed as-is
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "alice.clictt")
+        TaggedText(alice_content(30000)).save(path)
+        self.assertIndexMatches(TaggedText.load(path), random.Random(1), queries=50)
+
+    def test_overlapping(self):
+        tt = TaggedText("Once upon a time", regions=[])
+        tt.regions["chapter.text"] = RegionColumn([(0, 16, 0), (2, 4, 1), (5, 9, 2)])
+        self.assertEqual(
+            tt.regions_overlapping("chapter.text", 4, 6), [(0, 16, 0), (5, 9, 2)]
+        )
+        self.assertEqual(
+            tt.regions_at(10, ["chapter.text"]), {"chapter.text": [(0, 16, 0)]}
+        )
+        self.assertEqual(tt.regions_at(20, ["chapter.text"]), {})
+
+
+class TestTaggedTextFrequencies(unittest.TestCase):
+    def brute_force(self, tt, n, within):
+        """Count n-grams by looping over every token of every region"""
+        tokens = list(tt.regions["tokens"])
+        regions = [(0, len(tt.content))] if within is None else tt.regions[within]
+        out = collections.Counter()
+        for r in regions:
+            types = [t[2] for t in tokens if t[0] >= r[0] and t[1] <= r[1]]
+            for i in range(len(types) - n + 1):
+                out[" ".join(types[i : i + n])] += 1
+        return out
+
+    def test_frequencies(self):
+        tt = TaggedText(alice_content(20000))
+        for n in range(1, 6):
+            for within in (None, "quote.quote", "quote.nonquote", "chapter.sentence"):
+                self.assertEqual(
+                    tt.frequencies(n, within=within),
+                    self.brute_force(tt, n, within),
+                    (n, within),
+                )
+        for n in (0, -1):
+            with self.assertRaises(ValueError):
+                tt.frequencies(n)
+            with self.assertRaises(ValueError):
+                TaggedText.corpus_frequencies(["alice.txt"], n=n)
+
+    def test_corpus(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        paths = []
+        for i, length in enumerate((5000, 20000, 0)):
+            paths.append(os.path.join(tempdir, "%d.txt" % i))
+            with open(paths[-1], "w", encoding="utf8") as f:
+                f.write(alice_content(length))
+
+        expected = collections.Counter()
+        for path in paths:
+            expected.update(TaggedText.from_file(path).frequencies(2, "quote.quote"))
+        for workers in (1, 2):
+            self.assertEqual(
+                TaggedText.corpus_frequencies(
+                    paths, n=2, within="quote.quote", workers=workers
+                ),
+                expected,
+            )
+
+
+class TestTaggedTextTimings(unittest.TestCase):
+    STAGES = set(
+        (
+            "word_index",
+            "metadata",
+            "chapter.part",
+            "chapter.title",
+            "chapter.text",
+            "chapter.paragraph",
+            "chapter.sentence",
+            "quote.quote",
+            "quote.nonquote",
+            "quote.suspension",
+            "tokens",
+        )
+    )
+
+    def test_stages(self):
+        content = alice_content(50000)
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "in.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(content)
+
+        chapters = content.count("CHAPTER ")
+        for tt in (
+            TaggedText(content, regions=ALL_RCLASSES),
+            TaggedText(content, regions=ALL_RCLASSES, workers=2),
+            TaggedText(MappedText(path), regions=ALL_RCLASSES),
+        ):
+            self.assertEqual(set(tt.timings.keys()), self.STAGES)
+            for name, timing in tt.timings.items():
+                self.assertGreaterEqual(timing.calls, 1, name)
+                self.assertGreaterEqual(timing.wall, 0, name)
+                self.assertIsNone(timing.memory, name)
+            # Tagging a chapter at a time, including in workers, times each chapter
+            self.assertEqual(
+                tt.timings["tokens"].calls,
+                (
+                    1
+                    if isinstance(tt.content, str) and tt.regions.workers == 1
+                    else chapters
+                ),
+            )
+
+    def test_callback(self):
+        seen = []
+        tt = TaggedText(
+            alice_content(5000),
+            regions=["chapter.title"],
+            timings_callback=lambda name, t: seen.append((name, t.calls)),
+        )
+        self.assertEqual(seen, [("chapter.title", 1), ("metadata", 1)])
+        tt.regions["tokens"]
+        i = tt.content.index("Alice", 3000)
+        tt.update(tt.content[:i] + "Bob" + tt.content[i + 5 :])
+        self.assertEqual(
+            [x[0] for x in seen],
+            ["chapter.title", "metadata", "word_index", "tokens", "update"],
+        )
+        self.assertEqual(list(tt.timings.keys()), [x[0] for x in seen])
@@ -1,6 +1,10 @@
+import random
 import unittest
 
-from clictagger.tokenizer import types_from_string
+import icu
+
+from clictagger.icuconfig import DEFAULT_LOCALE
+from clictagger.tokenizer import WordIndex, types_from_string, word_boundary_type
 
 
 class TestTypesFromString(unittest.TestCase):
@@ -30,3 +34,86 @@ class TestTypesFromString(unittest.TestCase):
                 ("cat", 1008, 1011),
             ],
         )
+
+
+class TestWordIndex(unittest.TestCase):
+    def icu_boundaries(self, s, additional_word_parts=set()):
+        """(offset, status, class) for every boundary, walking ICU directly"""
+        bi = icu.BreakIterator.createWordInstance(DEFAULT_LOCALE)
+        bi.setText(s)
+        out = [(0, 0, 0)]
+        last_b = 0
+        for b in bi:
+            out.append(
+                (
+                    b,
+                    bi.getRuleStatus(),
+                    word_boundary_type(s, bi, last_b, additional_word_parts),
+                )
+            )
+            last_b = b
+        return out
+
+    def test_matches_icu(self):
+        rnd = random.Random(0)
+        parts = [
+            "cat",
+            "days",
+            "s",
+            "em",
+            "tis",
+            " ",
+            "\n",
+            "-",
+            "--",
+            "’",
+            "'",
+            "‘",
+            "*",
+            "3.2",
+            ".",
+        ]
+        for _ in range(200):
+            s = "".join(rnd.choice(parts) for _ in range(rnd.randrange(30)))
+            for additional_word_parts in (set(), set("*")):
+                words = WordIndex(s, additional_word_parts=additional_word_parts)
+                self.assertEqual(
+                    list(zip(words.offsets, words.statuses, words.classes)),
+                    self.icu_boundaries(s, additional_word_parts),
+                    s,
+                )
+
+    def test_range(self):
+        s = "The cat sat on the mat. The end."
+        words = WordIndex(s)
+        part = WordIndex(s, 5, 12)
+        # From the first boundary at/after 5, to the first after 12
+        self.assertEqual(list(part.offsets), [7, 8, 11, 12, 14])
+        # NB: The text before the first boundary isn't in the index
+        self.assertEqual(list(part.classes), [0] + list(words.classes[4:8]))
+        self.assertEqual(len(WordIndex(s, 100)), 0)
+
+    def test_count_words(self):
+        s = "The cat sat on the mat. The end."
+        words = WordIndex(s)
+        self.assertEqual(words.count_words(0, len(s)), 8)
+        self.assertEqual(words.count_words(4, 11), 2)
+        self.assertEqual(
+            words.count_words(5, 11), 1
+        )  # NB: "cat" is before the first boundary
+        self.assertEqual(list(words.word_counts)[-1], 8)
+
+        # Same as counting the statuses between
+        rnd = random.Random(0)
+        for _ in range(200):
+            start, end = rnd.randrange(-2, len(s) + 2), rnd.randrange(-2, len(s) + 2)
+            i = words.following(start) + 1
+            self.assertEqual(
+                words.count_words(start, end),
+                sum(
+                    1
+                    for k in range(i, len(words))
+                    if words.offsets[k] <= end and words.statuses[k] > 0
+                ),
+                (start, end),
+            )